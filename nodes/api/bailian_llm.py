@@ -3,6 +3,8 @@ import logging
 import socket
 from urllib3.util import connection
 
+from ..common.response_cache import response_cache
+
 # 配置日志
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -168,6 +170,11 @@ class BailianLLMNode:
                     "label": "Endpoint URL",
                     "description": "阿里云百炼API Endpoint（留空使用默认值，SDK无需配置）"
                 }),
+                "use_cache": ("BOOLEAN", {
+                    "default": True,
+                    "label": "使用响应缓存",
+                    "description": "固定种子时相同的请求直接返回本地缓存的结果，不再调用API（随机种子时不缓存）"
+                }),
             }
         }
     
@@ -176,7 +183,7 @@ class BailianLLMNode:
     FUNCTION = "call_llm"
     CATEGORY = "XnanTool/API/阿里百炼"
     
-    def call_llm(self, system_prompt, prompt, model, api_key=None, temperature=0.7, top_p=0.95, max_tokens=1024, enable_thinking="false", seed=0, endpoint=None):
+    def call_llm(self, system_prompt, prompt, model, api_key=None, temperature=0.7, top_p=0.95, max_tokens=1024, enable_thinking="false", seed=0, endpoint=None, use_cache=True):
         """
         调用阿里云百炼LLM
         
@@ -191,6 +198,7 @@ class BailianLLMNode:
             enable_thinking: 是否开启思考模式
             seed: 随机种子
             endpoint: API Endpoint URL（已废弃，SDK自动使用默认值）
+            use_cache: 是否使用响应缓存（仅固定种子时生效）
             
         Returns:
             tuple: (响应文本,)
@@ -200,6 +208,16 @@ class BailianLLMNode:
             if not prompt or not prompt.strip():
                 return ("错误：用户提示词不能为空",)
             
+            # 固定种子时优先返回缓存的响应
+            cache_key = response_cache.key(
+                use_cache, seed > 0, "bailian_llm",
+                model=model, system_prompt=system_prompt, prompt=prompt, temperature=temperature,
+                top_p=top_p, max_tokens=max_tokens, enable_thinking=enable_thinking, seed=seed,
+            )
+            cached = response_cache.get(cache_key)
+            if cached is not None:
+                return tuple(cached)
+            
             # 优先使用环境变量，其次使用传入的参数
             api_key = api_key or os.getenv("DASHSCOPE_API_KEY")
             
@@ -258,6 +276,7 @@ class BailianLLMNode:
                     response = client.responses.create(**params)
                     response_text = response.output_text
                     logger.info(f"百炼LLM调用成功")
+                    response_cache.put(cache_key, [response_text])
                     return (response_text,)
                 except ImportError:
                     return ("错误：请安装 openai SDK: pip install openai",)
@@ -333,6 +352,7 @@ class BailianLLMNode:
                     else:
                         response_text = str(response)
                     logger.info(f"百炼LLM调用成功")
+                    response_cache.put(cache_key, [response_text])
                     return (response_text,)
                 except Exception as e:
                     error_str = str(e)
@@ -1,9 +1,10 @@
 import os
 import logging
-import requests
 import io
 import base64
 
+from ..common.http_client import http_get
+
 # 配置日志
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -190,7 +191,7 @@ class BailianQwenNode:
                             logger.debug(f"图片URL: {result.url}")
                             # 下载图片
                             try:
-                                img_response = requests.get(result.url)
+                                img_response = http_get(result.url)
                                 logger.debug(f"下载状态码: {img_response.status_code}")
                                 if img_response.status_code == 200:
                                     # 将图片转换为PIL图像
@@ -3,6 +3,9 @@ import logging
 import base64
 import requests
 
+from ..common.image_encoding import encode_image
+from ..common.response_cache import response_cache
+
 # 配置日志
 logging.basicConfig(
     level=logging.DEBUG,  # 改为DEBUG级别
@@ -102,6 +105,11 @@ class BailianVLNode:
                     "label": "随机种子",
                     "description": "随机种子（0为随机）"
                 }),
+                "use_cache": ("BOOLEAN", {
+                    "default": True,
+                    "label": "使用响应缓存",
+                    "description": "固定种子时相同的请求直接返回本地缓存的结果，不再调用API（随机种子时不缓存）"
+                }),
             }
         }
     
@@ -110,7 +118,7 @@ class BailianVLNode:
     FUNCTION = "call_vl"
     CATEGORY = "XnanTool/API/阿里百炼"
     
-    def call_vl(self, prompt, image, model, api_key=None, temperature=0.7, top_p=0.95, max_tokens=1024, seed=0):
+    def call_vl(self, prompt, image, model, api_key=None, temperature=0.7, top_p=0.95, max_tokens=1024, seed=0, use_cache=True):
         """
         调用阿里云百炼VL模型
         
@@ -122,6 +130,8 @@ class BailianVLNode:
             temperature: 温度参数
             top_p: Top P参数
             max_tokens: 最大输出长度
+            seed: 随机种子
+            use_cache: 是否使用响应缓存（仅固定种子时生效）
             
         Returns:
             tuple: (响应文本,)
@@ -154,7 +164,7 @@ class BailianVLNode:
             
             # 将图片转换为base64
             try:
-                image_base64 = self.image_to_base64(image)
+                image_base64 = encode_image(image, image_format="JPEG", quality=75)
             except Exception as e:
                 return (f"错误：图片转换失败: {str(e)}",)
             
@@ -169,6 +179,16 @@ class BailianVLNode:
                 }
             ]
             
+            # 固定种子时优先返回缓存的响应（键包含图像编码数据）
+            cache_key = response_cache.key(
+                use_cache, seed > 0, "bailian_vl",
+                model=model, messages=messages, temperature=temperature, top_p=top_p,
+                max_tokens=max_tokens, seed=seed,
+            )
+            cached = response_cache.get(cache_key)
+            if cached is not None:
+                return tuple(cached)
+            
             # 构建调用参数
             params = {
                 "model": model,
@@ -256,64 +276,13 @@ class BailianVLNode:
             
             logger.info(f"百炼VL调用成功")
             
+            response_cache.put(cache_key, [response_text, full_response])
             return (response_text, full_response)
             
         except Exception as e:
             error_msg = f"调用百炼VL时发生错误: {str(e)}"
             logger.error(error_msg)
             return (error_msg,)
-    
-    def image_to_base64(self, image):
-        """
-        将PyTorch张量图片转换为base64字符串
-        
-        Args:
-            image: PyTorch张量，格式为 (1, H, W, C)，值范围 [0, 1]
-            
-        Returns:
-            str: base64编码的图片字符串
-        """
-        import torch
-        import numpy as np
-        from PIL import Image
-        import io
-        
-        # 检查输入格式
-        if isinstance(image, torch.Tensor):
-            # 转换到CPU并移除batch维度
-            if image.dim() == 4:
-                image = image[0]
-            
-            # 转换到CPU并转换为numpy
-            image_np = image.cpu().numpy()
-            
-            # 转换为uint8格式 [0, 255]
-            if image_np.max() <= 1.0:
-                image_np = (image_np * 255).astype(np.uint8)
-            else:
-                image_np = image_np.astype(np.uint8)
-            
-            # 转换为HWC格式
-            if image_np.shape[0] == 3:  # CHW格式
-                image_np = image_np.transpose(1, 2, 0)
-            
-            # 创建PIL图像
-            if image_np.shape[2] == 1:  # 灰度图
-                pil_image = Image.fromarray(image_np.squeeze(), 'L')
-            elif image_np.shape[2] == 4:  # RGBA
-                pil_image = Image.fromarray(image_np, 'RGBA')
-            else:  # RGB
-                pil_image = Image.fromarray(image_np, 'RGB')
-        else:
-            pil_image = image
-        
-        # 转换为JPEG格式
-        buffered = io.BytesIO()
-        pil_image.save(buffered, format="JPEG")
-        
-        # 编码为base64
-        import base64
-        return base64.b64encode(buffered.getvalue()).decode('utf-8')
 
 
 # 注册节点
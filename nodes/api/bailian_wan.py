@@ -3,6 +3,8 @@ import logging
 import base64
 import io
 
+from ..common.image_encoding import encode_image_data_url
+
 # 配置日志
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -221,7 +223,7 @@ class BailianWanNode:
             
             # 调用视频生成模型（视频生成需要异步调用）
             try:
-                import requests
+                from ..common.http_client import http_post
                 
                 # 构建请求URL
                 api_url = 'https://dashscope.aliyuncs.com/api/v1/services/aigc/video-generation/video-synthesis'
@@ -241,7 +243,7 @@ class BailianWanNode:
                 }
                 
                 # 发送异步请求
-                response = requests.post(api_url, headers=headers, json=payload)
+                response = http_post(api_url, headers=headers, json=payload)
                 
                 # 检查响应
                 if response.status_code != 200:
@@ -280,38 +282,10 @@ def tensor_to_base64(tensor):
         tensor: IMAGE Tensor (形状: [B, H, W, C], 值范围: 0-1)
         
     Returns:
-        str: Base64 格式的图片数据 (data:image/png;base64,...)
+        str: Base64 格式的图片数据 (data:image/jpeg;base64,...)，失败时返回None
     """
     try:
-        import torch
-        from PIL import Image
-        
-        # 如果是 batch，只取第一张
-        if len(tensor.shape) == 4:
-            tensor = tensor[0]
-        
-        # 将 tensor 从 [H, W, C] 转换为 [C, H, W]
-        if tensor.shape[2] == 3:
-            tensor = tensor.permute(2, 0, 1)
-        
-        # 将值从 [0, 1] 转换为 [0, 255]
-        tensor = (tensor * 255).clamp(0, 255).to(torch.uint8)
-        
-        # 转换为 numpy
-        np_img = tensor.permute(1, 2, 0).cpu().numpy()
-        
-        # 转换为 PIL Image
-        image = Image.fromarray(np_img, mode='RGB')
-        
-        # 保存到内存缓冲区
-        buffer = io.BytesIO()
-        image.save(buffer, format="PNG")
-        
-        # 转换为 Base64
-        base64_data = base64.b64encode(buffer.getvalue()).decode('utf-8')
-        
-        return f"data:image/png;base64,{base64_data}"
-        
+        return encode_image_data_url(tensor, image_format="JPEG", quality=95)
     except Exception as e:
         logger.error(f"Tensor 转 Base64 失败: {str(e)}")
         return None
@@ -376,7 +350,7 @@ class BailianWanQueryNode:
             
             # 查询任务状态
             try:
-                import requests
+                from ..common.http_client import http_get
                 import json
                 
                 # 构建请求URL
@@ -388,7 +362,7 @@ class BailianWanQueryNode:
                 }
                 
                 # 发送GET请求
-                response = requests.get(api_url, headers=headers)
+                response = http_get(api_url, headers=headers)
                 
                 # 检查响应
                 if response.status_code != 200:
@@ -5,6 +5,9 @@ import requests
 import socket
 from urllib3.util import connection
 
+from ..common.http_client import http_post
+from ..common.response_cache import response_cache
+
 # 配置日志
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -110,6 +113,11 @@ class GenericAPILLMNode:
                     "label": "随机种子",
                     "description": "随机种子（0为随机）"
                 }),
+                "use_cache": ("BOOLEAN", {
+                    "default": True,
+                    "label": "使用响应缓存",
+                    "description": "固定种子时相同的请求直接返回本地缓存的结果，不再调用API（随机种子时不缓存）"
+                }),
             }
         }
     
@@ -120,7 +128,7 @@ class GenericAPILLMNode:
     
     def call_llm_api(self, api_url, api_key, model, system_prompt, user_prompt, 
                  temperature=0.7, top_p=1.0, max_tokens=1024, 
-                 presence_penalty=0.0, frequency_penalty=0.0, extra_params="", seed=0):
+                 presence_penalty=0.0, frequency_penalty=0.0, extra_params="", seed=0, use_cache=True):
         """
         调用大语言模型API
         
@@ -137,6 +145,7 @@ class GenericAPILLMNode:
             frequency_penalty: 频率惩罚
             extra_params: 额外的JSON参数
             seed: 随机种子
+            use_cache: 是否使用响应缓存（仅固定种子时生效）
             
         Returns:
             tuple: (响应文本, 原始响应JSON)
@@ -203,12 +212,21 @@ class GenericAPILLMNode:
                 except json.JSONDecodeError as e:
                     logger.warning(f"额外参数JSON解析失败: {str(e)}")
             
+            # 固定种子时优先返回缓存的响应
+            cache_key = response_cache.key(
+                use_cache, payload.get("seed") is not None, "generic_llm",
+                api_url=api_url, payload=payload,
+            )
+            cached = response_cache.get(cache_key)
+            if cached is not None:
+                return tuple(cached)
+            
             # 发送请求
             logger.info(f"正在调用API: {api_url}")
             logger.info(f"使用模型: {model}")
             logger.info(f"请求参数: {json.dumps(payload, ensure_ascii=False)[:500]}...")
             
-            response = requests.post(
+            response = http_post(
                 api_url,
                 headers=headers,
                 json=payload,
@@ -276,6 +294,7 @@ class GenericAPILLMNode:
                 response_text = raw_response
             
             logger.info(f"API调用成功")
+            response_cache.put(cache_key, [response_text, raw_response])
             return (response_text, raw_response)
             
         except requests.exceptions.Timeout:
@@ -4,10 +4,71 @@ import torch
 import numpy as np
 from PIL import Image
 import io
-import requests
+from concurrent.futures import ThreadPoolExecutor
 from volcenginesdkarkruntime import Ark
 from volcenginesdkarkruntime.types.images.images import SequentialImageGenerationOptions
 
+from ..common.http_client import http_get
+from ..common.image_encoding import encode_image_data_url
+
+# 同时下载的图像数量上限
+MAX_DOWNLOAD_WORKERS = 4
+
+
+def _download_image_tensor(url):
+    """下载图像并转换为 (1, H, W, C) 的torch张量（在工作线程中执行）"""
+    response = http_get(url)
+    response.raise_for_status()
+    
+    # 将图像数据转换为PIL Image
+    image_data = Image.open(io.BytesIO(response.content)).convert('RGB')
+    
+    # 转换为numpy数组
+    np_image = np.array(image_data, dtype=np.float32) / 255.0
+    
+    # 转换为torch张量 (H, W, C) -> (B, H, W, C)
+    return torch.unsqueeze(torch.from_numpy(np_image), 0)
+
+
+class _ImageDownloader:
+    """
+    并发下载图像
+    收到URL后立即提交到有界线程池，下载和解码都在工作线程中完成，
+    流式响应中后续图像生成的同时前面的图像已在下载；collect() 按收到URL的顺序返回结果
+    """
+    
+    def __init__(self, max_workers=MAX_DOWNLOAD_WORKERS):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="xnantool-seedream-download")
+        self._futures = []
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        # 出错时不再等待尚未开始的下载
+        self._executor.shutdown(wait=exc_type is None, cancel_futures=exc_type is not None)
+        return False
+    
+    def submit(self, url):
+        self._futures.append(self._executor.submit(_download_image_tensor, url))
+    
+    def collect(self, skip_failed=False):
+        """
+        等待所有下载完成，按提交顺序返回图像张量
+        
+        Args:
+            skip_failed: 为True时跳过下载失败的图像，否则抛出第一个错误
+        """
+        images = []
+        for future in self._futures:
+            try:
+                images.append(future.result())
+            except Exception as e:
+                if not skip_failed:
+                    raise
+                print(f"下载或转换图像失败: {e}")
+        return images
+
 
 class DoubaoSeedreamTextToImageGenerationNode:
     """
@@ -169,20 +230,11 @@ class DoubaoSeedreamTextToImageGenerationNode:
                 
                 # 下载并转换图像
                 print("----- 下载并转换图像 -----")
-                for idx, img_url in enumerate(image_urls):
-                    print(f"下载第 {idx + 1} 张图像: {img_url}")
-                    response = requests.get(img_url)
-                    response.raise_for_status()
-                    
-                    # 将图像数据转换为PIL Image
-                    image_data = Image.open(io.BytesIO(response.content)).convert('RGB')
-                    
-                    # 转换为numpy数组
-                    np_image = np.array(image_data, dtype=np.float32) / 255.0
-                    
-                    # 转换为torch张量 (H, W, C) -> (B, H, W, C)
-                    image_tensor = torch.unsqueeze(torch.from_numpy(np_image), 0)
-                    all_images.append(image_tensor)
+                with _ImageDownloader() as downloader:
+                    for idx, img_url in enumerate(image_urls):
+                        print(f"下载第 {idx + 1} 张图像: {img_url}")
+                        downloader.submit(img_url)
+                    all_images = downloader.collect()
                 
                 status_info = f"图像生成成功，尺寸: {actual_size}\n生成图片数量: {len(image_urls)}\n"
                 for idx, img_url in enumerate(image_urls):
@@ -209,45 +261,33 @@ class DoubaoSeedreamTextToImageGenerationNode:
                 # 处理流式响应
                 print("----- 处理流式响应 -----")
                 image_urls = []
-                for event in images_response:
-                    if event is None:
-                        continue
+                with _ImageDownloader() as downloader:
+                    for event in images_response:
+                        if event is None:
+                            continue
                         
-                    if event.type == "image_generation.partial_failed":
-                        print(f"图像生成失败: {event.error}")
-                        if event.error is not None and event.error.code == "InternalServiceError":
-                            break
+                        if event.type == "image_generation.partial_failed":
+                            print(f"图像生成失败: {event.error}")
+                            if event.error is not None and event.error.code == "InternalServiceError":
+                                break
                             
-                    elif event.type == "image_generation.partial_succeeded":
-                        if event.error is None and event.url:
-                            print(f"收到图像: {event.url}")
-                            image_urls.append(event.url)
+                        elif event.type == "image_generation.partial_succeeded":
+                            if event.error is None and event.url:
+                                print(f"收到图像: {event.url}")
+                                image_urls.append(event.url)
                             
-                            # 保存第一个图像的URL
-                            if not first_image_url:
-                                first_image_url = event.url
+                                # 保存第一个图像的URL
+                                if not first_image_url:
+                                    first_image_url = event.url
                             
-                            # 下载并转换图像
-                            try:
-                                response = requests.get(event.url)
-                                response.raise_for_status()
+                                # 立即在后台下载并转换图像，不阻塞接收后续事件
+                                downloader.submit(event.url)
                                 
-                                # 将图像数据转换为PIL Image
-                                image_data = Image.open(io.BytesIO(response.content)).convert('RGB')
-                                
-                                # 转换为numpy数组
-                                np_image = np.array(image_data, dtype=np.float32) / 255.0
-                                
-                                # 转换为torch张量 (H, W, C) -> (B, H, W, C)
-                                image_tensor = torch.unsqueeze(torch.from_numpy(np_image), 0)
-                                all_images.append(image_tensor)
-                            except Exception as e:
-                                print(f"下载或转换图像失败: {e}")
-                                
-                    elif event.type == "image_generation.completed":
-                        if event.error is None:
-                            print("批量图像生成完成")
-                            print(f"使用量: {event.usage}")
+                        elif event.type == "image_generation.completed":
+                            if event.error is None:
+                                print("批量图像生成完成")
+                                print(f"使用量: {event.usage}")
+                    all_images = downloader.collect(skip_failed=True)
                 
                 status_info = f"成功生成 {len(all_images)} 张图像，尺寸: {actual_size}\n"
                 for idx, img_url in enumerate(image_urls):
@@ -383,40 +423,15 @@ class DoubaoSeedreamImageToImageGenerationNode:
         print(f"----- 将ComfyUI IMAGE格式转换为Base64编码 -----")
         
         # 处理多张参考图
-        import base64
-        from io import BytesIO
         image_data_uris = []
         
         for idx, image in enumerate(images):
             print(f"----- 处理第 {idx + 1} 张参考图片 -----")
             
-            # 确保数据类型正确
-            img_tensor = image.float()
-            
-            # 处理batch维度
-            if img_tensor.shape[0] > 1:
-                img_tensor = img_tensor[0]
-            
-            # 调整维度顺序：[batch, height, width, channels] -> [height, width, channels]
-            if len(img_tensor.shape) == 4:
-                # 如果是 [batch, channels, height, width] 格式
-                if img_tensor.shape[1] < img_tensor.shape[2] and img_tensor.shape[1] < img_tensor.shape[3]:
-                    img_tensor = img_tensor.permute(0, 2, 3, 1)
-                img_tensor = img_tensor[0]
-            
-            # 确保张量在CPU上并转换为numpy
-            np_image = (img_tensor.clamp(0, 1).cpu().numpy() * 255).astype(np.uint8)
-            
-            # 转换为PIL Image
-            pil_image = Image.fromarray(np_image)
-            
-            # 转换为Base64编码
-            buffered = BytesIO()
-            pil_image.save(buffered, format="PNG")
-            base64_image = base64.b64encode(buffered.getvalue()).decode('utf-8')
-            image_data_uri = f"data:image/png;base64,{base64_image}"
+            # 转换为Base64编码（超大图先等比缩小，相同的参考图只编码一次）
+            image_data_uri = encode_image_data_url(image, image_format="JPEG", quality=95)
             image_data_uris.append(image_data_uri)
-            print(f"第 {idx + 1} 张图片已转换为Base64编码，长度: {len(base64_image)}")
+            print(f"第 {idx + 1} 张图片已转换为Base64编码，长度: {len(image_data_uri)}")
         
         # 初始化Ark客户端
         client = Ark(
@@ -516,58 +531,37 @@ class DoubaoSeedreamImageToImageGenerationNode:
             if mode == "single":
                 # 单张模式直接下载图像
                 print("----- 下载并转换图像 -----")
-                for idx, img_url in enumerate(image_urls):
-                    print(f"下载第 {idx + 1} 张图像: {img_url}")
-                    response = requests.get(img_url)
-                    response.raise_for_status()
-                    
-                    # 将图像数据转换为PIL Image
-                    image_data = Image.open(io.BytesIO(response.content)).convert('RGB')
-                    
-                    # 转换为numpy数组
-                    np_image = np.array(image_data, dtype=np.float32) / 255.0
-                    
-                    # 转换为torch张量 (H, W, C) -> (B, H, W, C)
-                    image_tensor = torch.unsqueeze(torch.from_numpy(np_image), 0)
-                    all_images.append(image_tensor)
+                with _ImageDownloader() as downloader:
+                    for idx, img_url in enumerate(image_urls):
+                        print(f"下载第 {idx + 1} 张图像: {img_url}")
+                        downloader.submit(img_url)
+                    all_images = downloader.collect()
             else:
                 # 批量模式处理流式响应
                 print("----- 处理流式响应 -----")
-                for event in images_response:
-                    if event is None:
-                        continue
+                with _ImageDownloader() as downloader:
+                    for event in images_response:
+                        if event is None:
+                            continue
                         
-                    if event.type == "image_generation.partial_failed":
-                        print(f"图像生成失败: {event.error}")
-                        if event.error is not None and event.error.code == "InternalServiceError":
-                            break
+                        if event.type == "image_generation.partial_failed":
+                            print(f"图像生成失败: {event.error}")
+                            if event.error is not None and event.error.code == "InternalServiceError":
+                                break
                             
-                    elif event.type == "image_generation.partial_succeeded":
-                        if event.error is None and event.url:
-                            print(f"收到图像: {event.url}")
-                            image_urls.append(event.url)
+                        elif event.type == "image_generation.partial_succeeded":
+                            if event.error is None and event.url:
+                                print(f"收到图像: {event.url}")
+                                image_urls.append(event.url)
                             
-                            # 下载并转换图像
-                            try:
-                                response = requests.get(event.url)
-                                response.raise_for_status()
-                                
-                                # 将图像数据转换为PIL Image
-                                image_data = Image.open(io.BytesIO(response.content)).convert('RGB')
-                                
-                                # 转换为numpy数组
-                                np_image = np.array(image_data, dtype=np.float32) / 255.0
-                                
-                                # 转换为torch张量 (H, W, C) -> (B, H, W, C)
-                                image_tensor = torch.unsqueeze(torch.from_numpy(np_image), 0)
-                                all_images.append(image_tensor)
-                            except Exception as e:
-                                print(f"下载或转换图像失败: {e}")
+                                # 立即在后台下载并转换图像，不阻塞接收后续事件
+                                downloader.submit(event.url)
                                 
-                    elif event.type == "image_generation.completed":
-                        if event.error is None:
-                            print("批量图像生成完成")
-                            print(f"使用量: {event.usage}")
+                        elif event.type == "image_generation.completed":
+                            if event.error is None:
+                                print("批量图像生成完成")
+                                print(f"使用量: {event.usage}")
+                    all_images = downloader.collect(skip_failed=True)
                 
                 print(f"最终接收到的图像数量: {len(image_urls)}")
             
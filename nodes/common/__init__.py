@@ -0,0 +1 @@
+# 跨节点模块共享的工具函数（不注册任何节点）
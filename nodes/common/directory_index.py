@@ -0,0 +1,160 @@
+"""
+目录列表缓存
+按 (目录, 是否递归, 扩展名集合, 条目类型) 缓存排序、过滤后的目录列表，
+记录扫描时每个目录的修改时间，之后只需stat这些目录即可判断列表是否仍然有效，
+避免在网络共享等慢速文件系统上每次执行或刷新界面都重新 listdir/walk。
+同时提供可直接作为 IS_CHANGED 返回值的目录指纹
+"""
+
+import os
+import hashlib
+import threading
+import logging
+from collections import OrderedDict
+
+# 配置日志
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# 最多缓存的目录列表数量
+MAX_CACHED_LISTINGS = 128
+
+
+def normalize_extensions(extensions):
+    """把 [".MP4", "jpg", ...] 或 "mp4,jpg" 统一为不带点的小写扩展名集合，空值表示不过滤"""
+    if not extensions:
+        return frozenset()
+    if isinstance(extensions, str):
+        extensions = extensions.split(",")
+    return frozenset(ext.strip().lower().lstrip(".") for ext in extensions if ext.strip())
+
+
+class _Listing:
+    """一次扫描的结果"""
+    __slots__ = ("dir_mtimes", "entries")
+
+    def __init__(self, dir_mtimes, entries):
+        self.dir_mtimes = dir_mtimes
+        self.entries = entries
+
+
+class DirectoryIndex:
+    """
+    进程级目录列表缓存
+    递归列表会记录所有子目录的修改时间，任一子目录增删条目都会使缓存失效；
+    文件内容被原地修改不会改变目录修改时间，需要感知内容变化时使用 fingerprint(include_file_stats=True)
+    """
+
+    def __init__(self, max_entries=MAX_CACHED_LISTINGS):
+        self.max_entries = max_entries
+        self._listings = OrderedDict()
+        self._lock = threading.Lock()
+
+    def list_entries(self, directory, recursive=False, extensions=None, kind="files"):
+        """
+        获取目录下的条目列表（已排序）
+
+        Args:
+            directory: 目录路径
+            recursive: 是否递归子目录（返回相对路径）
+            extensions: 扩展名过滤，留空则不过滤（仅对文件生效）
+            kind: "files" 列出文件，"dirs" 列出文件夹
+
+        Returns:
+            tuple[str]: 相对于directory的路径
+        """
+        root = os.path.abspath(directory)
+        key = (root, bool(recursive), normalize_extensions(extensions), kind)
+        with self._lock:
+            listing = self._listings.get(key)
+            if listing is not None and self._is_valid(listing):
+                self._listings.move_to_end(key)
+                return listing.entries
+
+        listing = self._scan(root, bool(recursive), key[2], kind)
+        with self._lock:
+            self._listings[key] = listing
+            self._listings.move_to_end(key)
+            while len(self._listings) > self.max_entries:
+                self._listings.popitem(last=False)
+        return listing.entries
+
+    def list_files(self, directory, recursive=False, extensions=None):
+        """列出文件（已排序）"""
+        return self.list_entries(directory, recursive, extensions, "files")
+
+    def list_dirs(self, directory):
+        """列出直接子文件夹（已排序）"""
+        return self.list_entries(directory, False, None, "dirs")
+
+    def fingerprint(self, directory, recursive=False, extensions=None, kind="files", include_file_stats=False):
+        """
+        计算目录列表指纹，可作为节点 IS_CHANGED 的返回值
+
+        Args:
+            include_file_stats: 是否把每个文件的大小和修改时间计入指纹（可感知内容修改，但需要逐个stat）
+        """
+        if not os.path.isdir(directory):
+            return f"missing:{os.path.abspath(directory)}"
+        entries = self.list_entries(directory, recursive, extensions, kind)
+        hasher = hashlib.blake2b(digest_size=16)
+        for entry in entries:
+            hasher.update(entry.encode("utf-8", "surrogatepass"))
+            hasher.update(b"\0")
+            if include_file_stats:
+                try:
+                    st = os.stat(os.path.join(directory, entry))
+                    hasher.update(f"{st.st_size}:{st.st_mtime_ns}".encode("ascii"))
+                except OSError:
+                    hasher.update(b"?")
+        return hasher.hexdigest()
+
+    def invalidate(self, directory=None):
+        """丢弃缓存（不指定目录时清空全部）"""
+        with self._lock:
+            if directory is None:
+                self._listings.clear()
+                return
+            root = os.path.abspath(directory)
+            for key in [k for k in self._listings if k[0] == root]:
+                del self._listings[key]
+
+    @staticmethod
+    def _is_valid(listing):
+        try:
+            return all(os.stat(d).st_mtime_ns == mtime for d, mtime in listing.dir_mtimes.items())
+        except OSError:
+            return False
+
+    @staticmethod
+    def _scan(root, recursive, extensions, kind):
+        dir_mtimes = {}
+        entries = []
+        pending = [root]
+        while pending:
+            current = pending.pop()
+            try:
+                # 先记录修改时间再扫描：扫描期间发生的变化会在下次校验时被发现
+                dir_mtimes[current] = os.stat(current).st_mtime_ns
+                with os.scandir(current) as it:
+                    for entry in it:
+                        rel = entry.name if current == root else os.path.join(os.path.relpath(current, root), entry.name)
+                        if entry.is_dir():
+                            if kind == "dirs":
+                                entries.append(rel)
+                            if recursive and not entry.is_symlink():
+                                pending.append(entry.path)
+                        elif kind == "files" and entry.is_file():
+                            if extensions and os.path.splitext(entry.name)[1].lower().lstrip(".") not in extensions:
+                                continue
+                            entries.append(rel)
+            except OSError as e:
+                if current == root:
+                    raise
+                logger.warning(f"无法读取目录 {current}: {str(e)}")
+        entries.sort()
+        return _Listing(dir_mtimes, tuple(entries))
+
+
+# 全局共享实例
+directory_index = DirectoryIndex()
@@ -0,0 +1,211 @@
+"""
+文件哈希引擎
+供批量MD5重命名等节点共用：使用预分配缓冲区大块读取文件，
+多线程并行计算（hashlib在处理大块数据时会释放GIL），
+并通过目录下的哈希索引文件按 (路径, 大小, 修改时间) 复用上次的计算结果
+"""
+
+import os
+import json
+import hashlib
+import threading
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+# 配置日志
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# 单次读取的块大小
+HASH_CHUNK_SIZE = 4 * 1024 * 1024
+
+# 哈希索引文件名（保存在被处理目录的根目录下）
+HASH_INDEX_FILENAME = ".xnantool_hash_index.json"
+
+_INDEX_VERSION = 1
+
+# 每个线程复用同一块读取缓冲区，避免每个文件都分配并清零数MB内存
+_local = threading.local()
+
+
+def _read_buffer(chunk_size):
+    buffer = getattr(_local, "buffer", None)
+    if buffer is None or len(buffer) != chunk_size:
+        buffer = bytearray(chunk_size)
+        _local.buffer = buffer
+        _local.view = memoryview(buffer)
+    return buffer, _local.view
+
+
+def hash_file(file_path, algorithm="md5", chunk_size=HASH_CHUNK_SIZE):
+    """
+    计算文件哈希值
+
+    Args:
+        file_path: 文件路径
+        algorithm: hashlib支持的算法名
+        chunk_size: 单次读取的字节数
+
+    Returns:
+        str: 十六进制哈希值
+    """
+    hasher = hashlib.new(algorithm)
+    buffer, view = _read_buffer(chunk_size)
+    with open(file_path, "rb", buffering=0) as f:
+        while True:
+            n = f.readinto(buffer)
+            if not n:
+                break
+            hasher.update(view[:n])
+    return hasher.hexdigest()
+
+
+class HashIndex:
+    """
+    目录级哈希索引
+    以相对于根目录的路径为键，记录文件大小、修改时间(ns)和哈希值；
+    文件大小和修改时间均未变化时直接复用记录的哈希值
+    """
+
+    def __init__(self, root_directory, algorithm="md5"):
+        self.root = os.path.abspath(root_directory)
+        self.algorithm = algorithm
+        self.index_path = os.path.join(self.root, HASH_INDEX_FILENAME)
+        self._entries = {}
+        self._dirty = False
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        if not os.path.isfile(self.index_path):
+            return
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") == _INDEX_VERSION and data.get("algorithm") == self.algorithm:
+                self._entries = data.get("files", {})
+        except Exception as e:
+            logger.warning(f"读取哈希索引 {self.index_path} 失败，将重新计算: {str(e)}")
+            self._entries = {}
+
+    def _key(self, file_path):
+        rel = os.path.relpath(os.path.abspath(file_path), self.root)
+        if rel.startswith(os.pardir):
+            return None
+        return rel.replace(os.sep, "/")
+
+    def lookup(self, file_path, stat_result=None):
+        """返回未变化文件的已记录哈希值，否则返回None"""
+        key = self._key(file_path)
+        if key is None:
+            return None
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        st = stat_result or os.stat(file_path)
+        if entry.get("size") == st.st_size and entry.get("mtime_ns") == st.st_mtime_ns:
+            return entry.get("hash")
+        return None
+
+    def put(self, file_path, digest, stat_result=None):
+        """记录文件哈希值（根目录之外的文件忽略）"""
+        key = self._key(file_path)
+        if key is None:
+            return
+        st = stat_result or os.stat(file_path)
+        with self._lock:
+            self._entries[key] = {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "hash": digest}
+            self._dirty = True
+
+    def remove(self, file_path):
+        """移除文件记录"""
+        key = self._key(file_path)
+        with self._lock:
+            if key is not None and self._entries.pop(key, None) is not None:
+                self._dirty = True
+
+    def save(self):
+        """将索引写回磁盘（先写临时文件再替换，避免中断时损坏索引）"""
+        with self._lock:
+            if not self._dirty:
+                return
+            tmp_path = self.index_path + ".tmp"
+            try:
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    json.dump({"version": _INDEX_VERSION, "algorithm": self.algorithm, "files": self._entries},
+                              f, ensure_ascii=False, separators=(",", ":"))
+                os.replace(tmp_path, self.index_path)
+                self._dirty = False
+            except Exception as e:
+                logger.warning(f"保存哈希索引 {self.index_path} 失败: {str(e)}")
+                try:
+                    os.remove(tmp_path)
+                except OSError:
+                    pass
+
+
+def hash_files(file_paths, algorithm="md5", num_workers=0, index=None):
+    """
+    并行计算多个文件的哈希值
+
+    Args:
+        file_paths: 文件路径列表
+        algorithm: 哈希算法
+        num_workers: 线程数，0为自动（CPU核心数），1为顺序计算
+        index: 可选的HashIndex，命中时跳过读取文件，新结果会写入索引
+
+    Returns:
+        (results, errors, cached_count)
+        results: {路径: 哈希值}
+        errors: {路径: 错误信息}
+        cached_count: 从索引中复用的文件数
+    """
+    results = {}
+    errors = {}
+    pending = []
+
+    for path in file_paths:
+        try:
+            st = os.stat(path)
+        except OSError as e:
+            errors[path] = str(e)
+            continue
+        digest = index.lookup(path, st) if index is not None else None
+        if digest:
+            results[path] = digest
+        else:
+            pending.append((path, st))
+    cached_count = len(results)
+
+    def _work(item):
+        path, st = item
+        return path, st, hash_file(path, algorithm)
+
+    if num_workers <= 0:
+        num_workers = os.cpu_count() or 1
+    num_workers = max(1, min(num_workers, len(pending)))
+
+    if pending:
+        if num_workers == 1:
+            outcomes = []
+            for item in pending:
+                try:
+                    outcomes.append(_work(item))
+                except Exception as e:
+                    errors[item[0]] = str(e)
+        else:
+            outcomes = []
+            with ThreadPoolExecutor(max_workers=num_workers) as executor:
+                futures = {executor.submit(_work, item): item[0] for item in pending}
+                for future, path in futures.items():
+                    try:
+                        outcomes.append(future.result())
+                    except Exception as e:
+                        errors[path] = str(e)
+
+        for path, st, digest in outcomes:
+            results[path] = digest
+            if index is not None:
+                index.put(path, digest, st)
+
+    return results, errors, cached_count
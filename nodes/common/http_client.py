@@ -0,0 +1,111 @@
+"""
+共享HTTP客户端
+所有API节点共用同一组带连接池的 HTTPAdapter：同一主机的请求复用keep-alive连接，
+省去每次调用的DNS解析、TCP连接和TLS握手；默认超时、每主机连接数和重试策略可通过环境变量调整。
+遇到429/5xx时按指数退避重试（遵循Retry-After）；POST只在429/503时重试，避免重复提交生成任务
+"""
+
+import os
+import threading
+import logging
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# 配置日志
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def _env_number(name, default, cast=float):
+    try:
+        return cast(os.environ.get(name, default))
+    except ValueError:
+        logger.warning(f"{name} 不是有效数字，使用默认值 {default}")
+        return default
+
+
+# 默认超时（秒）：(连接超时, 读取超时)
+DEFAULT_CONNECT_TIMEOUT = _env_number("XNANTOOL_HTTP_CONNECT_TIMEOUT", 10)
+DEFAULT_READ_TIMEOUT = _env_number("XNANTOOL_HTTP_READ_TIMEOUT", 120)
+# 每个主机保留的最大连接数
+POOL_MAXSIZE = _env_number("XNANTOOL_HTTP_POOL_MAXSIZE", 16, int)
+# 缓存连接池的主机数量
+POOL_CONNECTIONS = 32
+# 最大重试次数和退避系数（第n次重试前等待 backoff * 2^(n-1) 秒）
+MAX_RETRIES = _env_number("XNANTOOL_HTTP_RETRIES", 3, int)
+BACKOFF_FACTOR = _env_number("XNANTOOL_HTTP_BACKOFF", 0.5)
+
+RETRY_STATUS_CODES = frozenset([429, 500, 502, 503, 504])
+# 非幂等请求只在服务端明确未处理请求时重试
+NON_IDEMPOTENT_RETRY_STATUS_CODES = frozenset([429, 503])
+
+
+class _ApiRetry(Retry):
+    """GET等幂等请求在429/5xx时重试，POST只在429/503时重试"""
+
+    def is_retry(self, method, status_code, has_retry_after=False):
+        if method and method.upper() not in self.DEFAULT_ALLOWED_METHODS:
+            if not self.total or status_code not in NON_IDEMPOTENT_RETRY_STATUS_CODES:
+                return False
+            return True
+        return super().is_retry(method, status_code, has_retry_after)
+
+
+def _build_adapter():
+    retry = _ApiRetry(
+        total=MAX_RETRIES,
+        connect=MAX_RETRIES,
+        read=0,  # 读取超时不重试：请求可能已被服务端处理
+        status=MAX_RETRIES,
+        backoff_factor=BACKOFF_FACTOR,
+        status_forcelist=RETRY_STATUS_CODES,
+        raise_on_status=False,  # 重试用尽后返回最后的响应，由节点按状态码给出提示
+        respect_retry_after_header=True,
+    )
+    return HTTPAdapter(pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_MAXSIZE, max_retries=retry)
+
+
+# 所有线程共享同一组适配器（即同一组连接池），Session本身按线程隔离
+_adapter = _build_adapter()
+_local = threading.local()
+
+
+def get_http_session():
+    """获取当前线程的共享连接池Session"""
+    session = getattr(_local, "session", None)
+    if session is None:
+        session = requests.Session()
+        session.mount("https://", _adapter)
+        session.mount("http://", _adapter)
+        _local.session = session
+    return session
+
+
+def http_request(method, url, timeout=None, **kwargs):
+    """
+    发送HTTP请求（未指定超时时使用默认超时）
+
+    Args:
+        method: 请求方法
+        url: 请求地址
+        timeout: 超时秒数或 (连接超时, 读取超时)
+        **kwargs: 其余参数同 requests.request
+
+    Returns:
+        requests.Response
+    """
+    if timeout is None:
+        timeout = (DEFAULT_CONNECT_TIMEOUT, DEFAULT_READ_TIMEOUT)
+    return get_http_session().request(method, url, timeout=timeout, **kwargs)
+
+
+def http_get(url, **kwargs):
+    """发送GET请求"""
+    return http_request("GET", url, **kwargs)
+
+
+def http_post(url, **kwargs):
+    """发送POST请求"""
+    return http_request("POST", url, **kwargs)
@@ -0,0 +1,149 @@
+"""
+图像Base64编码
+各API节点上传参考图时共用的编码器：超过最长边限制时先等比缩小，再按指定格式（JPEG/WebP/PNG）和质量编码。
+编码结果按图像内容哈希缓存，同一张参考图在多次API调用中只编码一次
+"""
+
+import io
+import base64
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from PIL import Image
+
+# 默认最长边（像素），0表示不缩放
+DEFAULT_MAX_SIDE = 2048
+# 默认编码格式和质量（PNG忽略质量参数）
+DEFAULT_FORMAT = "JPEG"
+DEFAULT_QUALITY = 90
+SUPPORTED_FORMATS = ("JPEG", "WebP", "PNG")
+
+# 缓存的编码结果数量和总字符数上限
+MAX_CACHED_IMAGES = 32
+MAX_CACHED_CHARS = 128 * 1024 * 1024
+
+_MIME_TYPES = {"JPEG": "image/jpeg", "WebP": "image/webp", "PNG": "image/png"}
+
+
+def _to_uint8_array(image):
+    """把 (B,H,W,C)/(H,W,C)/(C,H,W) 的张量或numpy数组转换为 uint8 的 (H,W,C) 数组，批次只取第一张"""
+    if hasattr(image, "cpu"):
+        image = image.detach().cpu().numpy()
+    array = np.asarray(image)
+    if array.ndim == 4:
+        array = array[0]
+    if array.ndim == 2:
+        array = array[:, :, None]
+    if array.shape[2] not in (1, 3, 4) and array.shape[0] in (1, 3, 4):
+        # CHW格式
+        array = array.transpose(1, 2, 0)
+
+    if array.dtype != np.uint8:
+        # 值范围 [0, 1] 的浮点图像放大到 [0, 255]
+        scale = 255.0 if array.size == 0 or array.max() <= 1.0 else 1.0
+        array = np.clip(array * scale, 0, 255).astype(np.uint8)
+    return np.ascontiguousarray(array)
+
+
+def _content_key(array, *params):
+    hasher = hashlib.blake2b(digest_size=16)
+    hasher.update(repr((array.shape, *params)).encode("ascii"))
+    hasher.update(array.data)
+    return hasher.digest()
+
+
+def _encode(pil_image, image_format, quality, max_side):
+    if max_side and max(pil_image.size) > max_side:
+        ratio = max_side / max(pil_image.size)
+        new_size = (max(1, round(pil_image.width * ratio)), max(1, round(pil_image.height * ratio)))
+        pil_image = pil_image.resize(new_size, Image.LANCZOS)
+
+    buffer = io.BytesIO()
+    if image_format == "JPEG":
+        if pil_image.mode not in ("RGB", "L"):
+            pil_image = pil_image.convert("RGB")
+        pil_image.save(buffer, format="JPEG", quality=quality)
+    elif image_format == "WebP":
+        pil_image.save(buffer, format="WebP", quality=quality, method=4)
+    else:
+        pil_image.save(buffer, format="PNG")
+    return base64.b64encode(buffer.getvalue()).decode("ascii")
+
+
+class ImageEncoder:
+    """带LRU缓存的图像Base64编码器"""
+
+    def __init__(self, max_entries=MAX_CACHED_IMAGES, max_chars=MAX_CACHED_CHARS):
+        self.max_entries = max_entries
+        self.max_chars = max_chars
+        self._cache = OrderedDict()
+        self._cached_chars = 0
+        self._lock = threading.Lock()
+
+    def encode(self, image, image_format=DEFAULT_FORMAT, quality=DEFAULT_QUALITY, max_side=DEFAULT_MAX_SIDE):
+        """
+        把图像编码为Base64字符串（不带data URL前缀）
+
+        Args:
+            image: ComfyUI IMAGE张量 (B,H,W,C)、numpy数组或PIL图像，批次只取第一张
+            image_format: 编码格式 (JPEG, WebP, PNG)
+            quality: JPEG/WebP质量 (1-100)
+            max_side: 最长边上限，超过时等比缩小；0表示保持原尺寸
+
+        Returns:
+            str: Base64编码的图像数据
+        """
+        if image_format not in SUPPORTED_FORMATS:
+            raise ValueError(f"不支持的图像编码格式: {image_format}")
+
+        if isinstance(image, Image.Image):
+            # PIL图像没有稳定的内容哈希，直接编码
+            return _encode(image, image_format, quality, max_side)
+
+        array = _to_uint8_array(image)
+        key = _content_key(array, image_format, quality, max_side)
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None:
+                self._cache.move_to_end(key)
+                return cached
+
+        mode = {1: "L", 3: "RGB", 4: "RGBA"}[array.shape[2]]
+        pil_image = Image.fromarray(array[:, :, 0] if mode == "L" else array, mode)
+        encoded = _encode(pil_image, image_format, quality, max_side)
+
+        with self._lock:
+            if key not in self._cache and len(encoded) <= self.max_chars:
+                self._cache[key] = encoded
+                self._cached_chars += len(encoded)
+                while len(self._cache) > self.max_entries or self._cached_chars > self.max_chars:
+                    _, evicted = self._cache.popitem(last=False)
+                    self._cached_chars -= len(evicted)
+        return encoded
+
+    def encode_data_url(self, image, image_format=DEFAULT_FORMAT, quality=DEFAULT_QUALITY, max_side=DEFAULT_MAX_SIDE):
+        """把图像编码为 data:image/...;base64,... 形式的data URL"""
+        encoded = self.encode(image, image_format, quality, max_side)
+        return f"data:{_MIME_TYPES[image_format]};base64,{encoded}"
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._cache.clear()
+            self._cached_chars = 0
+
+
+# 全局共享实例
+image_encoder = ImageEncoder()
+
+
+def encode_image(image, image_format=DEFAULT_FORMAT, quality=DEFAULT_QUALITY, max_side=DEFAULT_MAX_SIDE):
+    """使用全局编码器把图像编码为Base64字符串"""
+    return image_encoder.encode(image, image_format, quality, max_side)
+
+
+def encode_image_data_url(image, image_format=DEFAULT_FORMAT, quality=DEFAULT_QUALITY, max_side=DEFAULT_MAX_SIDE):
+    """使用全局编码器把图像编码为data URL"""
+    return image_encoder.encode_data_url(image, image_format, quality, max_side)
@@ -0,0 +1,157 @@
+"""
+输出文件命名服务
+为保存图片、生成视频、批量压缩等节点分配不冲突的文件名。
+每个输出目录用 os.scandir 扫描后，记录已有文件名以及每个 (前缀, 扩展名)
+已使用的最大数字后缀，之后分配文件名不再逐个 os.path.exists 试探，只对选中的候选文件名做一次 stat 确认
+（同时覆盖不区分大小写的文件系统）。
+目录修改时间变化（本进程写入或外部修改）时重新扫描，已删除文件的名称会被释放；
+连续写入时最多每 RESCAN_INTERVAL 秒重新扫描一次
+"""
+
+import os
+import re
+import time
+import threading
+import logging
+from collections import OrderedDict
+
+# 配置日志
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# 最多缓存的目录数量
+MAX_CACHED_DIRECTORIES = 64
+# 目录修改时间变化后重新扫描的最小间隔（秒）
+RESCAN_INTERVAL = 2.0
+# 已分配但尚未出现在磁盘上的文件名在重新扫描时继续占用的时间（秒），覆盖后台写入的延迟
+RESERVATION_TTL = 30
+
+# 把文件名拆分为 (主干, 末尾数字, 扩展名)，如 "video_003.mp4" -> ("video_", "003", ".mp4")
+_SUFFIX_PATTERN = re.compile(r"^(.*?)(\d+)((?:\.[^.]*)?)$")
+
+
+class _DirectoryIndex:
+    """单个目录的文件名索引（文件名按 os.path.normcase 比较）"""
+    __slots__ = ("mtime_ns", "scanned_at", "names", "max_suffix", "pending")
+
+    def __init__(self, mtime_ns):
+        self.mtime_ns = mtime_ns
+        self.scanned_at = time.monotonic()
+        self.names = set()
+        self.max_suffix = {}
+        # 本进程分配出去的文件名 -> 分配时间
+        self.pending = {}
+
+    def add(self, filename):
+        filename = os.path.normcase(filename)
+        self.names.add(filename)
+        match = _SUFFIX_PATTERN.match(filename)
+        if match:
+            key = (match.group(1), match.group(3))
+            number = int(match.group(2))
+            if number > self.max_suffix.get(key, 0):
+                self.max_suffix[key] = number
+
+
+class OutputNamingService:
+    """
+    进程级输出命名服务
+    同一进程内分配出去的文件名会立即记入索引，即使文件尚未写入磁盘也不会被重复分配
+    """
+
+    def __init__(self, max_directories=MAX_CACHED_DIRECTORIES):
+        self.max_directories = max_directories
+        self._indexes = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _dir_mtime(directory):
+        try:
+            return os.stat(directory).st_mtime_ns
+        except OSError:
+            return None
+
+    def _get_index(self, directory):
+        mtime_ns = self._dir_mtime(directory)
+        index = self._indexes.get(directory)
+        if index is not None and (
+            index.mtime_ns == mtime_ns or time.monotonic() - index.scanned_at < RESCAN_INTERVAL
+        ):
+            self._indexes.move_to_end(directory)
+            return index
+
+        new_index = _DirectoryIndex(mtime_ns)
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    new_index.add(entry.name)
+        except FileNotFoundError:
+            pass
+        if index is not None:
+            # 刚分配、可能还在后台写入的文件名继续占用；已出现在磁盘上的不再单独记录
+            now = time.monotonic()
+            for filename, reserved_at in index.pending.items():
+                if filename not in new_index.names and now - reserved_at < RESERVATION_TTL:
+                    new_index.add(filename)
+                    new_index.pending[filename] = reserved_at
+        index = new_index
+        self._indexes[directory] = index
+        while len(self._indexes) > self.max_directories:
+            self._indexes.popitem(last=False)
+        return index
+
+    def reserve_path(self, directory, base_name, ext, separator="_", pad_width=1, start=1, use_base=True):
+        """
+        分配一个不冲突的输出路径
+
+        Args:
+            directory: 输出目录
+            base_name: 文件名主干（不含扩展名）
+            ext: 扩展名（含点，如 ".png"）
+            separator: 主干与数字后缀之间的分隔符
+            pad_width: 数字后缀的最小位数（不足补零）
+            start: 数字后缀的起始值
+            use_base: 不带后缀的文件名可用时是否直接使用
+
+        Returns:
+            str: 输出文件的完整路径
+        """
+        directory = os.path.abspath(directory)
+        with self._lock:
+            index = self._get_index(directory)
+
+            def is_taken(filename):
+                if os.path.normcase(filename) in index.names:
+                    return True
+                # 索引可能落后于磁盘（扫描间隔内的外部写入、不区分大小写的文件系统），选中前再确认一次
+                if os.path.exists(os.path.join(directory, filename)):
+                    index.add(filename)
+                    return True
+                return False
+
+            base_filename = f"{base_name}{ext}"
+            if use_base and not is_taken(base_filename):
+                filename = base_filename
+            else:
+                stem = f"{base_name}{separator}"
+                counter = max(start, index.max_suffix.get((os.path.normcase(stem), os.path.normcase(ext)), 0) + 1)
+                filename = f"{stem}{str(counter).zfill(pad_width)}{ext}"
+                while is_taken(filename):
+                    counter += 1
+                    filename = f"{stem}{str(counter).zfill(pad_width)}{ext}"
+
+            index.add(filename)
+            index.pending[os.path.normcase(filename)] = time.monotonic()
+            return os.path.join(directory, filename)
+
+    def invalidate(self, directory=None):
+        """丢弃目录索引（不指定目录时清空全部），下次分配时重新扫描"""
+        with self._lock:
+            if directory is None:
+                self._indexes.clear()
+            else:
+                self._indexes.pop(os.path.abspath(directory), None)
+
+
+# 全局共享实例
+output_naming = OutputNamingService()
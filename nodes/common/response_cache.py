@@ -0,0 +1,189 @@
+"""
+LLM/VLM 响应缓存
+以 (接口, 模型, 消息, 图像数据, 采样参数) 的规范化哈希为键，把固定种子请求的响应保存在本地SQLite文件中，
+工作流重新执行时相同的请求直接返回缓存结果，不再调用远程模型。
+条目按过期时间和最近使用时间淘汰；设置环境变量 XNANTOOL_RESPONSE_CACHE=0 可全局关闭
+"""
+
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+import logging
+
+# 配置日志
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def _env_int(name, default):
+    try:
+        return int(os.environ.get(name, default))
+    except ValueError:
+        logger.warning(f"{name} 不是有效整数，使用默认值 {default}")
+        return default
+
+
+def _default_db_path():
+    try:
+        import folder_paths
+        cache_dir = os.path.join(folder_paths.get_user_directory(), "xnantool")
+    except Exception:
+        cache_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "cache")
+    return os.path.join(cache_dir, "llm_response_cache.sqlite3")
+
+
+# 是否启用缓存
+CACHE_ENABLED = os.environ.get("XNANTOOL_RESPONSE_CACHE", "1") != "0"
+# 最多缓存的响应数量
+MAX_ENTRIES = _env_int("XNANTOOL_RESPONSE_CACHE_MAX_ENTRIES", 50000)
+# 缓存有效期（秒），0表示永不过期
+CACHE_TTL = _env_int("XNANTOOL_RESPONSE_CACHE_TTL", 30 * 24 * 3600)
+# 每写入多少条检查一次淘汰
+PRUNE_INTERVAL = 200
+
+
+def make_cache_key(namespace, **parts):
+    """
+    计算请求的规范化哈希
+
+    Args:
+        namespace: 调用方标识（区分不同节点/接口）
+        **parts: 影响响应的全部请求内容（模型、消息、图像数据、采样参数等），需可JSON序列化
+
+    Returns:
+        str: 十六进制哈希
+    """
+    canonical = json.dumps(
+        {"namespace": namespace, **parts},
+        sort_keys=True,
+        ensure_ascii=False,
+        separators=(",", ":"),
+        default=str,
+    )
+    return hashlib.sha256(canonical.encode("utf-8", "surrogatepass")).hexdigest()
+
+
+class ResponseCache:
+    """
+    基于SQLite的响应缓存（线程安全，首次使用时才打开数据库）
+    """
+
+    def __init__(self, db_path=None, max_entries=MAX_ENTRIES, ttl=CACHE_TTL, enabled=CACHE_ENABLED):
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self._db = None
+        self._puts = 0
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        if self._db is None and self.enabled:
+            path = self.db_path or _default_db_path()
+            try:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                db = sqlite3.connect(path, check_same_thread=False, timeout=10)
+                db.execute(
+                    "CREATE TABLE IF NOT EXISTS responses ("
+                    "key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL, last_access REAL NOT NULL)"
+                )
+                db.execute("CREATE INDEX IF NOT EXISTS idx_responses_last_access ON responses (last_access)")
+                db.commit()
+                self.db_path = path
+                self._db = db
+            except (OSError, sqlite3.Error) as e:
+                logger.warning(f"无法打开响应缓存 {path}，缓存已停用: {str(e)}")
+                self.enabled = False
+        return self._db
+
+    def key(self, use_cache, deterministic, namespace, **parts):
+        """
+        计算缓存键；未启用缓存或请求结果不确定（如随机种子）时返回None，调用方据此跳过缓存
+        """
+        if not (use_cache and deterministic and self.enabled):
+            return None
+        return make_cache_key(namespace, **parts)
+
+    def get(self, key):
+        """读取缓存的响应，未命中或键为None时返回None"""
+        if key is None:
+            return None
+        with self._lock:
+            db = self._connect()
+            if db is None:
+                return None
+            now = time.time()
+            try:
+                row = db.execute("SELECT value, created_at FROM responses WHERE key = ?", (key,)).fetchone()
+                if row is not None and self.ttl and now - row[1] > self.ttl:
+                    db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                    db.commit()
+                    row = None
+                if row is None:
+                    self.misses += 1
+                    return None
+                db.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+                db.commit()
+            except sqlite3.Error as e:
+                logger.warning(f"读取响应缓存失败: {str(e)}")
+                return None
+            self.hits += 1
+            logger.info(f"响应缓存命中（命中 {self.hits} 次 / 未命中 {self.misses} 次）")
+        return json.loads(row[0])
+
+    def put(self, key, value):
+        """保存响应（值需可JSON序列化），键为None时忽略"""
+        if key is None:
+            return
+        payload = json.dumps(value, ensure_ascii=False)
+        with self._lock:
+            db = self._connect()
+            if db is None:
+                return
+            now = time.time()
+            try:
+                db.execute(
+                    "INSERT OR REPLACE INTO responses (key, value, created_at, last_access) VALUES (?, ?, ?, ?)",
+                    (key, payload, now, now),
+                )
+                self._puts += 1
+                if self._puts % PRUNE_INTERVAL == 0:
+                    self._prune(db, now)
+                db.commit()
+            except sqlite3.Error as e:
+                logger.warning(f"写入响应缓存失败: {str(e)}")
+
+    def _prune(self, db, now):
+        if self.ttl:
+            db.execute("DELETE FROM responses WHERE created_at < ?", (now - self.ttl,))
+        db.execute(
+            "DELETE FROM responses WHERE key IN ("
+            "SELECT key FROM responses ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,),
+        )
+
+    def stats(self):
+        """返回命中统计和当前条目数"""
+        with self._lock:
+            db = self._connect()
+            entries = db.execute("SELECT COUNT(*) FROM responses").fetchone()[0] if db is not None else 0
+            return {"hits": self.hits, "misses": self.misses, "entries": entries, "db_path": self.db_path}
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            db = self._connect()
+            if db is not None:
+                db.execute("DELETE FROM responses")
+                db.commit()
+            self.hits = 0
+            self.misses = 0
+
+
+# 全局共享实例
+response_cache = ResponseCache()
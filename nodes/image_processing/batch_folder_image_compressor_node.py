@@ -1,6 +1,35 @@
 import os
+import json
+import time
+import runpy
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
 from PIL import Image
 import folder_paths
+import comfy.utils
+
+from ..common.output_naming import output_naming
+from .image_compress_worker import compress_image_file
+
+# 增量压缩清单文件名（保存在输出目录下）
+COMPRESS_MANIFEST_FILENAME = ".xnantool_compress_manifest.json"
+
+
+def _worker_init_args():
+    """
+    进程池初始化参数：子进程（包括Windows的spawn方式）执行引导脚本，
+    登记插件的各级包后即可按完整包名找到压缩工作函数
+    """
+    package_dir = os.path.dirname(os.path.abspath(__file__))
+    names = __package__.split(".")
+    packages = []
+    for depth in range(len(names)):
+        path = package_dir
+        for _ in range(len(names) - 1 - depth):
+            path = os.path.dirname(path)
+        packages.append((".".join(names[:depth + 1]), path))
+    bootstrap = os.path.join(package_dir, "compress_worker_bootstrap.py")
+    return (bootstrap, {"PACKAGES": packages})
 
 class BatchFolderImageCompressorNode:
     """
@@ -78,6 +107,21 @@ class BatchFolderImageCompressorNode:
                     "description": "在文件名后添加的自定义文本（例如：_compressed）"
                 }),
             },
+            "optional": {
+                "num_workers": ("INT", {
+                    "default": 1,
+                    "min": 0,
+                    "max": 64,
+                    "step": 1,
+                    "label": "并行进程数",
+                    "description": "同时压缩图片的进程数，1为在当前进程顺序处理，0为自动（CPU核心数）"
+                }),
+                "skip_unchanged": ("BOOLEAN", {
+                    "default": False,
+                    "label": "跳过未变化的图片",
+                    "description": "在输出目录记录压缩清单，再次运行时跳过源文件和压缩参数均未变化且输出比源文件新的图片"
+                }),
+            },
         }
     
     RETURN_TYPES = ("STRING",)
@@ -85,7 +129,7 @@ class BatchFolderImageCompressorNode:
     FUNCTION = "compress_images"
     CATEGORY = "XnanTool/图像处理"
     
-    def compress_images(self, image_directory, output_directory, output_format, quality, max_width, max_height, keep_structure, process_subfolders, conflict_mode, suffix_text):
+    def compress_images(self, image_directory, output_directory, output_format, quality, max_width, max_height, keep_structure, process_subfolders, conflict_mode, suffix_text, num_workers=1, skip_unchanged=False):
         """
         批量压缩文件夹中的图片
         
@@ -100,6 +144,8 @@ class BatchFolderImageCompressorNode:
             process_subfolders: 是否压缩子目录
             conflict_mode: 文件冲突处理方式（覆盖、跳过、数字后缀、文本后缀）
             suffix_text: 自定义后缀文本
+            num_workers: 并行进程数（1为顺序处理，0为自动）
+            skip_unchanged: 是否根据压缩清单跳过未变化的图片
             
         Returns:
             result_info: 处理结果信息
@@ -146,13 +192,31 @@ class BatchFolderImageCompressorNode:
             except Exception as e:
                 return (f"❌ 错误: 无法创建输出目录 - {output_directory}, {str(e)}",)
         
-        # 处理每个图像文件
+        start_time = time.perf_counter()
         processed_count = 0
         skipped_count = 0
+        unchanged_count = 0
         error_count = 0
+        input_bytes = 0
+        output_bytes = 0
         
+        manifest = self._load_manifest(output_directory) if skip_unchanged else {}
+        settings = f"{output_format}|{quality}|{max_width}|{max_height}"
+        
+        # 先为每个图像确定输出路径（文件名分配在主进程中完成），再统一压缩
+        # 本次已分配的输出路径视为已存在，避免不同源文件（如同名文件或 a.png 与 a.bmp）写入同一个输出文件
+        tasks = []
+        planned = set()
         for input_path, rel_path in image_files:
             try:
+                source_stat = os.stat(input_path)
+                manifest_key = os.path.relpath(input_path, image_directory).replace(os.sep, "/")
+                
+                # 源文件和参数均未变化且输出比源文件新时跳过
+                if skip_unchanged and self._is_up_to_date(manifest.get(manifest_key), source_stat, settings, output_directory):
+                    unchanged_count += 1
+                    continue
+                
                 # 构建输出文件路径
                 file_name, _ = os.path.splitext(os.path.basename(input_path))
                 output_ext = '.' + output_format.lower()
@@ -171,85 +235,59 @@ class BatchFolderImageCompressorNode:
                     # 不保留子目录结构，所有文件输出到同一目录
                     output_path = os.path.join(output_directory, f"{file_name}{output_ext}")
                 
-                # 处理文件冲突
-                if os.path.exists(output_path):
+                # 处理文件冲突（上次为同一源文件生成的输出直接覆盖）
+                previous = manifest.get(manifest_key)
+                planned_here = self._plan_key(output_path) in planned
+                if previous and not planned_here and os.path.normpath(os.path.join(output_directory, previous.get("output", ""))) == os.path.normpath(output_path):
+                    pass
+                elif planned_here or os.path.exists(output_path):
                     if conflict_mode == "跳过":
                         skipped_count += 1
                         continue
-                    elif conflict_mode == "数字后缀":
-                        # 数字后缀模式
-                        counter = 1
-                        while os.path.exists(output_path):
-                            output_path = os.path.join(output_directory, f"{file_name}_{counter:02d}{output_ext}")
-                            counter += 1
+                    elif conflict_mode == "数字后缀" or (conflict_mode == "覆盖" and planned_here):
+                        # 数字后缀模式（覆盖模式只覆盖已有文件，本次其他源文件的输出同样加数字后缀）
+                        output_path = self._reserve_unplanned(planned, os.path.dirname(output_path), file_name, output_ext)
                     elif conflict_mode == "文本后缀":
                         # 文本后缀模式
                         suffix = suffix_text if suffix_text else "_compressed"
-                        counter = 1
-                        while os.path.exists(output_path):
-                            output_path = os.path.join(output_directory, f"{file_name}{suffix}_{counter:02d}{output_ext}")
-                            counter += 1
+                        output_path = self._reserve_unplanned(planned, os.path.dirname(output_path), f"{file_name}{suffix}", output_ext)
+                
+                planned.add(self._plan_key(output_path))
+                tasks.append((input_path, output_path, manifest_key, source_stat))
                 
-                # 打开图像
-                with Image.open(input_path) as img:
-                    # 转换为RGB模式（如果需要）
-                    if img.mode in ('RGBA', 'P', 'LA'):
-                        # 对于有透明通道的图片，使用白色背景
-                        if img.mode == 'RGBA':
-                            background = Image.new('RGB', img.size, (255, 255, 255))
-                            background.paste(img, mask=img.split()[3])
-                            img = background
-                        else:
-                            img = img.convert('RGB')
-                    elif img.mode != 'RGB':
-                        img = img.convert('RGB')
-                    
-                    # 调整尺寸
-                    if max_width > 0 or max_height > 0:
-                        original_width, original_height = img.size
-                        
-                        if max_width > 0 and max_height > 0:
-                            # 同时限制宽高
-                            new_width = min(original_width, max_width)
-                            new_height = min(original_height, max_height)
-                            
-                            # 保持宽高比
-                            width_ratio = new_width / original_width
-                            height_ratio = new_height / original_height
-                            ratio = min(width_ratio, height_ratio)
-                            
-                            new_width = int(original_width * ratio)
-                            new_height = int(original_height * ratio)
-                            
-                            img = img.resize((new_width, new_height), Image.LANCZOS)
-                        elif max_width > 0:
-                            # 只限制宽度
-                            if original_width > max_width:
-                                ratio = max_width / original_width
-                                new_height = int(original_height * ratio)
-                                img = img.resize((max_width, new_height), Image.LANCZOS)
-                        elif max_height > 0:
-                            # 只限制高度
-                            if original_height > max_height:
-                                ratio = max_height / original_height
-                                new_width = int(original_width * ratio)
-                                img = img.resize((new_width, max_height), Image.LANCZOS)
-                    
-                    # 保存压缩后的图像
-                    if output_format == "JPEG":
-                        img.save(output_path, format='JPEG', quality=quality, optimize=True)
-                    elif output_format == "WebP":
-                        img.save(output_path, format='WebP', quality=quality, method=6)
-                    else:  # PNG
-                        # PNG不支持quality参数，使用optimize
-                        img.save(output_path, format='PNG', optimize=True)
-                    
-                    processed_count += 1
-                    
             except Exception as e:
                 print(f"处理图像时出错 {input_path}: {str(e)}")
                 error_count += 1
+        
+        # 压缩图像
+        pbar = comfy.utils.ProgressBar(max(len(tasks), 1))
+        options = (output_format, quality, max_width, max_height)
+        for task, outcome in self._run_tasks(tasks, options, num_workers):
+            input_path, output_path, manifest_key, source_stat = task
+            pbar.update(1)
+            if isinstance(outcome, Exception):
+                print(f"处理图像时出错 {input_path}: {str(outcome)}")
+                error_count += 1
                 continue
+            processed_count += 1
+            input_bytes += outcome[0]
+            output_bytes += outcome[1]
+            if skip_unchanged:
+                manifest[manifest_key] = {
+                    "output": os.path.relpath(output_path, output_directory).replace(os.sep, "/"),
+                    "size": source_stat.st_size,
+                    "mtime_ns": source_stat.st_mtime_ns,
+                    "settings": settings,
+                }
+        
+        if skip_unchanged:
+            self._save_manifest(output_directory, manifest)
+        
+        # 统计吞吐量
+        elapsed = time.perf_counter() - start_time
+        speed = processed_count / elapsed if elapsed > 0 else 0.0
+        saved_bytes = input_bytes - output_bytes
+        saved_ratio = saved_bytes / input_bytes * 100 if input_bytes > 0 else 0.0
         
         # 返回处理结果信息
         subfolder_info = "（包含子目录）" if process_subfolders == "是" else "（仅当前目录）"
@@ -261,9 +299,100 @@ class BatchFolderImageCompressorNode:
                 f"总文件数: {len(image_files)}\n" \
                 f"范围: {subfolder_info}\n" \
                 f"模式: {structure_info}\n" \
-                f"保存路径: {output_directory}"
+                f"保存路径: {output_directory}\n" \
+                f"耗时: {elapsed:.1f} 秒，速度: {speed:.1f} 张/秒\n" \
+                f"原始大小: {input_bytes / 1024 / 1024:.2f} MB，压缩后: {output_bytes / 1024 / 1024:.2f} MB，" \
+                f"节省: {saved_bytes / 1024 / 1024:.2f} MB ({saved_ratio:.1f}%)"
+        if skip_unchanged:
+            result += f"\n未变化已跳过: {unchanged_count} 个文件"
         
         return (result,)
+    
+    @staticmethod
+    def _plan_key(path):
+        # Windows/macOS 文件名不区分大小写
+        return os.path.normcase(os.path.normpath(path))
+    
+    @classmethod
+    def _reserve_unplanned(cls, planned, directory, base_name, ext):
+        """分配带数字后缀的输出路径，跳过本次已分配给其他源文件的路径"""
+        while True:
+            output_path = output_naming.reserve_path(directory, base_name, ext, "_", 2, use_base=False)
+            if cls._plan_key(output_path) not in planned:
+                return output_path
+    
+    @staticmethod
+    def _run_tasks(tasks, options, num_workers):
+        """
+        执行压缩任务，逐个产出 (任务, (源字节数, 输出字节数) 或异常)
+        num_workers为1时在当前进程顺序执行，否则使用进程池
+        """
+        if num_workers <= 0:
+            num_workers = os.cpu_count() or 1
+        num_workers = min(num_workers, len(tasks))
+        
+        done = set()
+        if num_workers > 1:
+            try:
+                with ProcessPoolExecutor(max_workers=num_workers, initializer=runpy.run_path, initargs=_worker_init_args()) as executor:
+                    futures = {executor.submit(compress_image_file, task[0], task[1], *options): i for i, task in enumerate(tasks)}
+                    for future in as_completed(futures):
+                        i = futures[future]
+                        try:
+                            outcome = future.result()
+                        except BrokenProcessPool:
+                            raise
+                        except Exception as e:
+                            outcome = e
+                        done.add(i)
+                        yield tasks[i], outcome
+                return
+            except BrokenProcessPool as e:
+                # 进程池不可用时回退到顺序处理剩余图片
+                print(f"多进程压缩失败，剩余 {len(tasks) - len(done)} 个文件改为顺序处理: {str(e)}")
+        
+        for task in (t for i, t in enumerate(tasks) if i not in done):
+            try:
+                outcome = compress_image_file(task[0], task[1], *options)
+            except Exception as e:
+                outcome = e
+            yield task, outcome
+    
+    @staticmethod
+    def _load_manifest(output_directory):
+        manifest_path = os.path.join(output_directory, COMPRESS_MANIFEST_FILENAME)
+        if not os.path.isfile(manifest_path):
+            return {}
+        try:
+            with open(manifest_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except Exception as e:
+            print(f"读取压缩清单失败，将重新压缩: {str(e)}")
+            return {}
+    
+    @staticmethod
+    def _save_manifest(output_directory, manifest):
+        manifest_path = os.path.join(output_directory, COMPRESS_MANIFEST_FILENAME)
+        tmp_path = manifest_path + ".tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(manifest, f, ensure_ascii=False, separators=(",", ":"))
+            os.replace(tmp_path, manifest_path)
+        except Exception as e:
+            print(f"保存压缩清单失败: {str(e)}")
+    
+    @staticmethod
+    def _is_up_to_date(entry, source_stat, settings, output_directory):
+        """源文件大小、修改时间和压缩参数均未变化，且输出文件存在并比源文件新"""
+        if not entry or entry.get("settings") != settings:
+            return False
+        if entry.get("size") != source_stat.st_size or entry.get("mtime_ns") != source_stat.st_mtime_ns:
+            return False
+        try:
+            output_stat = os.stat(os.path.join(output_directory, entry["output"]))
+        except (OSError, KeyError):
+            return False
+        return output_stat.st_mtime_ns >= source_stat.st_mtime_ns
 
 
 # Node class mappings
@@ -4,6 +4,8 @@ from PIL import Image
 import os
 import logging
 
+from .jpeg_draft import draft_for_target
+
 # 配置日志
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -144,6 +146,9 @@ class BatchImageResizerWithConversionNode:
                     new_width = max(1, new_width)
                     new_height = max(1, new_height)
                     
+                    # JPEG缩小时直接以较低分辨率解码，再做高质量缩放
+                    draft_for_target(pil_image, new_width, new_height)
+                    
                     # 调整图片尺寸
                     resized_image = pil_image.resize((new_width, new_height), Image.LANCZOS)
                     
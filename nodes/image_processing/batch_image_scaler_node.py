@@ -4,6 +4,8 @@ from PIL import Image, ImageOps
 import os
 import folder_paths
 
+from .jpeg_draft import draft_for_target
+
 class BatchImageScalerNode:
     """
     批量图像缩放节点
@@ -92,25 +94,27 @@ class BatchImageScalerNode:
                 
                 # 打开图像
                 with Image.open(input_path) as img:
-                    # 转换为RGB模式（如果需要）
-                    if img.mode != 'RGB':
-                        img = img.convert('RGB')
-                    
-                    # 根据缩放模式调整尺寸
+                    # 根据缩放模式计算目标尺寸（基于原图尺寸）
                     if resize_mode == "按比例缩放":
                         new_width = int(img.width * scale_factor)
                         new_height = int(img.height * scale_factor)
-                        resized_img = img.resize((new_width, new_height), resample_filter)
                     elif resize_mode == "固定宽度":
                         new_width = target_width
                         new_height = int(img.height * (target_width / img.width))
-                        resized_img = img.resize((new_width, new_height), resample_filter)
                     elif resize_mode == "固定高度":
                         new_height = target_height
                         new_width = int(img.width * (target_height / img.height))
-                        resized_img = img.resize((new_width, new_height), resample_filter)
                     else:  # 固定尺寸
-                        resized_img = img.resize((target_width, target_height), resample_filter)
+                        new_width, new_height = target_width, target_height
+                    
+                    # JPEG缩小时直接以较低分辨率解码，最终尺寸仍由下方的高质量缩放决定
+                    draft_for_target(img, new_width, new_height)
+                    
+                    # 转换为RGB模式（如果需要）
+                    if img.mode != 'RGB':
+                        img = img.convert('RGB')
+                    
+                    resized_img = img.resize((new_width, new_height), resample_filter)
                     
                     # 构建输出文件路径
                     file_name, file_ext = os.path.splitext(image_file)
@@ -1,25 +1,54 @@
 import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import folder_paths
 import numpy as np
 from PIL import Image, ImageOps
 import torch
 import torch.nn.functional as F
 
+from ..common.directory_index import directory_index
+
+# 支持的图片格式
+SUPPORTED_IMAGE_FORMATS = ('.png', '.jpg', '.jpeg', '.bmp', '.gif', '.tiff', '.webp')
+
+# 分页模式下并行解码和预解码下一页使用的线程数
+DECODE_WORKERS = min(4, os.cpu_count() or 1)
+
+
+def _decode_image_uint8(file_path):
+    """解码图片为RGB的uint8数组（处理EXIF方向）"""
+    with Image.open(file_path) as img:
+        img = ImageOps.exif_transpose(img)  # 处理EXIF方向
+        
+        # 转换为RGB（如果需要）
+        if img.mode != 'RGB':
+            img = img.convert('RGB')
+        return np.array(img)
+
 class BatchLoadImagesNode:
     """
     批量加载图片节点
-    支持两种模式：
+    支持三种模式：
     1. 加载全部图片：从指定目录加载所有图片，可设置最高加载数量
     2. 加载单张图片：根据索引加载单张图片
+    3. 分页加载：每次只加载一页图片，后台预解码下一页，可用游标在多次运行间自动翻页
     """
     
+    # 分页游标 {(节点ID, 目录, 每页数量): 下一页页码}，在同一ComfyUI进程的多次运行间保留
+    _page_cursors = {}
+    # 预解码结果 {文件路径: (修改时间, Future)}，只保留下一页
+    _prefetched = {}
+    _prefetch_lock = threading.Lock()
+    _decode_executor = None
+    
     @classmethod
     def INPUT_TYPES(cls):
         return {
             "required": {
-                "mode": (["加载全部", "加载单张"], {
+                "mode": (["加载全部", "加载单张", "分页加载"], {
                     "default": "加载全部",
-                    "tooltip": "选择加载模式：加载全部图片或按索引加载单张图片"
+                    "tooltip": "选择加载模式：加载全部图片、按索引加载单张图片或按页加载"
                 }),
                 "image_path": ("STRING", {
                     "default": "",
@@ -41,8 +70,35 @@ class BatchLoadImagesNode:
                     "max": 999999,
                     "step": 1,
                     "tooltip": "当模式为'加载全部'时，限制最多加载的图片数量，设置为0表示加载全部图片"
-                })
-            }
+                }),
+                "page_size": ("INT", {
+                    "default": 16,
+                    "min": 1,
+                    "max": 4096,
+                    "step": 1,
+                    "tooltip": "当模式为'分页加载'时，每页加载的图片数量"
+                }),
+                "page_index": ("INT", {
+                    "default": 0,
+                    "min": 0,
+                    "max": 999999,
+                    "step": 1,
+                    "tooltip": "当模式为'分页加载'且未启用游标时，要加载的页码（从0开始）"
+                }),
+                "use_cursor": ("BOOLEAN", {
+                    "default": False,
+                    "tooltip": "当模式为'分页加载'时，每次运行自动加载下一页，到末尾后回到第一页"
+                }),
+                "reset_cursor": ("BOOLEAN", {
+                    "default": False,
+                    "tooltip": "启用游标时，从第一页重新开始"
+                }),
+                "prefetch_next_page": ("BOOLEAN", {
+                    "default": True,
+                    "tooltip": "当模式为'分页加载'时，在后台预先解码下一页图片"
+                }),
+            },
+            "hidden": {"unique_id": "UNIQUE_ID"},
         }
 
     RETURN_TYPES = ("IMAGE", "STRING", "STRING", "INT")
@@ -55,11 +111,25 @@ class BatchLoadImagesNode:
 - 支持两种模式：加载全部图片或加载单张图片
 - 可自定义图片路径
 - 加载全部模式支持设置最高加载数量限制，设置为0表示加载全部图片
+- 分页加载模式每次只加载一页，后台预解码下一页，启用游标后每次运行自动翻页
 - 保持原始图片尺寸，不进行任何调整
 - 返回图片张量列表、文件名列表和图片数量
 """
 
-    def load_images(self, mode, image_path, index=0, max_images=100):
+    @classmethod
+    def IS_CHANGED(cls, mode, image_path, index=0, max_images=100, page_size=16, page_index=0, use_cursor=False, reset_cursor=False, prefetch_next_page=True, unique_id=None):
+        # 游标模式每次运行都要翻页，不能使用缓存结果
+        if mode == "分页加载" and use_cursor:
+            return float("NaN")
+        try:
+            if os.path.isfile(image_path):
+                return str(os.stat(image_path).st_mtime_ns)
+            # 目录中的图片增删或改名时重新执行
+            return directory_index.fingerprint(image_path, extensions=SUPPORTED_IMAGE_FORMATS)
+        except Exception:
+            return ""
+
+    def load_images(self, mode, image_path, index=0, max_images=100, page_size=16, page_index=0, use_cursor=False, reset_cursor=False, prefetch_next_page=True, unique_id=None):
         if not image_path:
             raise ValueError("图片路径不能为空")
             
@@ -69,6 +139,8 @@ class BatchLoadImagesNode:
         
         if mode == "加载全部":
             return self.load_all_images(image_path, max_images)
+        elif mode == "分页加载":
+            return self.load_image_page(image_path, page_size, page_index, use_cursor, reset_cursor, prefetch_next_page, unique_id)
         else:
             return self.load_single_image(image_path, index)
 
@@ -77,17 +149,8 @@ class BatchLoadImagesNode:
         if not os.path.isdir(image_path):
             raise ValueError("加载全部模式需要指定一个目录路径")
             
-        # 支持的图片格式
-        supported_formats = ('.png', '.jpg', '.jpeg', '.bmp', '.gif', '.tiff', '.webp')
-        
-        # 获取所有图片文件
-        image_files = []
-        for file in os.listdir(image_path):
-            if file.lower().endswith(supported_formats):
-                image_files.append(file)
-                
-        # 按文件名排序
-        image_files.sort()
+        # 获取所有图片文件（按文件名排序）
+        image_files = self._list_image_files(image_path)
         
         # 限制最大图片数量，当max_images为0时加载全部图片
         if max_images > 0 and len(image_files) > max_images:
@@ -142,16 +205,8 @@ class BatchLoadImagesNode:
             if not os.path.isdir(image_path):
                 raise ValueError("加载单张模式需要指定一个有效目录或图片文件路径")
                 
-            # 支持的图片格式
-            supported_formats = ('.png', '.jpg', '.jpeg', '.bmp', '.gif', '.tiff', '.webp')
-            
             # 获取所有图片文件并排序
-            image_files = []
-            for file in os.listdir(image_path):
-                if file.lower().endswith(supported_formats):
-                    image_files.append(file)
-                    
-            image_files.sort()
+            image_files = self._list_image_files(image_path)
             
             if not image_files:
                 raise ValueError(f"在目录 {image_path} 中未找到支持的图片文件")
@@ -183,6 +238,100 @@ class BatchLoadImagesNode:
         except Exception as e:
             raise ValueError(f"无法加载图片 {file_path}: {str(e)}")
 
+    def load_image_page(self, image_path, page_size, page_index, use_cursor, reset_cursor, prefetch_next_page, unique_id=None):
+        """分页加载目录中的图片，当前页并行解码，并在后台预解码下一页"""
+        if not os.path.isdir(image_path):
+            raise ValueError("分页加载模式需要指定一个目录路径")
+        
+        image_files = self._list_image_files(image_path)
+        if not image_files:
+            raise ValueError(f"在目录 {image_path} 中未找到支持的图片文件")
+        
+        page_count = (len(image_files) + page_size - 1) // page_size
+        
+        # 确定页码
+        cursor_key = (unique_id, os.path.abspath(image_path), page_size)
+        if use_cursor:
+            if reset_cursor:
+                self._page_cursors.pop(cursor_key, None)
+            page_index = self._page_cursors.get(cursor_key, 0) % page_count
+            self._page_cursors[cursor_key] = (page_index + 1) % page_count
+        elif page_index >= page_count:
+            raise ValueError(f"页码 {page_index} 超出范围，目录中共 {len(image_files)} 张图片，{page_count} 页")
+        
+        start = page_index * page_size
+        page_files = image_files[start:start + page_size]
+        page_paths = [os.path.join(image_path, file) for file in page_files]
+        
+        # 提交当前页解码（已预解码的直接复用）
+        futures = [self._get_decode_future(path) for path in page_paths]
+        
+        # 在当前页解码的同时开始预解码下一页
+        if prefetch_next_page and page_count > 1:
+            next_start = ((page_index + 1) % page_count) * page_size
+            next_paths = [os.path.join(image_path, file) for file in image_files[next_start:next_start + page_size]]
+            self._prefetch(next_paths)
+        
+        images = []
+        filenames = []
+        for file, future in zip(page_files, futures):
+            try:
+                img_array = future.result().astype(np.float32) / 255.0
+                images.append(torch.from_numpy(img_array)[None,])
+                filenames.append(file)
+            except Exception as e:
+                print(f"警告: 无法加载图片 {file}: {str(e)}")
+                continue
+        
+        if not images:
+            raise ValueError(f"第 {page_index} 页未能成功加载任何图片")
+        
+        print(f"[BatchLoadImagesNode] 已加载第 {page_index + 1}/{page_count} 页，共 {len(images)} 张图片")
+        
+        # 生成不带后缀名的文件名列表
+        filenames_without_extension = [os.path.splitext(file)[0] for file in filenames]
+        return (images, filenames, filenames_without_extension, len(images))
+
+    @staticmethod
+    def _list_image_files(image_path):
+        """列出目录中支持的图片文件，按文件名排序（目录未变化时使用缓存的列表）"""
+        return list(directory_index.list_files(image_path, extensions=SUPPORTED_IMAGE_FORMATS))
+
+    @classmethod
+    def _get_executor(cls):
+        if cls._decode_executor is None:
+            cls._decode_executor = ThreadPoolExecutor(max_workers=DECODE_WORKERS, thread_name_prefix="xnantool-image-decode")
+        return cls._decode_executor
+
+    @staticmethod
+    def _mtime(path):
+        try:
+            return os.stat(path).st_mtime_ns
+        except OSError:
+            return None
+
+    @classmethod
+    def _get_decode_future(cls, path):
+        """取出预解码结果（文件未被修改时），否则提交新的解码任务"""
+        with cls._prefetch_lock:
+            entry = cls._prefetched.pop(path, None)
+            if entry is not None and entry[0] == cls._mtime(path):
+                return entry[1]
+            return cls._get_executor().submit(_decode_image_uint8, path)
+
+    @classmethod
+    def _prefetch(cls, paths):
+        """预解码指定图片，丢弃其他尚未使用的预解码结果以限制内存"""
+        with cls._prefetch_lock:
+            wanted = set(paths)
+            for path in list(cls._prefetched):
+                if path not in wanted:
+                    cls._prefetched.pop(path)[1].cancel()
+            for path in paths:
+                if path not in cls._prefetched:
+                    cls._prefetched[path] = (cls._mtime(path), cls._get_executor().submit(_decode_image_uint8, path))
+
+
 # 注册节点
 NODE_CLASS_MAPPINGS = {
     "BatchLoadImagesNode": BatchLoadImagesNode
@@ -1,11 +1,13 @@
 import os
-import hashlib
 from PIL import Image
 import numpy as np
 import torch
 import json
+import shutil
 import logging
 
+from ..common.file_hashing import hash_file, hash_files, HashIndex
+
 # 配置日志
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -56,7 +58,20 @@ class BatchRenameImagesByMD5Node:
                     "multiline": True,
                     "label": "文件扩展名",
                     "description": "需要处理的图片文件扩展名，用逗号分隔"
-                })
+                }),
+                "num_workers": ("INT", {
+                    "default": 0,
+                    "min": 0,
+                    "max": 64,
+                    "step": 1,
+                    "label": "并行线程数",
+                    "description": "同时计算MD5的线程数，1为顺序计算，0为自动（CPU核心数）"
+                }),
+                "use_hash_index": ("BOOLEAN", {
+                    "default": True,
+                    "label": "使用哈希索引",
+                    "description": "在输入目录保存哈希索引文件，再次运行时跳过大小和修改时间未变化的文件"
+                }),
             }
         }
 
@@ -77,11 +92,8 @@ class BatchRenameImagesByMD5Node:
             str: 图片文件的MD5哈希值
         """
         try:
-            # 以二进制方式读取文件内容并计算MD5
-            with open(image_path, 'rb') as f:
-                file_data = f.read()
-                md5_hash = hashlib.md5(file_data).hexdigest()
-                return md5_hash
+            # 分块读取文件计算MD5，避免把整个文件读入内存
+            return hash_file(image_path, "md5")
         except Exception as e:
             logger.error(f"计算图片 {image_path} 的MD5时出错: {str(e)}")
             raise
@@ -100,7 +112,7 @@ class BatchRenameImagesByMD5Node:
         _, ext = os.path.splitext(filename.lower())
         return ext.lstrip('.') in [ext.strip().lower() for ext in extensions]
 
-    def rename_images_by_md5(self, input_directory, output_directory="", include_subfolders=False, overwrite_existing=False, delete_original_files=False, file_extensions="jpg,jpeg,png,bmp,gif,tiff,webp"):
+    def rename_images_by_md5(self, input_directory, output_directory="", include_subfolders=False, overwrite_existing=False, delete_original_files=False, file_extensions="jpg,jpeg,png,bmp,gif,tiff,webp", num_workers=0, use_hash_index=True):
         """
         批量重命名图片文件为MD5哈希值
         
@@ -111,6 +123,8 @@ class BatchRenameImagesByMD5Node:
             overwrite_existing (bool): 是否覆盖已存在文件
             delete_original_files (bool): 当输出目录留空或与输入目录相同时，是否删除重命名前的原始文件
             file_extensions (str): 支持的文件扩展名，逗号分隔
+            num_workers (int): 计算MD5的线程数（1为顺序计算，0为自动）
+            use_hash_index (bool): 是否使用输入目录下的哈希索引跳过未变化的文件
             
         Returns:
             tuple: (处理信息,)
@@ -164,6 +178,13 @@ class BatchRenameImagesByMD5Node:
         skip_count = 0
         error_files = []
         
+        # 并行计算所有文件的MD5（命中哈希索引的文件不再读取）
+        hash_index = HashIndex(input_directory, "md5") if use_hash_index else None
+        input_paths = [os.path.join(root, filename) for root, filename in image_files]
+        md5_results, md5_errors, cached_count = hash_files(input_paths, "md5", num_workers, hash_index)
+        if cached_count:
+            logger.info(f"哈希索引命中 {cached_count} 个未变化的文件")
+        
         # 处理每个图片文件
         for item in image_files:
             try:
@@ -178,8 +199,10 @@ class BatchRenameImagesByMD5Node:
                 # 获取原始文件扩展名
                 _, ext = os.path.splitext(filename.lower())
                 
-                # 计算MD5哈希值
-                md5_hash = self.calculate_image_md5(input_path)
+                # 获取MD5哈希值
+                md5_hash = md5_results.get(input_path)
+                if md5_hash is None:
+                    raise RuntimeError(f"计算MD5失败: {md5_errors.get(input_path, '未知错误')}")
                 new_filename = f"{md5_hash}{ext}"
                 output_path = os.path.join(output_directory, new_filename)
                 
@@ -192,23 +215,25 @@ class BatchRenameImagesByMD5Node:
                         continue
                     
                     # 复制文件到新名称
-                    import shutil
                     shutil.copy2(input_path, output_path)
                     renamed_count += 1
                     logger.info(f"重命名文件: {filename} -> {new_filename}")
+                    if hash_index is not None:
+                        hash_index.put(output_path, md5_hash)
                     
                     # 如果需要删除原始文件，且输出目录与输入目录相同，则删除原始文件
                     if delete_original_files and input_directory == output_directory:
                         try:
                             os.remove(input_path)
                             logger.info(f"已删除原始文件: {filename}")
+                            if hash_index is not None:
+                                hash_index.remove(input_path)
                         except Exception as e:
                             logger.warning(f"删除原始文件 {filename} 时出错: {str(e)}")
                 else:
                     # 文件名已经是MD5值，无需重命名
                     if input_directory != output_directory:
                         # 如果指定了不同的输出目录，则复制文件
-                        import shutil
                         shutil.copy2(input_path, output_path)
                         logger.info(f"复制文件: {filename} -> {output_directory}")
                     else:
@@ -220,6 +245,9 @@ class BatchRenameImagesByMD5Node:
                 error_files.append(f"{filename}: {str(e)}")
                 continue
         
+        if hash_index is not None:
+            hash_index.save()
+        
         # 生成处理结果信息
         if error_files:
             error_info = "\n".join(error_files)
@@ -0,0 +1,21 @@
+"""
+批量压缩进程池的子进程初始化脚本
+由 runpy.run_path 在每个子进程中执行（不作为模块导入）：为插件的各级包登记只带 __path__ 的空包，
+子进程按完整包名导入压缩工作函数时不会执行插件的 __init__.py，也不需要修改 sys.path。
+PACKAGES 由主进程通过 init_globals 传入：[(包名, 目录), ...]，从顶层包到工作函数所在的包
+"""
+
+import sys
+import types
+
+for _name, _path in globals().get("PACKAGES", ()):
+    if _name in sys.modules:
+        # fork方式启动的子进程已继承主进程的模块
+        continue
+    _package = types.ModuleType(_name)
+    _package.__path__ = [_path]
+    _package.__package__ = _name
+    sys.modules[_name] = _package
+    _parent, _, _child = _name.rpartition(".")
+    if _parent:
+        setattr(sys.modules[_parent], _child, _package)
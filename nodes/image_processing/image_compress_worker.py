@@ -0,0 +1,74 @@
+"""
+图片压缩工作函数
+只依赖PIL和标准库，可在子进程中独立导入，供批量文件夹图片压缩节点的多进程模式使用
+"""
+
+import os
+
+from PIL import Image
+
+from .jpeg_draft import draft_for_target
+
+
+def fit_size(width, height, max_width, max_height):
+    """按最大宽高等比缩小，返回新尺寸；不需要缩小时返回原尺寸"""
+    if max_width > 0 and max_height > 0:
+        # 同时限制宽高，保持宽高比
+        ratio = min(min(width, max_width) / width, min(height, max_height) / height)
+        return int(width * ratio), int(height * ratio)
+    if max_width > 0 and width > max_width:
+        # 只限制宽度
+        return max_width, int(height * (max_width / width))
+    if max_height > 0 and height > max_height:
+        # 只限制高度
+        return int(width * (max_height / height)), max_height
+    return width, height
+
+
+def compress_image_file(input_path, output_path, output_format, quality, max_width, max_height):
+    """
+    压缩单张图片
+
+    Args:
+        input_path: 源图片路径
+        output_path: 输出路径
+        output_format: 输出格式 (JPEG, PNG, WebP)
+        quality: 压缩质量 (1-100)
+        max_width: 最大宽度 (0表示不限制)
+        max_height: 最大高度 (0表示不限制)
+
+    Returns:
+        (源文件字节数, 输出文件字节数)
+    """
+    with Image.open(input_path) as img:
+        # 需要缩小时先确定目标尺寸，JPEG直接以缩小的比例解码
+        new_size = fit_size(img.width, img.height, max_width, max_height)
+        if new_size != img.size:
+            draft_for_target(img, *new_size)
+
+        # 转换为RGB模式（如果需要）
+        if img.mode in ('RGBA', 'P', 'LA'):
+            # 对于有透明通道的图片，使用白色背景
+            if img.mode == 'RGBA':
+                background = Image.new('RGB', img.size, (255, 255, 255))
+                background.paste(img, mask=img.split()[3])
+                img = background
+            else:
+                img = img.convert('RGB')
+        elif img.mode != 'RGB':
+            img = img.convert('RGB')
+
+        # 调整尺寸
+        if new_size != img.size:
+            img = img.resize(new_size, Image.LANCZOS)
+
+        # 保存压缩后的图像
+        if output_format == "JPEG":
+            img.save(output_path, format='JPEG', quality=quality, optimize=True)
+        elif output_format == "WebP":
+            img.save(output_path, format='WebP', quality=quality, method=6)
+        else:  # PNG
+            # PNG不支持quality参数，使用optimize
+            img.save(output_path, format='PNG', optimize=True)
+
+    return os.path.getsize(input_path), os.path.getsize(output_path)
@@ -0,0 +1,32 @@
+"""
+JPEG草稿模式解码
+目标尺寸远小于原图时，让libjpeg直接以1/2、1/4或1/8的DCT缩放比例解码，
+再由调用方做最终的高质量缩放。只依赖PIL，可在压缩子进程中独立导入
+"""
+
+# 草稿解码尺寸至少为目标尺寸的倍数，保证最终缩放仍有足够的源像素
+DRAFT_REDUCING_GAP = 2.0
+
+
+def draft_for_target(img, target_width, target_height, reducing_gap=DRAFT_REDUCING_GAP):
+    """
+    为即将缩放到目标尺寸的图像启用草稿解码（必须在图像数据加载之前调用）
+
+    Args:
+        img: 刚打开、尚未加载像素的PIL图像
+        target_width: 最终输出宽度
+        target_height: 最终输出高度
+        reducing_gap: 草稿尺寸相对目标尺寸的最小倍数
+
+    Returns:
+        tuple: 图像的原始尺寸 (width, height)，用于按原图计算比例
+    """
+    original_size = img.size
+    if getattr(img, "format", None) != "JPEG" or target_width <= 0 or target_height <= 0:
+        return original_size
+
+    requested = (int(target_width * reducing_gap), int(target_height * reducing_gap))
+    if requested[0] < original_size[0] and requested[1] < original_size[1]:
+        # PIL会选择解码后尺寸不小于requested的最大缩放比例
+        img.draft(img.mode, requested)
+    return original_size
@@ -4,12 +4,21 @@ from PIL import Image
 import cv2
 import os
 import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import folder_paths
+import comfy.utils
+
+from ..common.directory_index import directory_index
+from .video_frame_sampler import MULTI_FRAME_METHODS, resolve_frame_indices, read_frames_sequential
 
 # 配置日志
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# 支持的视频扩展名
+VIDEO_EXTENSIONS = ['.mp4', '.avi', '.mov', '.mkv', '.flv', '.wmv', '.webm']
+
 class BatchExtractFrameFromVideoNode:
     """
     批量视频帧提取节点
@@ -24,7 +33,7 @@ class BatchExtractFrameFromVideoNode:
         # 获取输入目录
         input_dir = folder_paths.get_input_directory()
         # 获取所有文件夹
-        folders = [f for f in os.listdir(input_dir) if os.path.isdir(os.path.join(input_dir, f))]
+        folders = list(directory_index.list_dirs(input_dir))
         
         return {
             "required": {
@@ -43,10 +52,10 @@ class BatchExtractFrameFromVideoNode:
                     "placeholder": "输入自定义视频文件夹的完整路径",
                     "label": "自定义视频文件夹路径"
                 }),
-                "frame_extraction_method": (["frame_number", "timestamp"], {
+                "frame_extraction_method": (["frame_number", "timestamp"] + MULTI_FRAME_METHODS, {
                     "default": "frame_number",
                     "label": "提取方式",
-                    "description": "选择帧提取的方式：按帧号或按时间戳"
+                    "description": "选择帧提取的方式：按帧号、按时间戳，或多帧提取（帧号列表/时间戳列表/每K秒一帧/均匀N帧，参数填写在多帧参数中）"
                 }),
                 "frame_number": ("INT", {
                     "default": 1,
@@ -92,6 +101,20 @@ class BatchExtractFrameFromVideoNode:
                     "multiline": False,
                     "placeholder": "可选：输出文件夹路径（留空则使用源文件夹）",
                     "label": "输出文件夹路径"
+                }),
+                "num_workers": ("INT", {
+                    "default": 1,
+                    "min": 0,
+                    "max": 64,
+                    "step": 1,
+                    "label": "并行线程数",
+                    "description": "同时处理的视频数量，1为顺序处理，0为自动（CPU核心数）"
+                }),
+                "multi_frame_spec": ("STRING", {
+                    "default": "",
+                    "multiline": False,
+                    "placeholder": "多帧参数：帧号列表如 1,50,100；时间戳列表如 0.5,3,10；每K秒填秒数；均匀N帧填帧数",
+                    "label": "多帧参数"
                 })
             }
         }
@@ -102,12 +125,19 @@ class BatchExtractFrameFromVideoNode:
     CATEGORY = "XnanTool/媒体处理"
     
     @classmethod
-    def IS_CHANGED(cls, folder_selection_mode, video_folder, custom_video_folder_path, frame_extraction_method, frame_number, timestamp, output_format, image_quality, output_filename_prefix="", output_folder=""):
-        # 如果文件夹或参数发生变化，返回当前时间戳
-        return float("NaN")  # 总是重新执行
+    def IS_CHANGED(cls, folder_selection_mode, video_folder, custom_video_folder_path, frame_extraction_method, frame_number, timestamp, output_format, image_quality, output_filename_prefix="", output_folder="", num_workers=1, multi_frame_spec=""):
+        # 视频文件增删或被修改时重新执行（参数变化由ComfyUI比较输入判断）
+        if folder_selection_mode == "custom_path":
+            folder_path = custom_video_folder_path
+        else:
+            folder_path = os.path.join(folder_paths.get_input_directory(), video_folder)
+        try:
+            return directory_index.fingerprint(folder_path, extensions=VIDEO_EXTENSIONS, include_file_stats=True)
+        except Exception:
+            return float("NaN")
     
     @classmethod
-    def VALIDATE_INPUTS(cls, folder_selection_mode, video_folder, custom_video_folder_path, frame_extraction_method, frame_number, timestamp, output_format, image_quality, output_filename_prefix="", output_folder=""):
+    def VALIDATE_INPUTS(cls, folder_selection_mode, video_folder, custom_video_folder_path, frame_extraction_method, frame_number, timestamp, output_format, image_quality, output_filename_prefix="", output_folder="", num_workers=1, multi_frame_spec=""):
         # 根据选择模式确定文件夹路径
         if folder_selection_mode == "custom_path":
             if not custom_video_folder_path:
@@ -128,8 +158,7 @@ class BatchExtractFrameFromVideoNode:
             return "指定路径不是文件夹: {}".format(folder_path)
         
         # 检查文件夹中是否有视频文件
-        video_extensions = ['.mp4', '.avi', '.mov', '.mkv', '.flv', '.wmv', '.webm']
-        video_files = [f for f in os.listdir(folder_path) if os.path.isfile(os.path.join(folder_path, f)) and os.path.splitext(f)[1].lower() in video_extensions]
+        video_files = directory_index.list_files(folder_path, extensions=VIDEO_EXTENSIONS)
         
         if not video_files:
             return "指定文件夹中没有找到视频文件"
@@ -146,7 +175,7 @@ class BatchExtractFrameFromVideoNode:
         
         return True
 
-    def batch_extract_frames(self, folder_selection_mode, video_folder, custom_video_folder_path, frame_extraction_method, frame_number, timestamp, output_format, image_quality, output_filename_prefix="batch_frame", output_folder=""):
+    def batch_extract_frames(self, folder_selection_mode, video_folder, custom_video_folder_path, frame_extraction_method, frame_number, timestamp, output_format, image_quality, output_filename_prefix="batch_frame", output_folder="", num_workers=1, multi_frame_spec=""):
         """
         从指定文件夹中的所有视频文件提取指定帧并导出为图片
         
@@ -161,6 +190,8 @@ class BatchExtractFrameFromVideoNode:
             image_quality (int): 输出图片质量（1-100，仅对JPG有效）
             output_filename_prefix (str): 输出文件名前缀
             output_folder (str): 输出文件夹路径（可选，留空则使用源文件夹）
+            num_workers (int): 并行处理的线程数（1为顺序处理，0为自动）
+            multi_frame_spec (str): 多帧提取参数（多帧提取方式时使用）
             
         Returns:
             tuple: 包含图像张量列表、图像路径列表、帧索引列表和状态信息的元组
@@ -190,8 +221,7 @@ class BatchExtractFrameFromVideoNode:
                 return ([], [], error_msg)
             
             # 获取文件夹中的所有视频文件
-            video_extensions = ['.mp4', '.avi', '.mov', '.mkv', '.flv', '.wmv', '.webm']
-            video_files = [f for f in os.listdir(folder_path) if os.path.isfile(os.path.join(folder_path, f)) and os.path.splitext(f)[1].lower() in video_extensions]
+            video_files = list(directory_index.list_files(folder_path, extensions=VIDEO_EXTENSIONS))
             
             if not video_files:
                 error_msg = f"错误：在文件夹 '{video_folder}' 中没有找到视频文件"
@@ -201,138 +231,60 @@ class BatchExtractFrameFromVideoNode:
             # 按文件名排序
             video_files.sort()
             
-            image_tensors = []
-            image_paths = []
-            frame_indices = []
-            status_messages = []
+            # 确定输出目录
+            if output_folder and os.path.exists(output_folder):
+                # 使用用户指定的输出文件夹
+                output_dir = output_folder
+            else:
+                # 使用默认输出目录
+                output_dir = folder_paths.get_output_directory()
+                # 如果指定了输出文件夹但不存在，则记录警告并使用默认输出目录
+                if output_folder:
+                    logger.warning(f"指定的输出文件夹 '{output_folder}' 不存在，将使用默认输出目录")
             
-            success_count = 0
-            fail_count = 0
+            if num_workers <= 0:
+                num_workers = os.cpu_count() or 1
+            num_workers = min(num_workers, len(video_files))
             
-            # 处理每个视频文件
-            for i, video_file in enumerate(video_files):
-                try:
-                    # 获取视频文件的完整路径
-                    video_path = os.path.join(folder_path, video_file)
-                    
-                    # 使用OpenCV打开视频文件
-                    cap = cv2.VideoCapture(video_path)
-                    
-                    # 检查视频是否成功打开
-                    if not cap.isOpened():
-                        error_msg = f"错误：无法打开视频文件: {video_file}"
-                        logger.error(error_msg)
-                        status_messages.append(f"[{i+1}] {error_msg}")
-                        fail_count += 1
-                        continue
-                    
-                    # 获取视频属性
-                    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-                    fps = cap.get(cv2.CAP_PROP_FPS)
-                    width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-                    height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-                    
-                    logger.info(f"视频信息 - 总帧数: {total_frames}, FPS: {fps}, 分辨率: {width}x{height}")
-                    
-                    # 确定要提取的帧索引
-                    if frame_extraction_method == "frame_number":
-                        target_frame_index = frame_number - 1  # 转换为0基索引
-                        if target_frame_index >= total_frames:
-                            error_msg = f"错误：指定的帧号({frame_number})超出了视频总帧数({total_frames})"
-                            logger.error(error_msg)
-                            cap.release()
-                            status_messages.append(f"[{i+1}] {error_msg}")
-                            fail_count += 1
-                            continue
-                    else:  # timestamp
-                        target_frame_index = int(timestamp * fps)
-                        if target_frame_index >= total_frames:
-                            error_msg = f"错误：指定的时间点({timestamp}秒)超出了视频总时长({total_frames/fps:.2f}秒)"
+            # 并行时多个线程可能生成同名文件，预留文件名需加锁
+            self._name_lock = threading.Lock()
+            self._reserved_paths = set()
+            
+            task_args = (folder_path, output_dir, frame_extraction_method, frame_number, timestamp,
+                         output_format, image_quality, output_filename_prefix, multi_frame_spec)
+            results = [None] * len(video_files)
+            pbar = comfy.utils.ProgressBar(len(video_files))
+            
+            if num_workers <= 1:
+                # 顺序处理每个视频文件
+                for i, video_file in enumerate(video_files):
+                    results[i] = self._extract_single_video(i, video_file, *task_args)
+                    pbar.update_absolute(i + 1, len(video_files))
+            else:
+                # 线程池并行处理，OpenCV解码和PIL编码会释放GIL
+                logger.info(f"使用 {num_workers} 个线程并行提取 {len(video_files)} 个视频")
+                with ThreadPoolExecutor(max_workers=num_workers) as executor:
+                    futures = {
+                        executor.submit(self._extract_single_video, i, video_file, *task_args): i
+                        for i, video_file in enumerate(video_files)
+                    }
+                    for completed, future in enumerate(as_completed(futures), start=1):
+                        i = futures[future]
+                        try:
+                            results[i] = future.result()
+                        except Exception as e:
+                            # 单个文件失败不影响其他文件
+                            error_msg = f"[{i+1}] ❌ 处理视频 '{video_files[i]}' 时出现错误: {str(e)}"
                             logger.error(error_msg)
-                            cap.release()
-                            status_messages.append(f"[{i+1}] {error_msg}")
-                            fail_count += 1
-                            continue
-                    
-                    # 设置视频读取位置到目标帧
-                    cap.set(cv2.CAP_PROP_POS_FRAMES, target_frame_index)
-                    
-                    # 读取帧
-                    ret, frame = cap.read()
-                    
-                    # 释放视频捕获对象
-                    cap.release()
-                    
-                    if not ret:
-                        error_msg = f"错误：无法读取第 {target_frame_index + 1} 帧"
-                        logger.error(error_msg)
-                        status_messages.append(f"[{i+1}] {error_msg}")
-                        fail_count += 1
-                        continue
-                    
-                    # 将BGR格式转换为RGB格式
-                    frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                    
-                    # 转换为PIL图像
-                    pil_image = Image.fromarray(frame_rgb)
-                    
-                    # 转换为torch张量 (H, W, C) -> (1, H, W, C)
-                    image_tensor = torch.from_numpy(np.array(pil_image)).float() / 255.0
-                    image_tensor = image_tensor.unsqueeze(0)  # 添加批次维度
-                    
-                    # 添加到结果列表
-                    image_tensors.append(image_tensor)
-                    
-                    # 确定输出目录
-                    if output_folder and os.path.exists(output_folder):
-                        # 使用用户指定的输出文件夹
-                        output_dir = output_folder
-                    else:
-                        # 使用默认输出目录
-                        output_dir = folder_paths.get_output_directory()
-                        # 如果指定了输出文件夹但不存在，则记录警告并使用默认输出目录
-                        if output_folder:
-                            logger.warning(f"指定的输出文件夹 '{output_folder}' 不存在，将使用默认输出目录")
-                    
-                    # 确定输出文件名
-                    video_name = os.path.splitext(os.path.basename(video_path))[0]
-                    output_filename = f"{output_filename_prefix}_{video_name}_frame_{target_frame_index + 1}"
-                    
-                    # 构建输出文件路径并处理文件名冲突
-                    output_file = os.path.join(output_dir, f"{output_filename}.{output_format}")
-                    counter = 1
-                    original_output_file = output_file
-                    while os.path.exists(output_file):
-                        output_file = os.path.join(output_dir, f"{output_filename}_{counter}.{output_format}")
-                        counter += 1
-                    
-                    # 如果文件被重命名，记录日志
-                    if original_output_file != output_file:
-                        logger.info(f"检测到同名文件，已自动重命名为: {os.path.basename(output_file)}")
-                    
-                    # 保存图像到文件
-                    if output_format == "jpg":
-                        pil_image.save(output_file, "JPEG", quality=image_quality, optimize=True)
-                    elif output_format == "png":
-                        pil_image.save(output_file, "PNG", optimize=True)
-                    else:  # bmp
-                        pil_image.save(output_file, "BMP")
-                    
-                    # 添加到结果列表
-                    image_paths.append(output_file)
-                    frame_indices.append(target_frame_index + 1)
-                    
-                    success_msg = f"[{i+1}] ✅ 帧提取成功！帧号: {target_frame_index + 1}, 时间点: {target_frame_index / fps:.2f}秒, 文件: {os.path.basename(output_file)}"
-                    logger.info(success_msg)
-                    status_messages.append(success_msg)
-                    success_count += 1
-                    
-                except Exception as e:
-                    error_msg = f"[{i+1}] ❌ 处理视频 '{video_file}' 时出现错误: {str(e)}"
-                    logger.error(error_msg)
-                    status_messages.append(error_msg)
-                    fail_count += 1
-                    continue
+                            results[i] = {"success": False, "message": error_msg}
+                        pbar.update_absolute(completed, len(video_files))
+            
+            # 按文件顺序汇总结果
+            image_paths = [path for r in results if r["success"] for path in r["paths"]]
+            frame_indices = [index for r in results if r["success"] for index in r["frame_indices"]]
+            status_messages = [r["message"] for r in results]
+            success_count = sum(1 for r in results if r["success"])
+            fail_count = len(results) - success_count
             
             # 汇总状态信息
             summary_msg = f"✅ 批量帧提取完成！成功: {success_count}, 失败: {fail_count}\n" + "\n".join(status_messages)
@@ -345,6 +297,131 @@ class BatchExtractFrameFromVideoNode:
             logger.error(error_msg)
             return ([], [], error_msg)
 
+    def _extract_single_video(self, i, video_file, folder_path, output_dir, frame_extraction_method, frame_number,
+                              timestamp, output_format, image_quality, output_filename_prefix, multi_frame_spec=""):
+        """
+        提取单个视频的指定帧并保存，失败时返回失败信息而不是抛出异常
+        
+        Returns:
+            dict: {"success", "paths", "frame_indices", "message"}
+        """
+        def fail(message):
+            logger.error(message)
+            return {"success": False, "message": f"[{i+1}] {message}"}
+        
+        cap = None
+        try:
+            # 获取视频文件的完整路径
+            video_path = os.path.join(folder_path, video_file)
+            
+            # 使用OpenCV打开视频文件
+            cap = cv2.VideoCapture(video_path)
+            
+            # 检查视频是否成功打开
+            if not cap.isOpened():
+                return fail(f"错误：无法打开视频文件: {video_file}")
+            
+            # 获取视频属性
+            total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+            fps = cap.get(cv2.CAP_PROP_FPS)
+            width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+            height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+            
+            logger.info(f"视频信息 - 总帧数: {total_frames}, FPS: {fps}, 分辨率: {width}x{height}")
+            
+            video_name = os.path.splitext(os.path.basename(video_path))[0]
+            
+            # 多帧提取：一次顺序解码取出所有目标帧
+            if frame_extraction_method in MULTI_FRAME_METHODS:
+                target_indices = resolve_frame_indices(frame_extraction_method, multi_frame_spec, total_frames, fps)
+                if not target_indices:
+                    return fail(f"错误：多帧参数 '{multi_frame_spec}' 没有解析出有效帧（视频总帧数: {total_frames}）")
+                
+                paths = []
+                extracted = []
+                for frame_index, frame in read_frames_sequential(cap, target_indices):
+                    pil_image = Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+                    output_filename = f"{output_filename_prefix}_{video_name}_frame_{frame_index + 1}"
+                    output_file = self._reserve_output_path(output_dir, output_filename, output_format)
+                    self._save_image(pil_image, output_file, output_format, image_quality)
+                    paths.append(output_file)
+                    extracted.append(frame_index + 1)
+                
+                if not paths:
+                    return fail(f"错误：无法读取 '{video_file}' 的任何目标帧")
+                
+                success_msg = f"[{i+1}] ✅ 多帧提取成功！{video_file}: {len(paths)}/{len(target_indices)} 帧"
+                logger.info(success_msg)
+                return {"success": True, "paths": paths, "frame_indices": extracted, "message": success_msg}
+            
+            # 确定要提取的帧索引
+            if frame_extraction_method == "frame_number":
+                target_frame_index = frame_number - 1  # 转换为0基索引
+                if target_frame_index >= total_frames:
+                    return fail(f"错误：指定的帧号({frame_number})超出了视频总帧数({total_frames})")
+            else:  # timestamp
+                target_frame_index = int(timestamp * fps)
+                if target_frame_index >= total_frames:
+                    return fail(f"错误：指定的时间点({timestamp}秒)超出了视频总时长({total_frames/fps:.2f}秒)")
+            
+            # 设置视频读取位置到目标帧
+            cap.set(cv2.CAP_PROP_POS_FRAMES, target_frame_index)
+            
+            # 读取帧
+            ret, frame = cap.read()
+            
+            # 释放视频捕获对象
+            cap.release()
+            cap = None
+            
+            if not ret:
+                return fail(f"错误：无法读取第 {target_frame_index + 1} 帧")
+            
+            # 将BGR格式转换为RGB格式并转换为PIL图像
+            pil_image = Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+            
+            # 确定输出文件名并保存图像
+            output_filename = f"{output_filename_prefix}_{video_name}_frame_{target_frame_index + 1}"
+            output_file = self._reserve_output_path(output_dir, output_filename, output_format)
+            self._save_image(pil_image, output_file, output_format, image_quality)
+            
+            success_msg = f"[{i+1}] ✅ 帧提取成功！帧号: {target_frame_index + 1}, 时间点: {target_frame_index / fps:.2f}秒, 文件: {os.path.basename(output_file)}"
+            logger.info(success_msg)
+            return {"success": True, "paths": [output_file], "frame_indices": [target_frame_index + 1], "message": success_msg}
+        
+        except Exception as e:
+            error_msg = f"[{i+1}] ❌ 处理视频 '{video_file}' 时出现错误: {str(e)}"
+            logger.error(error_msg)
+            return {"success": False, "message": error_msg}
+        finally:
+            if cap is not None:
+                cap.release()
+    
+    def _save_image(self, pil_image, output_file, output_format, image_quality):
+        """保存图像到文件"""
+        if output_format == "jpg":
+            pil_image.save(output_file, "JPEG", quality=image_quality, optimize=True)
+        elif output_format == "png":
+            pil_image.save(output_file, "PNG", optimize=True)
+        else:  # bmp
+            pil_image.save(output_file, "BMP")
+    
+    def _reserve_output_path(self, output_dir, output_filename, output_format):
+        """构建输出文件路径并处理文件名冲突（线程安全）"""
+        with self._name_lock:
+            output_file = os.path.join(output_dir, f"{output_filename}.{output_format}")
+            counter = 1
+            original_output_file = output_file
+            while os.path.exists(output_file) or output_file in self._reserved_paths:
+                output_file = os.path.join(output_dir, f"{output_filename}_{counter}.{output_format}")
+                counter += 1
+            self._reserved_paths.add(output_file)
+        
+        # 如果文件被重命名，记录日志
+        if original_output_file != output_file:
+            logger.info(f"检测到同名文件，已自动重命名为: {os.path.basename(output_file)}")
+        return output_file
+
 # 注册节点
 NODE_CLASS_MAPPINGS = {
     "BatchExtractFrameFromVideoNode": BatchExtractFrameFromVideoNode
@@ -1,7 +1,8 @@
 import os
-import hashlib
 import shutil
 
+from ..common.file_hashing import hash_file, hash_files, HashIndex
+
 class BatchRenameVideoByMD5Node:
     """
     批量重命名视频MD5节点 - 将视频文件重命名为其MD5哈希值
@@ -52,6 +53,19 @@ class BatchRenameVideoByMD5Node:
                     "label": "视频扩展名",
                     "description": "需要处理的视频文件扩展名，用逗号分隔"
                 }),
+                "num_workers": ("INT", {
+                    "default": 0,
+                    "min": 0,
+                    "max": 64,
+                    "step": 1,
+                    "label": "并行线程数",
+                    "description": "同时计算MD5的线程数，1为顺序计算，0为自动（CPU核心数）"
+                }),
+                "use_hash_index": ("BOOLEAN", {
+                    "default": True,
+                    "label": "使用哈希索引",
+                    "description": "在视频文件夹保存哈希索引文件，再次运行时跳过大小和修改时间未变化的文件"
+                }),
             }
         }
     
@@ -72,11 +86,7 @@ class BatchRenameVideoByMD5Node:
             MD5哈希值字符串
         """
         try:
-            hash_md5 = hashlib.md5()
-            with open(file_path, "rb") as f:
-                for chunk in iter(lambda: f.read(4096), b""):
-                    hash_md5.update(chunk)
-            return hash_md5.hexdigest()
+            return hash_file(file_path, "md5")
         except Exception as e:
             print(f"[BatchRenameVideoByMD5Node] 计算MD5失败: {str(e)}")
             return None
@@ -95,7 +105,7 @@ class BatchRenameVideoByMD5Node:
         _, ext = os.path.splitext(filename.lower())
         return ext.lstrip('.') in [ext.strip().lower() for ext in extensions]
     
-    def batch_rename_video_md5(self, video_folder, output_folder, include_subfolders, overwrite_existing=False, delete_original_files=False, video_extensions="mp4,avi,mov,mkv,wmv,flv,webm"):
+    def batch_rename_video_md5(self, video_folder, output_folder, include_subfolders, overwrite_existing=False, delete_original_files=False, video_extensions="mp4,avi,mov,mkv,wmv,flv,webm", num_workers=0, use_hash_index=True):
         """
         批量重命名视频文件为MD5哈希值
         
@@ -106,6 +116,8 @@ class BatchRenameVideoByMD5Node:
             overwrite_existing: 是否覆盖已存在文件
             delete_original_files: 是否删除原始文件
             video_extensions: 视频扩展名，逗号分隔
+            num_workers: 计算MD5的线程数（1为顺序计算，0为自动）
+            use_hash_index: 是否使用视频文件夹下的哈希索引跳过未变化的文件
             
         Returns:
             tuple: (输出文件夹路径, 信息)
@@ -151,15 +163,22 @@ class BatchRenameVideoByMD5Node:
             skip_count = 0
             renamed_count = 0
             
+            # 并行计算所有视频的MD5（命中哈希索引的文件不再读取）
+            hash_index = HashIndex(video_folder, "md5") if use_hash_index else None
+            md5_results, md5_errors, cached_count = hash_files(video_files, "md5", num_workers, hash_index)
+            if cached_count:
+                print(f"[BatchRenameVideoByMD5Node] 哈希索引命中 {cached_count} 个未变化的文件")
+            
             for video_path in video_files:
                 try:
                     # 获取原文件名
                     original_filename = os.path.basename(video_path)
                     
-                    # 计算MD5
-                    md5_hash = self.calculate_md5(video_path)
+                    # 获取MD5
+                    md5_hash = md5_results.get(video_path)
                     if not md5_hash:
                         fail_count += 1
+                        print(f"[BatchRenameVideoByMD5Node] 计算MD5失败: {md5_errors.get(video_path, original_filename)}")
                         continue
                     
                     # 获取原文件扩展名
@@ -179,7 +198,9 @@ class BatchRenameVideoByMD5Node:
                     if os.path.exists(new_path):
                         if not overwrite_existing:
                             # 如果文件内容相同，跳过
-                            existing_md5 = self.calculate_md5(new_path)
+                            existing_md5 = hash_index.lookup(new_path) if hash_index is not None else None
+                            if existing_md5 is None:
+                                existing_md5 = self.calculate_md5(new_path)
                             if existing_md5 == md5_hash:
                                 skip_count += 1
                                 print(f"[BatchRenameVideoByMD5Node] 跳过（文件已存在且内容相同）: {original_filename}")
@@ -194,12 +215,16 @@ class BatchRenameVideoByMD5Node:
                     success_count += 1
                     renamed_count += 1
                     print(f"[BatchRenameVideoByMD5Node] 已重命名: {original_filename} -> {new_filename}")
+                    if hash_index is not None:
+                        hash_index.put(new_path, md5_hash)
                     
                     # 如果需要删除原始文件，且输出文件夹与输入文件夹相同，则删除原始文件
                     if delete_original_files and video_folder == output_folder:
                         try:
                             os.remove(video_path)
                             print(f"[BatchRenameVideoByMD5Node] 已删除原始文件: {original_filename}")
+                            if hash_index is not None:
+                                hash_index.remove(video_path)
                         except Exception as e:
                             print(f"[BatchRenameVideoByMD5Node] 删除原始文件 {original_filename} 时出错: {str(e)}")
                     
@@ -207,6 +232,9 @@ class BatchRenameVideoByMD5Node:
                     fail_count += 1
                     print(f"[BatchRenameVideoByMD5Node] 重命名失败: {str(e)}")
             
+            if hash_index is not None:
+                hash_index.save()
+            
             # 生成信息
             info = f"批量重命名完成:\n" \
                    f"成功: {success_count} 个\n" \
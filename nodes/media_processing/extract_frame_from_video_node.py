@@ -6,6 +6,8 @@ import os
 import logging
 import folder_paths
 
+from .video_frame_sampler import MULTI_FRAME_METHODS, resolve_frame_indices, read_frames_sequential
+
 # 配置日志
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -33,10 +35,10 @@ class ExtractFrameFromVideoNode:
                     "description": "选择要提取帧的视频文件",
                     "video_upload": True  # 添加视频上传支持
                 }),
-                "frame_extraction_method": (["frame_number", "timestamp"], {
+                "frame_extraction_method": (["frame_number", "timestamp"] + MULTI_FRAME_METHODS, {
                     "default": "frame_number",
                     "label": "提取方式",
-                    "description": "选择帧提取的方式：按帧号或按时间戳"
+                    "description": "选择帧提取的方式：按帧号、按时间戳，或多帧提取（帧号列表/时间戳列表/每K秒一帧/均匀N帧，参数填写在多帧参数中）"
                 }),
                 "frame_number": ("INT", {
                     "default": 1,
@@ -76,6 +78,12 @@ class ExtractFrameFromVideoNode:
                     "default": "",
                     "multiline": False,
                     "placeholder": "可选：自定义输出文件名（不含扩展名）"
+                }),
+                "multi_frame_spec": ("STRING", {
+                    "default": "",
+                    "multiline": False,
+                    "placeholder": "多帧参数：帧号列表如 1,50,100；时间戳列表如 0.5,3,10；每K秒填秒数；均匀N帧填帧数",
+                    "label": "多帧参数"
                 })
             }
         }
@@ -86,7 +94,7 @@ class ExtractFrameFromVideoNode:
     CATEGORY = "XnanTool/媒体处理"
     
     @classmethod
-    def IS_CHANGED(cls, video_file, frame_extraction_method, frame_number, timestamp, output_format, image_quality, output_filename=""):
+    def IS_CHANGED(cls, video_file, frame_extraction_method, frame_number, timestamp, output_format, image_quality, output_filename="", multi_frame_spec=""):
         # 如果视频文件存在，返回其修改时间，否则返回0
         video_path = folder_paths.get_annotated_filepath(video_file)
         if os.path.exists(video_path):
@@ -94,13 +102,13 @@ class ExtractFrameFromVideoNode:
         return 0
     
     @classmethod
-    def VALIDATE_INPUTS(cls, video_file, frame_extraction_method, frame_number, timestamp, output_format, image_quality, output_filename=""):
+    def VALIDATE_INPUTS(cls, video_file, frame_extraction_method, frame_number, timestamp, output_format, image_quality, output_filename="", multi_frame_spec=""):
         video_path = folder_paths.get_annotated_filepath(video_file)
         if not os.path.exists(video_path):
             return "Invalid video file: {}".format(video_file)
         return True
 
-    def extract_frame(self, video_file, frame_extraction_method, frame_number, timestamp, output_format, image_quality, output_filename=""):
+    def extract_frame(self, video_file, frame_extraction_method, frame_number, timestamp, output_format, image_quality, output_filename="", multi_frame_spec=""):
         """
         从视频文件中提取指定帧并导出为图片
         
@@ -112,9 +120,11 @@ class ExtractFrameFromVideoNode:
             output_format (str): 输出图片格式 ("png", "jpg", "bmp")
             image_quality (int): 输出图片质量（1-100，仅对JPG有效）
             output_filename (str): 自定义输出文件名（不含扩展名）
+            multi_frame_spec (str): 多帧提取参数
             
         Returns:
             tuple: 包含图像张量、图像路径、帧索引和状态信息的元组
+                   多帧提取时图像为所有帧组成的批次，路径为换行分隔的列表，帧索引为第一帧
         """
         try:
             # 获取视频文件的完整路径
@@ -143,6 +153,14 @@ class ExtractFrameFromVideoNode:
             
             logger.info(f"视频信息 - 总帧数: {total_frames}, FPS: {fps}, 分辨率: {width}x{height}")
             
+            # 多帧提取：一次顺序解码取出所有目标帧
+            if frame_extraction_method in MULTI_FRAME_METHODS:
+                try:
+                    return self.extract_multiple_frames(cap, video_path, frame_extraction_method, multi_frame_spec,
+                                                        total_frames, fps, output_format, image_quality, output_filename)
+                finally:
+                    cap.release()
+            
             # 确定要提取的帧索引
             if frame_extraction_method == "frame_number":
                 target_frame_index = frame_number - 1  # 转换为0基索引
@@ -192,25 +210,8 @@ class ExtractFrameFromVideoNode:
             if not output_filename:
                 output_filename = f"{video_name}_frame_{target_frame_index + 1}"
             
-            # 构建输出文件路径并处理文件名冲突
-            output_file = os.path.join(output_dir, f"{output_filename}.{output_format}")
-            counter = 1
-            original_output_file = output_file
-            while os.path.exists(output_file):
-                output_file = os.path.join(output_dir, f"{output_filename}_{counter}.{output_format}")
-                counter += 1
-            
-            # 如果文件被重命名，记录日志
-            if original_output_file != output_file:
-                logger.info(f"检测到同名文件，已自动重命名为: {os.path.basename(output_file)}")
-            
-            # 保存图像到文件
-            if output_format == "jpg":
-                pil_image.save(output_file, "JPEG", quality=image_quality, optimize=True)
-            elif output_format == "png":
-                pil_image.save(output_file, "PNG", optimize=True)
-            else:  # bmp
-                pil_image.save(output_file, "BMP")
+            # 构建输出文件路径并保存图像
+            output_file = self._save_frame(pil_image, output_dir, output_filename, output_format, image_quality)
             
             success_msg = f"✅ 帧提取成功！\n帧号: {target_frame_index + 1}\n时间点: {target_frame_index / fps:.2f}秒\n文件路径: {output_file}\n格式: {output_format}"
             logger.info(success_msg)
@@ -222,6 +223,63 @@ class ExtractFrameFromVideoNode:
             logger.error(error_msg)
             return (torch.zeros(1, 64, 64, 3), "", -1, error_msg)
 
+    def extract_multiple_frames(self, cap, video_path, method, spec, total_frames, fps, output_format, image_quality, output_filename):
+        """按多帧采样参数一次顺序解码提取多帧并逐帧保存"""
+        frame_indices = resolve_frame_indices(method, spec, total_frames, fps)
+        if not frame_indices:
+            error_msg = f"错误：多帧参数 '{spec}' 没有解析出有效帧（视频总帧数: {total_frames}）"
+            logger.error(error_msg)
+            return (torch.zeros(1, 64, 64, 3), "", -1, error_msg)
+        
+        output_dir = folder_paths.get_output_directory()
+        video_name = os.path.splitext(os.path.basename(video_path))[0]
+        base_name = output_filename or video_name
+        
+        frames = []
+        output_files = []
+        extracted_indices = []
+        for frame_index, frame in read_frames_sequential(cap, frame_indices):
+            frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+            pil_image = Image.fromarray(frame_rgb)
+            output_files.append(self._save_frame(pil_image, output_dir, f"{base_name}_frame_{frame_index + 1}",
+                                                 output_format, image_quality))
+            frames.append(torch.from_numpy(frame_rgb))
+            extracted_indices.append(frame_index + 1)
+        
+        if not frames:
+            error_msg = f"错误：无法读取任何目标帧"
+            logger.error(error_msg)
+            return (torch.zeros(1, 64, 64, 3), "", -1, error_msg)
+        
+        image_tensor = torch.stack(frames).float() / 255.0
+        
+        success_msg = f"✅ 多帧提取成功！\n共 {len(frames)}/{len(frame_indices)} 帧\n帧号: {', '.join(str(i) for i in extracted_indices)}\n输出目录: {output_dir}\n格式: {output_format}"
+        logger.info(success_msg)
+        
+        return (image_tensor, "\n".join(output_files), extracted_indices[0], success_msg)
+    
+    def _save_frame(self, pil_image, output_dir, output_filename, output_format, image_quality):
+        """处理文件名冲突后保存图像，返回实际保存路径"""
+        output_file = os.path.join(output_dir, f"{output_filename}.{output_format}")
+        counter = 1
+        original_output_file = output_file
+        while os.path.exists(output_file):
+            output_file = os.path.join(output_dir, f"{output_filename}_{counter}.{output_format}")
+            counter += 1
+        
+        # 如果文件被重命名，记录日志
+        if original_output_file != output_file:
+            logger.info(f"检测到同名文件，已自动重命名为: {os.path.basename(output_file)}")
+        
+        # 保存图像到文件
+        if output_format == "jpg":
+            pil_image.save(output_file, "JPEG", quality=image_quality, optimize=True)
+        elif output_format == "png":
+            pil_image.save(output_file, "PNG", optimize=True)
+        else:  # bmp
+            pil_image.save(output_file, "BMP")
+        return output_file
+
 # 注册节点
 NODE_CLASS_MAPPINGS = {
     "ExtractFrameFromVideoNode": ExtractFrameFromVideoNode
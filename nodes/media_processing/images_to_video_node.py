@@ -4,8 +4,12 @@ import numpy as np
 import torch
 import folder_paths
 import tempfile
+import subprocess
+import shutil
 import soundfile as sf
 
+from ..common.output_naming import output_naming
+
 class ImagesToVideoNode:
     """
     图片转视频节点 - 将图片拉长成视频（重复图片帧）
@@ -90,6 +94,29 @@ class ImagesToVideoNode:
                 "image": ("IMAGE",),
                 "image_frames": ("IMAGE",),
                 "audio": ("AUDIO",),
+                "encoder": (["ffmpeg_pipe", "opencv_mp4v"], {
+                    "default": "ffmpeg_pipe",
+                    "label": "编码方式",
+                    "description": "ffmpeg_pipe：帧通过管道直接送入ffmpeg单次编码并同时封装音频；opencv_mp4v：旧版OpenCV编码（ffmpeg不可用时自动回退）"
+                }),
+                "video_codec": (["libx264", "libx265", "mpeg4"], {
+                    "default": "libx264",
+                    "label": "视频编码器",
+                    "description": "ffmpeg_pipe模式下使用的视频编码器"
+                }),
+                "crf": ("INT", {
+                    "default": 23,
+                    "min": 0,
+                    "max": 51,
+                    "step": 1,
+                    "label": "CRF质量",
+                    "description": "数值越小质量越高、文件越大（libx264/libx265有效）"
+                }),
+                "preset": (["ultrafast", "superfast", "veryfast", "faster", "fast", "medium", "slow", "slower", "veryslow"], {
+                    "default": "veryfast",
+                    "label": "编码预设",
+                    "description": "编码速度与压缩率的平衡（libx264/libx265有效）"
+                }),
             }
         }
 
@@ -98,7 +125,7 @@ class ImagesToVideoNode:
     FUNCTION = "convert_image_to_video"
     CATEGORY = "XnanTool/媒体处理"
     
-    def convert_image_to_video(self, duration, fps, output_resolution, custom_width, custom_height, output_filename, output_path, conflict_mode="数字后缀", pad_width=2, separator="_", image=None, image_frames=None, audio=None):
+    def convert_image_to_video(self, duration, fps, output_resolution, custom_width, custom_height, output_filename, output_path, conflict_mode="数字后缀", pad_width=2, separator="_", image=None, image_frames=None, audio=None, encoder="ffmpeg_pipe", video_codec="libx264", crf=23, preset="veryfast"):
         """
         将图片拉长成视频（支持单张图片或图片帧序列）
         
@@ -116,6 +143,10 @@ class ImagesToVideoNode:
             image: 单张输入图片（可选，与image_frames二选一）
             image_frames: 图片帧序列（可选，与image二选一）
             audio: 音频输入（可选）
+            encoder: 编码方式（ffmpeg_pipe 或 opencv_mp4v）
+            video_codec: ffmpeg视频编码器
+            crf: ffmpeg CRF质量参数
+            preset: ffmpeg编码预设
             
         Returns:
             tuple: (输出文件路径, 信息)
@@ -158,61 +189,12 @@ class ImagesToVideoNode:
                     print(f"[ImagesToVideoNode] 检测到同名文件，已跳过: {os.path.basename(output_path_full)}")
                     return (output_path_full, f"文件已存在，已跳过: {output_path_full}")
             elif conflict_mode == "数字后缀":
-                import re
                 base_name, ext = os.path.splitext(output_filename)
                 
-                # 确保输出目录存在以便检查文件
-                os.makedirs(output_dir_full, exist_ok=True)
-                
-                # 查找已存在的文件，找到最大的数字后缀
-                counter = 1
-                try:
-                    files = os.listdir(output_dir_full)
-                    max_counter = 0
-                    
-                    # 使用正则表达式匹配类似 "filename_01.ext" 的模式
-                    pattern = re.compile(
-                        re.escape(base_name) + 
-                        re.escape(separator) + 
-                        r'(\d{' + str(pad_width) + r'})' + 
-                        re.escape(ext) + r'$'
-                    )
-                    
-                    print(f"[ImagesToVideoNode] 当前目录: {output_dir_full}")
-                    print(f"[ImagesToVideoNode] 基础文件名: {base_name}, 扩展名: {ext}, 分隔符: {separator}, 位数: {pad_width}")
-                    print(f"[ImagesToVideoNode] 匹配模式: {pattern.pattern}")
-                    print(f"[ImagesToVideoNode] 目录中的文件: {files}")
-                    
-                    for file in files:
-                        match = pattern.match(file)
-                        if match:
-                            num = int(match.group(1))
-                            print(f"[ImagesToVideoNode] 匹配文件: {file}, 数字: {num}")
-                            max_counter = max(max_counter, num)
-                        else:
-                            print(f"[ImagesToVideoNode] 未匹配: {file}")
-                    
-                    print(f"[ImagesToVideoNode] 最大数字后缀: {max_counter}, 下一个计数器: {counter}")
-                    counter = max_counter + 1
-                except Exception as e:
-                    print(f"[ImagesToVideoNode] 检查文件冲突时出错: {str(e)}")
-                    import traceback
-                    traceback.print_exc()
-                    counter = 1
-                
-                # 构建初始路径
-                output_path_full = os.path.join(output_dir_full, output_filename)
-                original_output_path = output_path_full
-                
-                # 如果文件已存在，使用计数器生成新文件名
-                if os.path.exists(output_path_full):
-                    while os.path.exists(output_path_full):
-                        new_filename = f"{base_name}{separator}{str(counter).zfill(pad_width)}{ext}"
-                        output_path_full = os.path.join(output_dir_full, new_filename)
-                        counter += 1
-                    
-                    if original_output_path != output_path_full:
-                        print(f"[ImagesToVideoNode] 检测到同名文件，已自动重命名为: {os.path.basename(output_path_full)}")
+                # 由命名服务在已有最大数字后缀之后分配文件名（目录只扫描一次）
+                output_path_full = output_naming.reserve_path(output_dir_full, base_name, ext, separator, pad_width)
+                if output_path_full != os.path.join(os.path.abspath(output_dir_full), output_filename):
+                    print(f"[ImagesToVideoNode] 检测到同名文件，已自动重命名为: {os.path.basename(output_path_full)}")
             # 如果是"覆盖"模式，直接使用原文件路径，会覆盖现有文件
             
             # 处理输入图片
@@ -263,13 +245,7 @@ class ImagesToVideoNode:
             print(f"[ImagesToVideoNode] 输出尺寸: {new_width}x{new_height}")
             print(f"[ImagesToVideoNode] 最终输出路径: {output_path_full}")
             
-            # 创建视频写入对象
-            # 使用 mp4v 编码器
-            fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-            out = cv2.VideoWriter(output_path_full, fourcc, fps, (new_width, new_height))
-            
-            if not out.isOpened():
-                return ("", "错误：无法创建视频文件")
+            os.makedirs(output_dir_full, exist_ok=True)
             
             # 计算总帧数
             total_frames = duration * fps
@@ -277,75 +253,71 @@ class ImagesToVideoNode:
             print(f"[ImagesToVideoNode] 总帧数: {total_frames}")
             
             if use_image:
-                # 单张图片模式：重复使用同一张图片
-                # 将图片调整到目标尺寸并写入
-                for frame_idx in range(total_frames):
-                    # 调整图片大小
-                    if new_width != width or new_height != height:
-                        frame = cv2.resize(image_np, (new_width, new_height), interpolation=cv2.INTER_LINEAR)
-                    else:
-                        frame = image_np.copy()
-                    
-                    # OpenCV 使用 BGR 格式，需要转换
-                    if frame.shape[2] == 3:
-                        frame = cv2.cvtColor(frame, cv2.COLOR_RGB2BGR)
-                    
-                    out.write(frame)
+                actual_frame_count = total_frames
+                frame_source = self._iter_static_frames(image_np, new_width, new_height, total_frames)
             else:
                 # 图片帧序列模式：使用提供的帧序列
                 # 如果帧序列数量不足，重复最后一帧
                 # 如果帧序列数量过多，只使用前N帧
                 actual_frame_count = min(batch_size, total_frames)
                 print(f"[ImagesToVideoNode] 实际使用帧数: {actual_frame_count}")
+                frame_source = self._iter_sequence_frames(image_frames_np, new_width, new_height, total_frames)
+            
+            # ffmpeg单次编码：帧经管道送入，音频在同一进程中封装
+            if encoder == "ffmpeg_pipe" and shutil.which("ffmpeg"):
+                audio_path = None
+                temp_audio_path = None
+                try:
+                    if isinstance(audio, str):
+                        # 字符串视为已有的音频文件路径
+                        audio_path = audio if os.path.exists(audio) else None
+                    elif audio is not None:
+                        audio_path = temp_audio_path = self._write_temp_audio(audio)
+                    if audio is not None and audio_path is None:
+                        print(f"[ImagesToVideoNode] 音频数据无效，视频将不含音频")
+                    ok, error = self._encode_with_ffmpeg_pipe(
+                        output_path_full, frame_source, new_width, new_height, fps,
+                        audio_path, video_codec, crf, preset
+                    )
+                finally:
+                    if temp_audio_path and os.path.exists(temp_audio_path):
+                        os.remove(temp_audio_path)
+                if not ok:
+                    return ("", f"错误：ffmpeg编码失败: {error}")
+                print(f"[ImagesToVideoNode] 视频写入完成（ffmpeg {video_codec}, crf={crf}, preset={preset}）")
+            else:
+                if encoder == "ffmpeg_pipe":
+                    print(f"[ImagesToVideoNode] 未找到ffmpeg，回退到OpenCV mp4v编码")
                 
-                for frame_idx in range(actual_frame_count):
-                    frame = image_frames_np[frame_idx]
-                    
-                    # 调整图片大小
-                    if new_width != width or new_height != height:
-                        frame = cv2.resize(frame, (new_width, new_height), interpolation=cv2.INTER_LINEAR)
-                    
-                    # OpenCV 使用 BGR 格式，需要转换
-                    if frame.shape[2] == 3:
-                        frame = cv2.cvtColor(frame, cv2.COLOR_RGB2BGR)
-                    
-                    out.write(frame)
+                # 创建视频写入对象
+                # 使用 mp4v 编码器
+                fourcc = cv2.VideoWriter_fourcc(*'mp4v')
+                out = cv2.VideoWriter(output_path_full, fourcc, fps, (new_width, new_height))
                 
-                # 如果帧序列不足，用最后一帧填充剩余帧
-                if batch_size < total_frames:
-                    remaining_frames = total_frames - batch_size
-                    print(f"[ImagesToVideoNode] 帧序列不足，用最后一帧填充 {remaining_frames} 帧")
-                    last_frame = image_frames_np[-1]
-                    if new_width != width or new_height != height:
-                        last_frame = cv2.resize(last_frame, (new_width, new_height), interpolation=cv2.INTER_LINEAR)
-                    if last_frame.shape[2] == 3:
-                        last_frame = cv2.cvtColor(last_frame, cv2.COLOR_RGB2BGR)
-                    
-                    for _ in range(remaining_frames):
-                        out.write(last_frame)
-            
-            out.release()
-            print(f"[ImagesToVideoNode] 视频写入完成")
-            
-            # 如果有音频输入，合并音频
-            if audio is not None:
-                print(f"[ImagesToVideoNode] 开始合并音频")
-                print(f"[ImagesToVideoNode] 音频数据类型: {type(audio)}")
-                if isinstance(audio, dict):
-                    print(f"[ImagesToVideoNode] 音频数据键: {audio.keys()}")
-                    if 'waveform' in audio:
-                        print(f"[ImagesToVideoNode] 音频波形形状: {audio['waveform'].shape}")
-                    if 'sample_rate' in audio:
-                        print(f"[ImagesToVideoNode] 音频采样率: {audio['sample_rate']}")
-                output_path_with_audio = self.merge_audio_to_video(output_path_full, audio)
-                if output_path_with_audio:
-                    output_path_full = output_path_with_audio
-                    print(f"[ImagesToVideoNode] 音频合并成功，最终输出: {output_path_full}")
+                if not out.isOpened():
+                    return ("", "错误：无法创建视频文件")
+                
+                for frame, repeat in frame_source:
+                    # OpenCV 使用 BGR 格式，需要转换（重复帧只转换一次）
+                    frame = cv2.cvtColor(frame, cv2.COLOR_RGB2BGR)
+                    for _ in range(repeat):
+                        out.write(frame)
+                
+                out.release()
+                print(f"[ImagesToVideoNode] 视频写入完成")
+                
+                # 如果有音频输入，合并音频
+                if audio is not None:
+                    print(f"[ImagesToVideoNode] 开始合并音频")
+                    output_path_with_audio = self.merge_audio_to_video(output_path_full, audio)
+                    if output_path_with_audio:
+                        output_path_full = output_path_with_audio
+                        print(f"[ImagesToVideoNode] 音频合并成功，最终输出: {output_path_full}")
+                    else:
+                        print(f"[ImagesToVideoNode] 音频合并失败，视频将不含音频")
+                        print(f"[ImagesToVideoNode] 原始视频路径: {output_path_full}")
                 else:
-                    print(f"[ImagesToVideoNode] 音频合并失败，视频将不含音频")
-                    print(f"[ImagesToVideoNode] 原始视频路径: {output_path_full}")
-            else:
-                print(f"[ImagesToVideoNode] 未检测到音频输入，跳过音频合并")
+                    print(f"[ImagesToVideoNode] 未检测到音频输入，跳过音频合并")
             
             # 生成信息
             if use_image:
@@ -366,6 +338,101 @@ class ImagesToVideoNode:
             traceback.print_exc()
             return ("", error_msg)
     
+    def _prepare_frame(self, frame, new_width, new_height):
+        """调整帧尺寸并只保留RGB三通道"""
+        if frame.shape[1] != new_width or frame.shape[0] != new_height:
+            frame = cv2.resize(frame, (new_width, new_height), interpolation=cv2.INTER_LINEAR)
+        if frame.shape[2] != 3:
+            frame = frame[:, :, :3]
+        return np.ascontiguousarray(frame)
+    
+    def _iter_static_frames(self, image_np, new_width, new_height, total_frames):
+        """单张图片模式：只处理一次，生成 (帧, 重复次数)"""
+        yield self._prepare_frame(image_np, new_width, new_height), total_frames
+    
+    def _iter_sequence_frames(self, image_frames_np, new_width, new_height, total_frames):
+        """图片帧序列模式：逐帧处理，帧数不足时用最后一帧填充"""
+        batch_size = image_frames_np.shape[0]
+        actual_frame_count = min(batch_size, total_frames)
+        for frame_idx in range(actual_frame_count):
+            yield self._prepare_frame(image_frames_np[frame_idx], new_width, new_height), 1
+        
+        # 如果帧序列不足，用最后一帧填充剩余帧
+        if batch_size < total_frames:
+            remaining_frames = total_frames - batch_size
+            print(f"[ImagesToVideoNode] 帧序列不足，用最后一帧填充 {remaining_frames} 帧")
+            yield self._prepare_frame(image_frames_np[-1], new_width, new_height), remaining_frames
+    
+    def _encode_with_ffmpeg_pipe(self, output_path, frame_source, width, height, fps, audio_path, video_codec, crf, preset):
+        """
+        通过管道把RGB原始帧送入单个ffmpeg进程编码，音频在同一进程中封装
+        
+        Returns:
+            tuple: (是否成功, 错误信息)
+        """
+        cmd = [
+            "ffmpeg", "-y", "-loglevel", "error",
+            "-f", "rawvideo", "-pix_fmt", "rgb24",
+            "-s", f"{width}x{height}", "-r", str(fps),
+            "-i", "-",
+        ]
+        if audio_path:
+            cmd += ["-i", audio_path]
+        cmd += [
+            "-map", "0:v:0",
+            "-c:v", video_codec,
+            # yuv420p要求宽高为偶数
+            "-vf", "pad=ceil(iw/2)*2:ceil(ih/2)*2",
+            "-pix_fmt", "yuv420p",
+        ]
+        if video_codec in ("libx264", "libx265"):
+            cmd += ["-crf", str(crf), "-preset", preset]
+        if audio_path:
+            cmd += ["-map", "1:a:0", "-c:a", "aac", "-shortest"]
+        cmd += ["-movflags", "+faststart", output_path]
+        
+        print(f"[ImagesToVideoNode] FFmpeg 命令: {' '.join(cmd)}")
+        
+        process = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        try:
+            for frame, repeat in frame_source:
+                data = memoryview(frame).cast("B")
+                for _ in range(repeat):
+                    process.stdin.write(data)
+        except BrokenPipeError:
+            # ffmpeg提前退出，错误信息在stderr中
+            pass
+        finally:
+            try:
+                process.stdin.close()
+            except BrokenPipeError:
+                pass
+        
+        stderr = process.stderr.read().decode("utf-8", errors="replace")
+        process.stderr.close()
+        returncode = process.wait()
+        if returncode != 0:
+            print(f"[ImagesToVideoNode] FFmpeg 编码失败，返回码: {returncode}")
+            print(f"[ImagesToVideoNode] 错误信息: {stderr}")
+            if os.path.exists(output_path):
+                os.remove(output_path)
+            return False, stderr.strip() or f"返回码 {returncode}"
+        return True, ""
+    
+    def _write_temp_audio(self, audio_data):
+        """把ComfyUI音频字典写入临时WAV文件，返回路径；数据无效时返回None"""
+        if not isinstance(audio_data, dict):
+            return None
+        waveform = audio_data.get('waveform', None)
+        sample_rate = audio_data.get('sample_rate', None)
+        if waveform is None or sample_rate is None:
+            return None
+        with tempfile.NamedTemporaryFile(suffix='.wav', delete=False) as temp_audio:
+            temp_audio_path = temp_audio.name
+        audio_np = waveform.squeeze().cpu().numpy()
+        sf.write(temp_audio_path, audio_np.T, sample_rate)
+        return temp_audio_path
+    
     def merge_audio_to_video(self, video_path, audio_data):
         """
         使用 FFmpeg 合并音频到视频
@@ -4,6 +4,7 @@ import cv2
 import numpy as np
 import torch
 import tempfile
+import math
 
 
 class LoadVideoPathNode:
@@ -12,7 +13,8 @@ class LoadVideoPathNode:
     """
     
     def __init__(self):
-        pass
+        # 最近一次读取的帧对应的时间范围（秒）
+        self.frame_window = None
     
     @classmethod
     def INPUT_TYPES(cls):
@@ -24,6 +26,61 @@ class LoadVideoPathNode:
                     "label": "视频文件路径",
                     "description": "视频文件的完整路径或相对路径"
                 }),
+            },
+            "optional": {
+                "max_frames": ("INT", {
+                    "default": 500,
+                    "min": 1,
+                    "max": 100000,
+                    "step": 1,
+                    "label": "最大帧数",
+                    "description": "最多读取的帧数，防止内存溢出"
+                }),
+                "frame_stride": ("INT", {
+                    "default": 1,
+                    "min": 1,
+                    "max": 1000,
+                    "step": 1,
+                    "label": "帧间隔",
+                    "description": "每隔多少帧取一帧，1表示逐帧读取"
+                }),
+                "start_time": ("FLOAT", {
+                    "default": 0.0,
+                    "min": 0.0,
+                    "max": 86400.0,
+                    "step": 0.1,
+                    "label": "开始时间(秒)",
+                    "description": "从该时间点开始读取"
+                }),
+                "end_time": ("FLOAT", {
+                    "default": 0.0,
+                    "min": 0.0,
+                    "max": 86400.0,
+                    "step": 0.1,
+                    "label": "结束时间(秒)",
+                    "description": "读取到该时间点为止，0表示读取到视频结尾"
+                }),
+                "target_width": ("INT", {
+                    "default": 0,
+                    "min": 0,
+                    "max": 8192,
+                    "step": 8,
+                    "label": "目标宽度",
+                    "description": "解码后缩放到的宽度，0表示保持原始宽度（仅设置高度时按比例计算）"
+                }),
+                "target_height": ("INT", {
+                    "default": 0,
+                    "min": 0,
+                    "max": 8192,
+                    "step": 8,
+                    "label": "目标高度",
+                    "description": "解码后缩放到的高度，0表示保持原始高度（仅设置宽度时按比例计算）"
+                }),
+                "use_memmap": ("BOOLEAN", {
+                    "default": False,
+                    "label": "使用磁盘映射缓冲",
+                    "description": "解码帧先写入临时磁盘映射文件而不是内存，适合超长视频"
+                }),
             }
         }
     
@@ -32,12 +89,20 @@ class LoadVideoPathNode:
     FUNCTION = "load_video"
     CATEGORY = "XnanTool/媒体处理"
     
-    def load_video(self, video_path):
+    def load_video(self, video_path, max_frames=500, frame_stride=1, start_time=0.0, end_time=0.0,
+                   target_width=0, target_height=0, use_memmap=False):
         """
         加载视频文件路径和数据
         
         Args:
             video_path: 视频文件路径
+            max_frames: 最大帧数
+            frame_stride: 帧间隔
+            start_time: 开始时间（秒）
+            end_time: 结束时间（秒），0表示到结尾
+            target_width: 目标宽度，0表示不缩放
+            target_height: 目标高度，0表示不缩放
+            use_memmap: 是否使用磁盘映射缓冲
             
         Returns:
             tuple: (视频数据, 视频路径)
@@ -58,13 +123,24 @@ class LoadVideoPathNode:
             if ext not in video_extensions:
                 print(f"[LoadVideoPathNode] 警告：文件扩展名可能不是视频格式: {ext}")
             
-            # 读取视频帧（限制最大帧数为500，防止内存溢出）
-            video_frames = self.read_video_frames(video_path, max_frames=500)
-            
-            # 提取音频
+            # 读取视频帧（限制最大帧数，防止内存溢出）
+            self.frame_window = None
+            video_frames = self.read_video_frames(
+                video_path,
+                max_frames=max_frames,
+                frame_stride=frame_stride,
+                start_time=start_time,
+                end_time=end_time,
+                target_width=target_width,
+                target_height=target_height,
+                use_memmap=use_memmap,
+            )
+            
+            # 提取音频（只截取与已读取帧相同的时间范围，保持音画同步）
             audio_data = None
             try:
-                audio_data, _ = self.extract_audio(video_path)
+                audio_start, audio_end = self.frame_window or (0.0, None)
+                audio_data, _ = self.extract_audio(video_path, audio_start, audio_end)
             except Exception as e:
                 print(f"[LoadVideoPathNode] 警告：提取音频失败: {str(e)}")
             
@@ -76,17 +152,30 @@ class LoadVideoPathNode:
             traceback.print_exc()
             return (None, "")
     
-    def read_video_frames(self, video_path, max_frames=1000):
+    def read_video_frames(self, video_path, max_frames=1000, frame_stride=1, start_time=0.0, end_time=0.0,
+                          target_width=0, target_height=0, use_memmap=False):
         """
         读取视频帧并转换为 ComfyUI 格式
         
+        解码后的帧直接写入预分配的 uint8 缓冲区（或临时磁盘映射文件），
+        读取完成后分块一次性转换为 float32，避免逐帧张量列表再 stack 造成的峰值内存翻倍。
+        实际读取的时间范围（秒）记录在 self.frame_window 中，供截取对应的音频。
+        
         Args:
             video_path: 视频文件路径
             max_frames: 最大帧数限制，防止内存溢出
+            frame_stride: 每隔多少帧取一帧
+            start_time: 开始时间（秒）
+            end_time: 结束时间（秒），0表示到结尾
+            target_width: 目标宽度，0表示不缩放
+            target_height: 目标高度，0表示不缩放
+            use_memmap: 是否使用磁盘映射缓冲
             
         Returns:
             torch.Tensor: 视频帧张量 [B, H, W, C]
         """
+        cap = None
+        memmap_path = None
         try:
             # 打开视频文件
             cap = cv2.VideoCapture(video_path)
@@ -95,54 +184,109 @@ class LoadVideoPathNode:
                 print(f"[LoadVideoPathNode] 错误：无法打开视频文件: {video_path}")
                 return None
             
-            # 获取视频总帧数
+            # 获取视频信息
             total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-            print(f"[LoadVideoPathNode] 视频总帧数: {total_frames}")
+            fps = cap.get(cv2.CAP_PROP_FPS) or 0
+            src_width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+            src_height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+            print(f"[LoadVideoPathNode] 视频总帧数: {total_frames}, FPS: {fps:.2f}, 尺寸: {src_width}x{src_height}")
+            
+            frame_stride = max(1, int(frame_stride))
+            
+            # 计算读取范围
+            start_frame = int(start_time * fps) if fps > 0 and start_time > 0 else 0
+            if fps > 0 and end_time > 0:
+                end_frame = int(math.ceil(end_time * fps))
+                if total_frames > 0:
+                    end_frame = min(end_frame, total_frames)
+            else:
+                end_frame = total_frames if total_frames > 0 else None
+            
+            # 计算需要的缓冲区容量
+            if end_frame is not None:
+                capacity = int(math.ceil(max(0, end_frame - start_frame) / frame_stride))
+                if capacity > max_frames:
+                    print(f"[LoadVideoPathNode] 警告：待读取帧数过多 ({capacity} > {max_frames})，将限制加载前 {max_frames} 帧")
+                capacity = min(capacity, max_frames)
+            else:
+                capacity = max_frames
             
-            # 如果帧数太多，限制加载
-            if total_frames > max_frames:
-                print(f"[LoadVideoPathNode] 警告：视频帧数过多 ({total_frames} > {max_frames})，将限制加载前 {max_frames} 帧")
-                total_frames = max_frames
+            if capacity <= 0:
+                print(f"[LoadVideoPathNode] 警告：指定的时间范围内没有帧")
+                return None
             
-            frames = []
-            frame_count = 0
+            # 计算输出尺寸
+            out_width, out_height = self._resolve_target_size(src_width, src_height, target_width, target_height)
             
-            while frame_count < total_frames:
-                ret, frame = cap.read()
+            if start_frame > 0:
+                cap.set(cv2.CAP_PROP_POS_FRAMES, start_frame)
+            
+            # 首帧用于确认真实尺寸（部分容器的宽高属性不可靠）
+            ret, frame = cap.read()
+            if not ret:
+                print(f"[LoadVideoPathNode] 警告：视频中没有读取到帧")
+                return None
+            if src_width <= 0 or src_height <= 0:
+                out_width, out_height = self._resolve_target_size(frame.shape[1], frame.shape[0], target_width, target_height)
+            
+            # 预分配 uint8 缓冲区
+            buffer_shape = (capacity, out_height, out_width, 3)
+            if use_memmap:
+                fd, memmap_path = tempfile.mkstemp(suffix='.frames')
+                os.close(fd)
+                buffer = np.memmap(memmap_path, dtype=np.uint8, mode='w+', shape=buffer_shape)
+            else:
+                buffer = np.empty(buffer_shape, dtype=np.uint8)
+            
+            frame_count = 0
+            frame_index = start_frame
+            while True:
+                if (frame_index - start_frame) % frame_stride == 0:
+                    if frame.shape[1] != out_width or frame.shape[0] != out_height:
+                        frame = cv2.resize(frame, (out_width, out_height), interpolation=cv2.INTER_AREA)
+                    # 转换为 RGB 格式（OpenCV 使用 BGR），直接写入缓冲区
+                    cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=buffer[frame_count])
+                    frame_count += 1
+                    if frame_count >= capacity:
+                        break
                 
-                if not ret:
+                frame_index += 1
+                if end_frame is not None and frame_index >= end_frame:
                     break
                 
-                # 转换为 RGB 格式（OpenCV 使用 BGR）
-                frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+                # 跳过的帧只grab不解码输出
+                if (frame_index - start_frame) % frame_stride != 0:
+                    if not cap.grab():
+                        break
+                    continue
                 
-                # 转换为 numpy 数组并归一化到 [0, 1]
-                frame_np = frame_rgb.astype(np.float32) / 255.0
-                
-                # 转换为 torch 张量
-                frame_tensor = torch.from_numpy(frame_np)
-                
-                frames.append(frame_tensor)
-                frame_count += 1
-            
-            cap.release()
-            
-            if frame_count == 0:
-                print(f"[LoadVideoPathNode] 警告：视频中没有读取到帧")
-                return None
+                ret, frame = cap.read()
+                if not ret:
+                    break
             
             print(f"[LoadVideoPathNode] 成功读取 {frame_count} 帧")
             
-            # 堆叠所有帧为 [B, H, W, C]
+            # 记录已读取帧覆盖的时间范围（每帧代表 frame_stride 个源帧的时长）
+            if fps > 0:
+                window_end_frame = start_frame + frame_count * frame_stride
+                if end_frame is not None:
+                    window_end_frame = min(window_end_frame, end_frame)
+                self.frame_window = (start_frame / fps, window_end_frame / fps)
+            
+            # 分块转换为 float32 [0, 1]
             try:
-                video_tensor = torch.stack(frames)
+                video_tensor = torch.empty((frame_count, out_height, out_width, 3), dtype=torch.float32)
             except RuntimeError as e:
-                print(f"[LoadVideoPathNode] 堆叠帧时发生内存错误: {str(e)}")
-                print(f"[LoadVideoPathNode] 建议：减少视频长度或降低分辨率")
+                print(f"[LoadVideoPathNode] 分配帧张量时发生内存错误: {str(e)}")
+                print(f"[LoadVideoPathNode] 建议：减少视频长度、增大帧间隔或降低分辨率")
                 return None
             
-            print(f"[LoadVideoPathNode] 成功读取 {frame_count} 帧")
+            chunk_size = 64
+            for i in range(0, frame_count, chunk_size):
+                j = min(i + chunk_size, frame_count)
+                video_tensor[i:j].copy_(torch.from_numpy(np.asarray(buffer[i:j]))).div_(255.0)
             
+            del buffer
             return video_tensor
             
         except Exception as e:
@@ -150,13 +294,33 @@ class LoadVideoPathNode:
             import traceback
             traceback.print_exc()
             return None
+        finally:
+            if cap is not None:
+                cap.release()
+            if memmap_path is not None:
+                try:
+                    os.remove(memmap_path)
+                except OSError:
+                    pass
+    
+    def _resolve_target_size(self, src_width, src_height, target_width, target_height):
+        """根据目标宽高计算输出尺寸，只指定一边时按比例计算另一边"""
+        if target_width > 0 and target_height > 0:
+            return int(target_width), int(target_height)
+        if target_width > 0 and src_width > 0:
+            return int(target_width), max(1, int(round(src_height * target_width / src_width)))
+        if target_height > 0 and src_height > 0:
+            return max(1, int(round(src_width * target_height / src_height))), int(target_height)
+        return src_width, src_height
     
-    def extract_audio(self, video_path):
+    def extract_audio(self, video_path, start_time=0.0, end_time=None):
         """
         从视频中提取音频
         
         Args:
             video_path: 视频文件路径
+            start_time: 开始时间（秒）
+            end_time: 结束时间（秒），None表示到结尾
             
         Returns:
             tuple: (音频数据, "")
@@ -168,9 +332,14 @@ class LoadVideoPathNode:
             # 创建临时音频文件
             temp_audio_path = tempfile.mktemp(suffix='.wav')
             
-            # 使用ffmpeg提取音频
-            cmd = [
-                'ffmpeg', '-i', video_path,
+            # 使用ffmpeg提取音频（-ss 放在输入前快速定位，-t 为截取时长）
+            cmd = ['ffmpeg']
+            if start_time and start_time > 0:
+                cmd += ['-ss', f"{start_time:.6f}"]
+            if end_time is not None:
+                cmd += ['-t', f"{max(0.0, end_time - (start_time or 0.0)):.6f}"]
+            cmd += [
+                '-i', video_path,
                 '-vn',  # 不包含视频
                 '-acodec', 'pcm_s16le',  # PCM 16位音频
                 '-ar', '44100',  # 采样率44100Hz
@@ -0,0 +1,119 @@
+"""
+视频多帧采样工具
+将帧号列表、时间戳列表、"每K秒一帧"、"均匀N帧"等采样方式统一解析为排序后的帧索引，
+并在一次顺序解码中取出所有目标帧：不需要的帧只调用 grab() 跳过，
+避免对长GOP的H.264视频逐帧随机 seek
+"""
+
+import logging
+
+import cv2
+
+# 配置日志
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# 多帧提取方式
+MULTI_FRAME_METHODS = ["frame_list", "timestamp_list", "every_k_seconds", "evenly_spaced"]
+
+# 当目标帧与当前位置的距离超过该帧数时，先seek到目标附近再顺序读取
+SEEK_THRESHOLD_FRAMES = 1000
+
+
+def _parse_numbers(spec, cast):
+    values = []
+    for part in str(spec).replace("，", ",").replace(";", ",").split(","):
+        part = part.strip()
+        if part:
+            values.append(cast(part))
+    return values
+
+
+def resolve_frame_indices(method, spec, total_frames, fps):
+    """
+    把多帧采样参数解析为排序去重后的0基帧索引列表
+
+    Args:
+        method: MULTI_FRAME_METHODS 中的一种
+        spec: 采样参数字符串
+            frame_list: 逗号分隔的帧号（从1开始），如 "1,50,100"
+            timestamp_list: 逗号分隔的时间点（秒），如 "0.5,3,10.2"
+            every_k_seconds: 间隔秒数，如 "2.5"
+            evenly_spaced: 帧数，如 "8"
+        total_frames: 视频总帧数
+        fps: 视频帧率
+
+    Returns:
+        list[int]: 有效范围内的帧索引
+    """
+    if total_frames <= 0:
+        return []
+
+    if method == "frame_list":
+        indices = [n - 1 for n in _parse_numbers(spec, int)]
+    elif method == "timestamp_list":
+        if fps <= 0:
+            raise ValueError("无法获取视频帧率，不能按时间戳提取")
+        indices = [int(t * fps) for t in _parse_numbers(spec, float)]
+    elif method == "every_k_seconds":
+        if fps <= 0:
+            raise ValueError("无法获取视频帧率，不能按时间间隔提取")
+        interval = float(str(spec).strip() or 0)
+        if interval <= 0:
+            raise ValueError("时间间隔必须大于0")
+        step = max(1, int(round(interval * fps)))
+        indices = list(range(0, total_frames, step))
+    elif method == "evenly_spaced":
+        count = int(str(spec).strip() or 0)
+        if count <= 0:
+            raise ValueError("均匀采样帧数必须大于0")
+        if count == 1:
+            indices = [0]
+        else:
+            count = min(count, total_frames)
+            indices = [round(k * (total_frames - 1) / (count - 1)) for k in range(count)]
+    else:
+        raise ValueError(f"未知的多帧提取方式: {method}")
+
+    return sorted(set(i for i in indices if 0 <= i < total_frames))
+
+
+def read_frames_sequential(cap, frame_indices):
+    """
+    按升序帧索引一次顺序读取多帧
+
+    Args:
+        cap: 已打开的 cv2.VideoCapture
+        frame_indices: 排序后的0基帧索引
+
+    Yields:
+        (frame_index, frame_bgr)，读取失败的帧会被跳过
+    """
+    if not frame_indices:
+        return
+
+    position = 0
+    first = frame_indices[0]
+    if first > 0:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, first)
+        position = first
+
+    for target in frame_indices:
+        # 距离很远时seek一次比逐帧grab更快
+        if target - position > SEEK_THRESHOLD_FRAMES:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, target)
+            position = target
+
+        # 跳过不需要的帧（grab不做颜色转换和拷贝）
+        while position < target:
+            if not cap.grab():
+                logger.warning(f"视频在第 {position + 1} 帧提前结束")
+                return
+            position += 1
+
+        ret, frame = cap.read()
+        position += 1
+        if not ret:
+            logger.warning(f"无法读取第 {target + 1} 帧")
+            continue
+        yield target, frame
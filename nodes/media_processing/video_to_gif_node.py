@@ -6,6 +6,8 @@ import os
 import logging
 import folder_paths
 
+from ..common.directory_index import directory_index
+
 # 配置日志
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -22,7 +24,7 @@ class VideoToGifNode:
     @classmethod
     def INPUT_TYPES(cls):
         input_dir = folder_paths.get_input_directory()
-        files = [f for f in os.listdir(input_dir) if os.path.isfile(os.path.join(input_dir, f))]
+        files = list(directory_index.list_files(input_dir))
         # 过滤视频文件
         video_files = folder_paths.filter_files_content_types(files, ["video"])
         
@@ -5,9 +5,11 @@ import numpy as np
 from PIL import Image
 from io import BytesIO
 import os
-import base64
 import time
 
+from ..common.image_encoding import encode_image_data_url
+from ..common.response_cache import response_cache
+
 # 检查openai库是否可用
 try:
     from openai import OpenAI
@@ -30,22 +32,7 @@ def save_api_token(token):
 
 def tensor_to_base64_url(image_tensor):
     try:
-        if len(image_tensor.shape) == 4:
-            image_tensor = image_tensor.squeeze(0)
-        
-        if image_tensor.max() <= 1.0:
-            image_np = (image_tensor.cpu().numpy() * 255).astype(np.uint8)
-        else:
-            image_np = image_tensor.cpu().numpy().astype(np.uint8)
-        
-        pil_image = Image.fromarray(image_np)
-        
-        buffer = BytesIO()
-        pil_image.save(buffer, format='JPEG', quality=85)
-        img_base64 = base64.b64encode(buffer.getvalue()).decode('utf-8')
-        
-        return f"data:image/jpeg;base64,{img_base64}"
-        
+        return encode_image_data_url(image_tensor, image_format="JPEG", quality=85)
     except Exception as e:
         print(f"图像转换失败: {e}")
         raise Exception(f"图像格式转换失败: {str(e)}")
@@ -122,6 +109,13 @@ class ModelscopeApiImageCaptionNode:
                     "placeholder": "请输入您的 modelscope API Token",
                     "multiline": False
                 }),
+            },
+            "optional": {
+                "use_cache": ("BOOLEAN", {
+                    "default": True,
+                    "label": "使用响应缓存",
+                    "description": "固定种子时相同的请求直接返回本地缓存的结果，不再调用API（种子为-1时不缓存）"
+                }),
             }
         }
     
@@ -130,7 +124,7 @@ class ModelscopeApiImageCaptionNode:
     FUNCTION = "generate_caption"
     CATEGORY = "XnanTool/魔搭api"
     
-    def generate_caption(self, prompt, image, model_name, max_tokens, temperature, seed, api_token):
+    def generate_caption(self, prompt, image, model_name, max_tokens, temperature, seed, api_token, use_cache=True):
         if not OPENAI_AVAILABLE:
             return ("请先安装openai库: pip install openai",)
         
@@ -180,6 +174,15 @@ class ModelscopeApiImageCaptionNode:
                     api_key=token
                 )
                 
+                # 固定种子时优先返回缓存的响应
+                cache_key = response_cache.key(
+                    use_cache, seed >= 0, "modelscope_chat",
+                    model=model_name, messages=messages, max_tokens=max_tokens, temperature=temperature, seed=seed,
+                )
+                cached = response_cache.get(cache_key)
+                if cached is not None:
+                    return tuple(cached)
+                
                 # 调用API（使用选中的模型）
                 response = client.chat.completions.create(
                     model=model_name,
@@ -198,6 +201,7 @@ class ModelscopeApiImageCaptionNode:
                 description = response.choices[0].message.content
                 print(f"✅ API调用成功!")
                 print(f"📄 结果预览: {description[:100]}...")
+                response_cache.put(cache_key, [description])
                 return (description,)
                 
             except Exception as e:
@@ -1,4 +1,3 @@
-import requests
 import json
 import time
 import torch
@@ -6,10 +5,11 @@ import numpy as np
 from PIL import Image
 from io import BytesIO
 import os
-import base64
-import tempfile
 import random
 
+from ..common.http_client import http_get, http_post
+from ..common.image_encoding import encode_image, encode_image_data_url
+
 
 def load_api_token():
     return ""
@@ -19,22 +19,7 @@ def save_api_token(token):
 
 def tensor_to_base64_url(image_tensor):
     try:
-        if len(image_tensor.shape) == 4:
-            image_tensor = image_tensor.squeeze(0)
-        
-        if image_tensor.max() <= 1.0:
-            image_np = (image_tensor.cpu().numpy() * 255).astype(np.uint8)
-        else:
-            image_np = image_tensor.cpu().numpy().astype(np.uint8)
-        
-        pil_image = Image.fromarray(image_np)
-        
-        buffer = BytesIO()
-        pil_image.save(buffer, format='JPEG', quality=85)
-        img_base64 = base64.b64encode(buffer.getvalue()).decode('utf-8')
-        
-        return f"data:image/jpeg;base64,{img_base64}"
-        
+        return encode_image_data_url(image_tensor, image_format="JPEG", quality=85)
     except Exception as e:
         print(f"图像转换失败: {e}")
         raise Exception(f"图像格式转换失败: {str(e)}")
@@ -173,18 +158,8 @@ class modelscopeLoraImageEditNode:
                 img_width = (img_width // 8) * 8
                 img_height = (img_height // 8) * 8
             
-            pil_image = Image.fromarray((img.cpu().numpy() * 255).astype(np.uint8))
-            if pil_image.mode != 'RGB':
-                pil_image = pil_image.convert('RGB')
-            
-            # 保存到临时文件
-            temp_file = tempfile.NamedTemporaryFile(suffix='.jpg', delete=False)
-            pil_image.save(temp_file.name, format='JPEG', quality=95)
-            temp_file.close()
-            
-            # 读取为 base64
-            with open(temp_file.name, 'rb') as f:
-                img_base64 = base64.b64encode(f.read()).decode('utf-8')
+            # 编码为 base64（相同的参考图只编码一次）
+            img_base64 = encode_image(img, image_format="JPEG", quality=95)
             
             # 准备请求数据
             payload = {
@@ -218,7 +193,7 @@ class modelscopeLoraImageEditNode:
             print("📤 正在提交LoRA图像编辑任务...")
             url = 'https://api-inference.modelscope.cn/v1/images/generations'
             
-            submission_response = requests.post(
+            submission_response = http_post(
                 url,
                 data=json.dumps(payload, ensure_ascii=False).encode('utf-8'),
                 headers={**common_headers, "X-ModelScope-Async-Mode": "true"},
@@ -256,7 +231,7 @@ class modelscopeLoraImageEditNode:
                 
                 while True:
                     # 查询任务状态
-                    task_resp = requests.get(
+                    task_resp = http_get(
                         f"https://api-inference.modelscope.cn/v1/tasks/{task_id}",
                         headers={**common_headers, "X-ModelScope-Task-Type": "image_generation"},
                         timeout=120
@@ -291,7 +266,7 @@ class modelscopeLoraImageEditNode:
                 raise Exception(f"未识别的API返回格式: {submission_json}")
             
             # 下载编辑后的图片
-            img_response = requests.get(result_image_url, timeout=30)
+            img_response = http_get(result_image_url, timeout=30)
             if img_response.status_code != 200:
                 raise Exception(f"图片下载失败: {img_response.status_code}")
             
@@ -310,10 +285,6 @@ class modelscopeLoraImageEditNode:
         except Exception as e:
             print(f"魔搭API-LoRA图像编辑调用失败: {str(e)}")
             raise
-        finally:
-            # 清理临时文件
-            if 'temp_file' in locals() and os.path.exists(temp_file.name):
-                os.unlink(temp_file.name)
 
 # 节点映射和显示名称映射
 NODE_CLASS_MAPPINGS = {
@@ -3,6 +3,8 @@ import json
 import os
 import time
 
+from ..common.response_cache import response_cache
+
 # 检查openai库是否可用
 try:
     from openai import OpenAI
@@ -106,6 +108,13 @@ class ModelscopeApiTextGenerationNode:
                     "placeholder": "请输入您的 modelscope API Token",
                     "multiline": False
                 }),
+            },
+            "optional": {
+                "use_cache": ("BOOLEAN", {
+                    "default": True,
+                    "label": "使用响应缓存",
+                    "description": "固定种子时相同的请求直接返回本地缓存的结果，不再调用API（种子为-1时不缓存）"
+                }),
             }
         }
     
@@ -114,7 +123,7 @@ class ModelscopeApiTextGenerationNode:
     FUNCTION = "generate_text"
     CATEGORY = "XnanTool/魔搭api"
     
-    def generate_text(self, system_prompt, prompt, model_name, max_tokens, temperature, top_p, seed, api_token):
+    def generate_text(self, system_prompt, prompt, model_name, max_tokens, temperature, top_p, seed, api_token, use_cache=True):
         if not OPENAI_AVAILABLE:
             return ("请先安装openai库: pip install openai",)
         
@@ -159,6 +168,15 @@ class ModelscopeApiTextGenerationNode:
                     'content': prompt,
                 })
                 
+                # 固定种子时优先返回缓存的响应
+                cache_key = response_cache.key(
+                    use_cache, seed >= 0, "modelscope_chat",
+                    model=model_name, messages=messages, max_tokens=max_tokens, temperature=temperature, top_p=top_p, seed=seed,
+                )
+                cached = response_cache.get(cache_key)
+                if cached is not None:
+                    return tuple(cached)
+                
                 # 调用API（使用选中的模型）
                 response = client.chat.completions.create(
                     model=model_name,
@@ -178,6 +196,7 @@ class ModelscopeApiTextGenerationNode:
                 generated_text = response.choices[0].message.content
                 print(f"✅ API调用成功!")
                 print(f"📄 结果预览: {generated_text[:100]}...")
+                response_cache.put(cache_key, [generated_text])
                 return (generated_text,)
                 
             except Exception as e:
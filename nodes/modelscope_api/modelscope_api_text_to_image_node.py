@@ -1,4 +1,3 @@
-import requests
 import json
 import time
 import torch
@@ -6,9 +5,18 @@ import numpy as np
 from PIL import Image
 from io import BytesIO
 import os
-import base64
-import tempfile
 import random
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_EXCEPTION
+
+from ..common.http_client import http_get, http_post
+from ..common.image_encoding import encode_image_data_url
+
+# 任务轮询：初始间隔、退避倍数、最大间隔和最长等待时间（秒）
+POLL_INITIAL_INTERVAL = 2.0
+POLL_BACKOFF = 1.5
+POLL_MAX_INTERVAL = 10.0
+POLL_MAX_WAIT_SECONDS = 720
 
 
 def load_api_token():
@@ -19,22 +27,7 @@ def save_api_token(token):
 
 def tensor_to_base64_url(image_tensor):
     try:
-        if len(image_tensor.shape) == 4:
-            image_tensor = image_tensor.squeeze(0)
-        
-        if image_tensor.max() <= 1.0:
-            image_np = (image_tensor.cpu().numpy() * 255).astype(np.uint8)
-        else:
-            image_np = image_tensor.cpu().numpy().astype(np.uint8)
-        
-        pil_image = Image.fromarray(image_np)
-        
-        buffer = BytesIO()
-        pil_image.save(buffer, format='JPEG', quality=85)
-        img_base64 = base64.b64encode(buffer.getvalue()).decode('utf-8')
-        
-        return f"data:image/jpeg;base64,{img_base64}"
-        
+        return encode_image_data_url(image_tensor, image_format="JPEG", quality=85)
     except Exception as e:
         print(f"图像转换失败: {e}")
         raise Exception(f"图像格式转换失败: {str(e)}")
@@ -167,16 +160,17 @@ class modelscopeLoraTextToImageNode:
             # 为每个批次生成使用不同的种子
             base_seed = seed if seed != -1 else random.randint(0, 20251003)
             
-            # 存储所有生成的图像
-            image_tensors = []
+            # 准备请求头 - 统一格式
+            common_headers = {
+                'Authorization': f'Bearer {api_token}',
+                'Content-Type': 'application/json',
+            }
             
-            # 为每个批次生成图像
+            # 先一次性提交所有批次的任务
+            task_ids = []
             for i in range(batch_size):
                 current_seed = base_seed + i if seed != -1 else random.randint(0, 20251003)
                 
-                # 准备API请求参数
-                url = 'https://api-inference.modelscope.cn/v1/images/generations'
-                
                 # 基础payload
                 payload = {
                     'model': base_model,  # 使用用户选择的基础模型
@@ -197,101 +191,24 @@ class modelscopeLoraTextToImageNode:
                 if negative_prompt.strip():
                     payload['negative_prompt'] = negative_prompt
                 
-                # 准备请求头 - 统一格式
-                common_headers = {
-                    'Authorization': f'Bearer {api_token}',
-                    'Content-Type': 'application/json',
-                }
-                
-                headers = {** common_headers, "X-ModelScope-Async-Mode": "true"}
-                
-                # 发送请求
                 print(f"📤 正在提交第 {i+1}/{batch_size} 个LoRA图像生成任务，种子: {current_seed}")
-                submission_response = requests.post(
-                    url,
-                    data=json.dumps(payload, ensure_ascii=False).encode('utf-8'),
-                    headers=headers,
-                    timeout=60
-                )
-                
-                # 处理请求响应
-                if submission_response.status_code != 200:
-                    error_detail = submission_response.text
-                    print(f"❌ API请求失败详情:")
-                    print(f"   状态码: {submission_response.status_code}")
-                    print(f"   响应内容: {error_detail}")
-                    try:
-                        error_json = submission_response.json()
-                        if "errors" in error_json:
-                            error_message = error_json["errors"].get("message", "未知错误")
-                            error_code = error_json["errors"].get("code", "未知错误码")
-                            raise Exception(f"API请求失败 [{submission_response.status_code}]: {error_code} - {error_message}")
-                    except:
-                        pass
-                    raise Exception(f"API请求失败: {submission_response.status_code}, {error_detail}")
-                
-                submission_json = submission_response.json()
-                
-                # 处理异步任务
-                image_url = None
-                if 'task_id' in submission_json:
-                    task_id = submission_json['task_id']
-                    print(f"🕒 已提交第 {i+1} 个任务，任务ID: {task_id}，开始轮询...")
-                    poll_start = time.time()
-                    max_wait_seconds = 720
-                    
-                    while True:
-                        # 查询任务状态 - 修复请求头格式
-                        task_resp = requests.get(
-                            f"https://api-inference.modelscope.cn/v1/tasks/{task_id}",
-                            headers={**common_headers, "X-ModelScope-Task-Type": "image_generation"},
-                            timeout=120
-                        )
-                        
-                        if task_resp.status_code != 200:
-                            raise Exception(f"任务查询失败: {task_resp.status_code}, {task_resp.text}")
-                        
-                        data = task_resp.json()
-                        task_status = data.get("task_status")
-                        
-                        if task_status == "SUCCEED":
-                            if not data.get("output_images") or len(data["output_images"]) == 0:
-                                raise Exception("任务成功但未返回图片URL")
-                            
-                            image_url = data["output_images"][0]
-                            print(f"✅ 第 {i+1} 个任务完成，开始下载图片...")
-                            
-                            # 下载图片
-                            img_response = requests.get(image_url, timeout=30)
-                            if img_response.status_code != 200:
-                                raise Exception(f"图片下载失败: {img_response.status_code}")
-                            
-                            # 处理图片
-                            pil_image = Image.open(BytesIO(img_response.content))
-                            if pil_image.mode != 'RGB':
-                                pil_image = pil_image.convert('RGB')
-                            
-                            # 转换为ComfyUI需要的格式
-                            image_np = np.array(pil_image).astype(np.float32) / 255.0
-                            image_tensor = torch.from_numpy(image_np)[None,]
-                            
-                            # 添加到图像列表
-                            image_tensors.append(image_tensor)
-                            break
-                            
-                        elif task_status == "FAILED":
-                            error_message = data.get("errors", {}).get("message", "未知错误")
-                            error_code = data.get("errors", {}).get("code", "未知错误码")
-                            raise Exception(f"任务失败: 错误码 {error_code}, 错误信息: {error_message}")
-                            
-                        # 检查超时
-                        if time.time() - poll_start > max_wait_seconds:
-                            raise Exception("任务轮询超时，请稍后重试或降低并发")
-                            
-                        # 未完成，继续轮询
-                        time.sleep(5)
-                else:
-                    raise Exception(f"未识别的API返回格式: {submission_json}")
+                task_ids.append(self._submit_task(payload, common_headers))
+                print(f"🕒 已提交第 {i+1} 个任务，任务ID: {task_ids[-1]}")
+            
+            # 并发轮询所有任务，结果按提交顺序排列；任一任务失败时通知其余轮询尽快停止
+            abort_event = threading.Event()
+            with ThreadPoolExecutor(max_workers=max(1, len(task_ids))) as executor:
+                futures = [
+                    executor.submit(self._wait_and_download, task_id, common_headers, i, abort_event)
+                    for i, task_id in enumerate(task_ids)
+                ]
+                # 按完成顺序等待：任一任务先失败时立即通知其余轮询停止，不必等前面的任务结束
+                done, _ = wait(futures, return_when=FIRST_EXCEPTION)
+                failed = next((future for future in futures if future in done and future.exception() is not None), None)
+                if failed is not None:
+                    abort_event.set()
+                    raise failed.exception()
+                image_tensors = [future.result() for future in futures]
             
             # 合并所有图像张量
             if len(image_tensors) > 0:
@@ -312,6 +229,98 @@ class modelscopeLoraTextToImageNode:
                 error_tensor = error_tensor.repeat(batch_size, 1, 1, 1)
             return (error_tensor, text_to_image_models_str)
 
+    @staticmethod
+    def _submit_task(payload, common_headers):
+        """提交异步生成任务，返回任务ID"""
+        url = 'https://api-inference.modelscope.cn/v1/images/generations'
+        headers = {**common_headers, "X-ModelScope-Async-Mode": "true"}
+        submission_response = http_post(
+            url,
+            data=json.dumps(payload, ensure_ascii=False).encode('utf-8'),
+            headers=headers,
+            timeout=60
+        )
+        
+        # 处理请求响应
+        if submission_response.status_code != 200:
+            error_detail = submission_response.text
+            print(f"❌ API请求失败详情:")
+            print(f"   状态码: {submission_response.status_code}")
+            print(f"   响应内容: {error_detail}")
+            try:
+                error_json = submission_response.json()
+                if "errors" in error_json:
+                    error_message = error_json["errors"].get("message", "未知错误")
+                    error_code = error_json["errors"].get("code", "未知错误码")
+                    raise Exception(f"API请求失败 [{submission_response.status_code}]: {error_code} - {error_message}")
+            except:
+                pass
+            raise Exception(f"API请求失败: {submission_response.status_code}, {error_detail}")
+        
+        submission_json = submission_response.json()
+        if 'task_id' not in submission_json:
+            raise Exception(f"未识别的API返回格式: {submission_json}")
+        return submission_json['task_id']
+    
+    @staticmethod
+    def _wait_and_download(task_id, common_headers, index, abort_event):
+        """
+        轮询任务直到完成并下载图片
+        轮询间隔从 POLL_INITIAL_INTERVAL 开始逐步增大到 POLL_MAX_INTERVAL
+        """
+        poll_start = time.time()
+        interval = POLL_INITIAL_INTERVAL
+        
+        while not abort_event.is_set():
+            # 查询任务状态
+            task_resp = http_get(
+                f"https://api-inference.modelscope.cn/v1/tasks/{task_id}",
+                headers={**common_headers, "X-ModelScope-Task-Type": "image_generation"},
+                timeout=120
+            )
+            
+            if task_resp.status_code != 200:
+                raise Exception(f"任务查询失败: {task_resp.status_code}, {task_resp.text}")
+            
+            data = task_resp.json()
+            task_status = data.get("task_status")
+            
+            if task_status == "SUCCEED":
+                if not data.get("output_images") or len(data["output_images"]) == 0:
+                    raise Exception("任务成功但未返回图片URL")
+                
+                image_url = data["output_images"][0]
+                print(f"✅ 第 {index+1} 个任务完成（{time.time() - poll_start:.0f} 秒），开始下载图片...")
+                
+                # 下载图片
+                img_response = http_get(image_url, timeout=30)
+                if img_response.status_code != 200:
+                    raise Exception(f"图片下载失败: {img_response.status_code}")
+                
+                # 处理图片
+                pil_image = Image.open(BytesIO(img_response.content))
+                if pil_image.mode != 'RGB':
+                    pil_image = pil_image.convert('RGB')
+                
+                # 转换为ComfyUI需要的格式
+                image_np = np.array(pil_image).astype(np.float32) / 255.0
+                return torch.from_numpy(image_np)[None,]
+                
+            elif task_status == "FAILED":
+                error_message = data.get("errors", {}).get("message", "未知错误")
+                error_code = data.get("errors", {}).get("code", "未知错误码")
+                raise Exception(f"任务失败: 错误码 {error_code}, 错误信息: {error_message}")
+                
+            # 检查超时
+            if time.time() - poll_start > POLL_MAX_WAIT_SECONDS:
+                raise Exception("任务轮询超时，请稍后重试或降低并发")
+                
+            # 未完成，等待后继续轮询（批次中其他任务失败时立即停止）
+            abort_event.wait(interval)
+            interval = min(interval * POLL_BACKOFF, POLL_MAX_INTERVAL)
+        
+        raise Exception("批次中其他任务失败，已停止轮询")
+
 # 节点映射和显示名称映射
 NODE_CLASS_MAPPINGS = {
     "modelscopeLoraTextToImageNode": modelscopeLoraTextToImageNode
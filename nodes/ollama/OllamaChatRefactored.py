@@ -1,15 +1,16 @@
 import asyncio
-import copy
-import base64
 import json
-from io import BytesIO
 from typing import Any, Literal
 from pprint import pprint
 import re
 from ollama import Client, AsyncClient
 import numpy as np
 from PIL import Image
-from dataclasses import dataclass, field
+
+from ..common.image_encoding import encode_image
+from ..common.response_cache import response_cache
+from .model_manager import OLLAMA_MODELS, keep_alive_seconds
+from .session_store import CHAT_SESSIONS, DEFAULT_HISTORY_TURNS, DEFAULT_HISTORY_CHARS
 
 # For type checking only. Torch is not installed at runtime
 try:
@@ -17,14 +18,6 @@ try:
 except ImportError:
     torch = None
 
-@dataclass
-class ChatSession:
-    messages: list[dict] = field(default_factory=list)
-    model: str = ""
-
-# Dictionary global per session_id
-CHAT_SESSIONS: dict[str, ChatSession] = {}
-
 # Function to filter enabled options
 def _filter_enabled_options(options: dict[str, Any] | None) -> dict[str, Any] | None:
     """仅返回 'enable_*' 标志为 True 的 Ollama 选项。"""
@@ -158,6 +151,33 @@ class OllamaChatRefactored:
                         "tooltip": "清除对话历史记录。警告：如果使用共享历史记录，这将影响所有使用相同历史记录ID的节点。",
                     },
                 ),
+                "max_history_turns": (
+                    "INT",
+                    {
+                        "default": DEFAULT_HISTORY_TURNS,
+                        "min": 0,
+                        "max": 1000,
+                        "step": 1,
+                        "tooltip": "每次请求最多携带的历史对话轮数（一问一答为一轮），更早的对话仍保留在会话中但不再发送。0表示不限制。",
+                    },
+                ),
+                "max_history_chars": (
+                    "INT",
+                    {
+                        "default": DEFAULT_HISTORY_CHARS,
+                        "min": 0,
+                        "max": 1000000,
+                        "step": 100,
+                        "tooltip": "每次请求携带的历史消息总字符数上限，超出时丢弃最早的对话。0表示不限制。",
+                    },
+                ),
+                "use_cache": (
+                    "BOOLEAN",
+                    {
+                        "default": True,
+                        "tooltip": "在Ollama选项中启用固定种子时，相同的请求直接返回本地缓存的结果，不再调用模型。",
+                    },
+                ),
                 "timeout": (
                     "INT",
                     {
@@ -202,6 +222,9 @@ class OllamaChatRefactored:
         meta: dict[str, Any] | None = None,
         history: str | None = None,
         reset_session: bool = False,
+        max_history_turns: int = DEFAULT_HISTORY_TURNS,
+        max_history_chars: int = DEFAULT_HISTORY_CHARS,
+        use_cache: bool = True,
     ) -> tuple[str | None, str | None, dict[str, Any], str | None]:
         """
         异步Ollama聊天生成方法
@@ -219,6 +242,9 @@ class OllamaChatRefactored:
             meta: 元数据
             history: 历史记录ID
             reset_session: 是否重置会话
+            max_history_turns: 携带的最大历史轮数
+            max_history_chars: 携带的历史字符预算
+            use_cache: 固定种子时是否使用响应缓存
             
         Returns:
             tuple: (结果文本, 思考过程, 元数据, 历史记录ID)
@@ -257,11 +283,8 @@ class OllamaChatRefactored:
         else:
             ollama_format = ""
 
-        # 处理keep_alive参数
-        keep_alive_value = meta["connectivity"].get("keep_alive", 5)
-        keep_alive_unit = meta["connectivity"].get("keep_alive_unit", "minutes")
-        keep_alive_unit_short = "m" if keep_alive_unit == "minutes" else "h"
-        request_keep_alive = str(keep_alive_value) + keep_alive_unit_short
+        # 处理keep_alive参数（秒）
+        request_keep_alive = keep_alive_seconds(meta["connectivity"])
 
         # 使用共享助手而不是self.get_request_options
         request_options = _filter_enabled_options(options)
@@ -270,12 +293,7 @@ class OllamaChatRefactored:
         if images is not None and torch is not None:
             images_b64 = []
             for batch_number, image in enumerate(images):
-                i = 255.0 * image.cpu().numpy()
-                img = Image.fromarray(np.clip(i, 0, 255).astype(np.uint8))
-                buffered = BytesIO()
-                img.save(buffered, format="PNG")
-                img_bytes = base64.b64encode(buffered.getvalue()).decode("utf-8")
-                images_b64.append(img_bytes)
+                images_b64.append(encode_image(image, image_format="JPEG"))
 
         if debug_print:
             print(
@@ -299,76 +317,70 @@ timeout: {timeout}
         # 确定使用哪个会话
         session_key = history if history is not None else unique_id
 
-        # 如果reset_session为True，重置会话
-        if reset_session:
-            CHAT_SESSIONS[session_key] = ChatSession()
-            if debug_print:
-                print(f"会话 {session_key} 已重置")
-
-        # 如果会话不存在，创建它
-        if session_key not in CHAT_SESSIONS:
-            CHAT_SESSIONS[session_key] = ChatSession()
-
-        session = CHAT_SESSIONS[session_key]
+        # 获取会话，reset_session为True时重置
+        session = CHAT_SESSIONS.get(session_key, reset=reset_session)
+        if reset_session and debug_print:
+            print(f"会话 {session_key} 已重置")
 
         # 更新返回的历史记录
         history = session_key
 
         # 如果有系统提示词，替换它或添加到开头
-        if system:
-            if session.messages and session.messages[0].get("role") == "system":
-                session.messages[0] = {"role": "system", "content": system}
-            else:
-                session.messages.insert(0, {"role": "system", "content": system})
+        session.set_system(system)
 
-        # 为历史记录构造用户消息
+        # 为历史记录构造用户消息（不带图像，请求成功后才写入会话）
         user_message_for_history: dict[str, Any] = {
             "role": "user",
             "content": prompt,
         }
 
-        # 将用户消息添加到历史记录（不带图像）
-        session.messages.append(user_message_for_history)
+        # 为API调用构造消息：只携带窗口内的最近历史，图像只附加在当前消息上
+        messages_for_api = session.build_request(
+            user_message_for_history, images_b64, max_history_turns, max_history_chars
+        )
 
         if debug_print:
             print("\n--- Ollama聊天会话:")
-            for message in session.messages:
+            for message in messages_for_api:
                 pprint(f"{message['role']}> {message['content'][:50]}...")
                 if "images" in message:
                     for image in message["images"]:
                         pprint(f"图像: {image[:50]}...")
             print("---------------------------------------------------------")
 
-        # 为API调用构造消息（带图像）
-        messages_for_api = copy.deepcopy(session.messages)
-
-        # 如果有图像，修改最后一条用户消息用于API调用
-        if images_b64 is not None:
-            messages_for_api[-1]["images"] = images_b64
+        # 固定种子时优先返回缓存的响应
+        cache_key = response_cache.key(
+            use_cache, bool(request_options) and "seed" in request_options, "ollama_chat",
+            url=url, model=model, messages=messages_for_api, options=request_options,
+            format=ollama_format, think=think,
+        )
+        cached = response_cache.get(cache_key)
 
         try:
-            response = await client.chat(
-                model=model,
-                messages=messages_for_api,
-                options=request_options,
-                keep_alive=request_keep_alive,
-                format=ollama_format,
-            )
+            if cached is not None:
+                ollama_response_text, ollama_response_thinking = cached
+            else:
+                response = await client.chat(
+                    model=model,
+                    messages=messages_for_api,
+                    options=request_options,
+                    keep_alive=request_keep_alive,
+                    format=ollama_format,
+                )
 
-            if debug_print:
-                print("\n--- Ollama聊天响应:")
-                pprint(response)
-                print("---------------------------------------------------------")
+                if debug_print:
+                    print("\n--- Ollama聊天响应:")
+                    pprint(response)
+                    print("---------------------------------------------------------")
 
-            ollama_response_text = response.message.content
-            ollama_response_thinking = response.message.thinking if think else None
+                ollama_response_text = response.message.content
+                ollama_response_thinking = response.message.thinking if think else None
+                response_cache.put(cache_key, [ollama_response_text, ollama_response_thinking])
+                OLLAMA_MODELS.touch(url, model, request_keep_alive)
 
-            # 将助手消息添加到历史记录
-            session.messages.append(
-                {
-                    "role": "assistant",
-                    "content": ollama_response_text,
-                }
+            # 将本轮问答添加到历史记录
+            CHAT_SESSIONS.append_exchange(
+                session_key, session, user_message_for_history, ollama_response_text, model
             )
 
             return (
@@ -397,6 +409,9 @@ timeout: {timeout}
         meta: dict[str, Any] | None = None,
         history: str | None = None,
         reset_session: bool = False,
+        max_history_turns: int = DEFAULT_HISTORY_TURNS,
+        max_history_chars: int = DEFAULT_HISTORY_CHARS,
+        use_cache: bool = True,
         unique_id: str = "",
     ) -> tuple[str | None, str | None, dict[str, Any], str | None]:
         """
@@ -416,6 +431,9 @@ timeout: {timeout}
             meta: 元数据
             history: 历史记录ID
             reset_session: 是否重置会话
+            max_history_turns: 携带的最大历史轮数
+            max_history_chars: 携带的历史字符预算
+            use_cache: 固定种子时是否使用响应缓存
             unique_id: 节点唯一ID
             
         Returns:
@@ -443,6 +461,9 @@ timeout: {timeout}
                         meta=meta,
                         history=history,
                         reset_session=reset_session,
+                        max_history_turns=max_history_turns,
+                        max_history_chars=max_history_chars,
+                        use_cache=use_cache,
                     )
                 )
                 return result
@@ -486,11 +507,8 @@ timeout: {timeout}
             else:
                 ollama_format = ""
 
-            # 处理keep_alive参数
-            keep_alive_value = meta["connectivity"].get("keep_alive", 5)
-            keep_alive_unit = meta["connectivity"].get("keep_alive_unit", "minutes")
-            keep_alive_unit_short = "m" if keep_alive_unit == "minutes" else "h"
-            request_keep_alive = str(keep_alive_value) + keep_alive_unit_short
+            # 处理keep_alive参数（秒）
+            request_keep_alive = keep_alive_seconds(meta["connectivity"])
 
             # 使用共享助手而不是self.get_request_options
             request_options = _filter_enabled_options(options)
@@ -499,12 +517,7 @@ timeout: {timeout}
             if images is not None and torch is not None:
                 images_b64 = []
                 for batch_number, image in enumerate(images):
-                    i = 255.0 * image.cpu().numpy()
-                    img = Image.fromarray(np.clip(i, 0, 255).astype(np.uint8))
-                    buffered = BytesIO()
-                    img.save(buffered, format="PNG")
-                    img_bytes = base64.b64encode(buffered.getvalue()).decode("utf-8")
-                    images_b64.append(img_bytes)
+                    images_b64.append(encode_image(image, image_format="JPEG"))
 
             if debug_print:
                 print(
@@ -528,76 +541,70 @@ timeout: {timeout}
             # 确定使用哪个会话
             session_key = history if history is not None else unique_id
 
-            # 如果reset_session为True，重置会话
-            if reset_session:
-                CHAT_SESSIONS[session_key] = ChatSession()
-                if debug_print:
-                    print(f"会话 {session_key} 已重置")
-
-            # 如果会话不存在，创建它
-            if session_key not in CHAT_SESSIONS:
-                CHAT_SESSIONS[session_key] = ChatSession()
-
-            session = CHAT_SESSIONS[session_key]
+            # 获取会话，reset_session为True时重置
+            session = CHAT_SESSIONS.get(session_key, reset=reset_session)
+            if reset_session and debug_print:
+                print(f"会话 {session_key} 已重置")
 
             # 更新返回的历史记录
             history = session_key
 
             # 如果有系统提示词，替换它或添加到开头
-            if system:
-                if session.messages and session.messages[0].get("role") == "system":
-                    session.messages[0] = {"role": "system", "content": system}
-                else:
-                    session.messages.insert(0, {"role": "system", "content": system})
+            session.set_system(system)
 
-            # 为历史记录构造用户消息
+            # 为历史记录构造用户消息（不带图像，请求成功后才写入会话）
             user_message_for_history: dict[str, Any] = {
                 "role": "user",
                 "content": prompt,
             }
 
-            # 将用户消息添加到历史记录（不带图像）
-            session.messages.append(user_message_for_history)
+            # 为API调用构造消息：只携带窗口内的最近历史，图像只附加在当前消息上
+            messages_for_api = session.build_request(
+                user_message_for_history, images_b64, max_history_turns, max_history_chars
+            )
 
             if debug_print:
                 print("\n--- Ollama聊天会话:")
-                for message in session.messages:
+                for message in messages_for_api:
                     pprint(f"{message['role']}> {message['content'][:50]}...")
                     if "images" in message:
                         for image in message["images"]:
                             pprint(f"图像: {image[:50]}...")
                 print("---------------------------------------------------------")
 
-            # 为API调用构造消息（带图像）
-            messages_for_api = copy.deepcopy(session.messages)
-
-            # 如果有图像，修改最后一条用户消息用于API调用
-            if images_b64 is not None:
-                messages_for_api[-1]["images"] = images_b64
+            # 固定种子时优先返回缓存的响应
+            cache_key = response_cache.key(
+                use_cache, bool(request_options) and "seed" in request_options, "ollama_chat",
+                url=url, model=model, messages=messages_for_api, options=request_options,
+                format=ollama_format, think=think,
+            )
+            cached = response_cache.get(cache_key)
 
             try:
-                response = client.chat(
-                    model=model,
-                    messages=messages_for_api,
-                    options=request_options,
-                    keep_alive=request_keep_alive,
-                    format=ollama_format,
-                )
+                if cached is not None:
+                    ollama_response_text, ollama_response_thinking = cached
+                else:
+                    response = client.chat(
+                        model=model,
+                        messages=messages_for_api,
+                        options=request_options,
+                        keep_alive=request_keep_alive,
+                        format=ollama_format,
+                    )
 
-                if debug_print:
-                    print("\n--- Ollama聊天响应:")
-                    pprint(response)
-                    print("---------------------------------------------------------")
+                    if debug_print:
+                        print("\n--- Ollama聊天响应:")
+                        pprint(response)
+                        print("---------------------------------------------------------")
 
-                ollama_response_text = response.message.content
-                ollama_response_thinking = response.message.thinking if think else None
+                    ollama_response_text = response.message.content
+                    ollama_response_thinking = response.message.thinking if think else None
+                    response_cache.put(cache_key, [ollama_response_text, ollama_response_thinking])
+                    OLLAMA_MODELS.touch(url, model, request_keep_alive)
 
-                # 将助手消息添加到历史记录
-                session.messages.append(
-                    {
-                        "role": "assistant",
-                        "content": ollama_response_text,
-                    }
+                # 将本轮问答添加到历史记录
+                CHAT_SESSIONS.append_exchange(
+                    session_key, session, user_message_for_history, ollama_response_text, model
                 )
 
                 return (
@@ -1,3 +1,4 @@
+import json
 import random
 
 from ollama import Client, AsyncClient
@@ -6,6 +7,8 @@ from io import BytesIO
 from pprint import pprint
 from PIL import Image
 
+from .model_manager import OLLAMA_MODELS, keep_alive_seconds
+
 
 class OllamaConnectivityRefactored:
     """
@@ -27,15 +30,25 @@ class OllamaConnectivityRefactored:
                 "keep_alive_unit": (["seconds", "minutes", "hours"], {"default": "minutes"}),
                 "seed": ("INT", {"default": seed, "min": 0, "max": 2**31, "step": 1}),
             },
+            "optional": {
+                "preload": ("BOOLEAN", {
+                    "default": True,
+                    "tooltip": "连接时用空请求预加载模型，之后的生成请求无需等待模型加载",
+                }),
+                "keep_warm": ("BOOLEAN", {
+                    "default": False,
+                    "tooltip": "在后台于keep_alive到期前自动续期，模型持续使用期间不会被卸载（空闲30分钟后暂停续期，再次使用时自动恢复）",
+                }),
+            },
         }
 
-    RETURN_TYPES = ("OLLAMA_CONNECTIVITY",)
-    RETURN_NAMES = ("connection",)
+    RETURN_TYPES = ("OLLAMA_CONNECTIVITY", "STRING")
+    RETURN_NAMES = ("connection", "status")
     FUNCTION = "connect"
     CATEGORY = "XnanTool/Ollama"
     DESCRIPTION = "重构版 Ollama 服务器连接，支持超时设置、保持连接和随机种子配置。"
 
-    def connect(self, url, model, timeout, keep_alive, keep_alive_unit, seed):
+    def connect(self, url, model, timeout, keep_alive, keep_alive_unit, seed, preload=True, keep_warm=False):
         # 设置随机种子
         random.seed(seed)
         
@@ -53,8 +66,19 @@ class OllamaConnectivityRefactored:
             "keep_alive": keep_alive,
             "keep_alive_unit": keep_alive_unit,
             "seed": seed,
+            "preload": preload,
+            "keep_warm": keep_warm,
         }
-        return (data,)
+
+        # 验证一次连接（结果会被生成节点复用），并按需预加载模型
+        if preload or keep_warm:
+            if OLLAMA_MODELS.validate(url, model, timeout):
+                OLLAMA_MODELS.preload(url, model, keep_alive_seconds(data), max(timeout, 300), keep_warm)
+            else:
+                print(f"无法连接到Ollama服务器 {url} 或模型 {model} 不可用，跳过预加载")
+
+        status = json.dumps(OLLAMA_MODELS.metrics(url, model), ensure_ascii=False, indent=2)
+        return (data, status)
 
 
 NODE_CLASS_MAPPINGS = {
@@ -1,14 +1,16 @@
 import asyncio
-import copy
-import base64
-from io import BytesIO
+import time
 from typing import Any, Literal
 from pprint import pprint
 import re
 from ollama import Client, AsyncClient
 import numpy as np
 from PIL import Image
-from dataclasses import dataclass, field
+
+from ..common.image_encoding import encode_image
+from ..common.response_cache import response_cache
+from .model_manager import OLLAMA_MODELS, keep_alive_seconds
+from .session_store import CHAT_SESSIONS, DEFAULT_HISTORY_TURNS, DEFAULT_HISTORY_CHARS
 
 # For type checking only. Torch is not installed at runtime
 try:
@@ -16,14 +18,6 @@ try:
 except ImportError:
     torch = None
 
-@dataclass
-class ChatSession:
-    messages: list[dict] = field(default_factory=list)
-    model: str = ""
-
-# Dictionary global per session_id
-CHAT_SESSIONS: dict[str, ChatSession] = {}
-
 # Function to filter enabled options
 def _filter_enabled_options(options: dict[str, Any] | None) -> dict[str, Any] | None:
     """仅返回 'enable_*' 标志为 True 的 Ollama 选项。"""
@@ -52,6 +46,48 @@ def _filter_enabled_options(options: dict[str, Any] | None) -> dict[str, Any] |
             out[key] = options[key]
     return out or None
 
+# 批量模式下向界面推送流式文本的最小间隔（秒）
+STREAM_UPDATE_INTERVAL = 0.25
+
+
+def _send_progress_text(text: str, node_id: str) -> None:
+    """在节点上显示进度文本（旧版ComfyUI不支持时忽略）"""
+    try:
+        from server import PromptServer
+        PromptServer.instance.send_progress_text(text, node_id)
+    except Exception:
+        pass
+
+
+class _BatchStreamReporter:
+    """汇总批量请求的进度和最新的流式输出，按固定间隔推送到界面"""
+
+    def __init__(self, node_id: str, total: int):
+        self.node_id = node_id
+        self.total = total
+        self.completed = 0
+        self._last_sent = 0.0
+        try:
+            import comfy.utils
+            self._pbar = comfy.utils.ProgressBar(total)
+        except Exception:
+            self._pbar = None
+
+    def stream(self, index: int, text: str) -> None:
+        now = time.monotonic()
+        if not self.node_id or now - self._last_sent < STREAM_UPDATE_INTERVAL:
+            return
+        self._last_sent = now
+        _send_progress_text(f"[{self.completed}/{self.total} 完成] #{index + 1}: {text[-500:]}", self.node_id)
+
+    def done(self) -> None:
+        self.completed += 1
+        if self._pbar is not None:
+            self._pbar.update(1)
+        if self.node_id:
+            _send_progress_text(f"[{self.completed}/{self.total} 完成]", self.node_id)
+
+
 class OllamaGenerateRefactored:
     """
     重构版的 Ollama 文本生成节点，具有以下增强功能：
@@ -155,6 +191,33 @@ class OllamaGenerateRefactored:
                         "tooltip": "清除对话历史记录。警告：如果使用共享历史记录，这将影响所有使用相同历史记录ID的节点。",
                     },
                 ),
+                "max_history_turns": (
+                    "INT",
+                    {
+                        "default": DEFAULT_HISTORY_TURNS,
+                        "min": 0,
+                        "max": 1000,
+                        "step": 1,
+                        "tooltip": "每次请求最多携带的历史对话轮数（一问一答为一轮），更早的对话仍保留在会话中但不再发送。0表示不限制。",
+                    },
+                ),
+                "max_history_chars": (
+                    "INT",
+                    {
+                        "default": DEFAULT_HISTORY_CHARS,
+                        "min": 0,
+                        "max": 1000000,
+                        "step": 100,
+                        "tooltip": "每次请求携带的历史消息总字符数上限，超出时丢弃最早的对话。0表示不限制。",
+                    },
+                ),
+                "use_cache": (
+                    "BOOLEAN",
+                    {
+                        "default": True,
+                        "tooltip": "在Ollama选项中启用固定种子时，相同的请求直接返回本地缓存的结果，不再调用模型。",
+                    },
+                ),
                 "timeout": (
                     "INT",
                     {
@@ -165,6 +228,23 @@ class OllamaGenerateRefactored:
                         "tooltip": "请求超时时间（秒）。如果服务器在此时间内没有响应，请求将被取消。",
                     },
                 ),
+                "batch_mode": (
+                    "BOOLEAN",
+                    {
+                        "default": False,
+                        "tooltip": "批量模式：提示词每行作为一个独立请求，图像批次中的每张图像也单独请求（只有一行提示词时所有图像共用该提示词，否则行数须与图像数量一致）。批量请求互不共享对话历史，结果按顺序从results输出。",
+                    },
+                ),
+                "batch_concurrency": (
+                    "INT",
+                    {
+                        "default": 4,
+                        "min": 1,
+                        "max": 64,
+                        "step": 1,
+                        "tooltip": "批量模式下同时发送的请求数，建议与Ollama服务器的 OLLAMA_NUM_PARALLEL 保持一致。",
+                    },
+                ),
             },
             "hidden": {"unique_id": "UNIQUE_ID"},
         }
@@ -174,20 +254,23 @@ class OllamaGenerateRefactored:
         "STRING",
         "OLLAMA_META",
         "OLLAMA_HISTORY",
+        "STRING",
     )
     RETURN_NAMES = (
         "result",
         "thinking",
         "meta",
         "history",
+        "results",
     )
+    OUTPUT_IS_LIST = (False, False, False, False, True)
     FUNCTION = "ollama_generate_refactored"
     CATEGORY = "XnanTool/Ollama"
     DESCRIPTION = "重构版的Ollama文本生成节点。支持视觉任务、多轮对话和高级推理选项。具有连接验证、重连功能和异步处理支持。"
 
     async def validate_connection_async(self, url: str, model: str, timeout: int = 30) -> bool:
         """
-        异步验证Ollama连接和模型可用性
+        异步验证Ollama连接和模型可用性（与同步方法共用验证缓存）
         
         Args:
             url: Ollama服务器URL
@@ -197,39 +280,22 @@ class OllamaGenerateRefactored:
         Returns:
             bool: 连接是否有效
         """
-        try:
-            client = AsyncClient(host=url, timeout=timeout)
-            # 尝试列出模型以验证连接
-            models = await client.list()
-            # 检查指定模型是否存在
-            available_models = [m['model'] for m in models.get('models', [])]
-            return model in available_models
-        except Exception as e:
-            print(f"连接验证失败: {str(e)}")
-            return False
+        return await asyncio.to_thread(OLLAMA_MODELS.validate, url, model, timeout)
 
-    def validate_connection_sync(self, url: str, model: str, timeout: int = 30) -> bool:
+    def validate_connection_sync(self, url: str, model: str, timeout: int = 30, force: bool = False) -> bool:
         """
-        同步验证Ollama连接和模型可用性
+        同步验证Ollama连接和模型可用性（结果在有效期内复用，不必每次执行都请求模型列表）
         
         Args:
             url: Ollama服务器URL
             model: 模型名称
             timeout: 超时时间（秒）
+            force: 忽略缓存的验证结果
             
         Returns:
             bool: 连接是否有效
         """
-        try:
-            client = Client(host=url, timeout=timeout)
-            # 尝试列出模型以验证连接
-            models = client.list()
-            # 检查指定模型是否存在
-            available_models = [m['model'] for m in models.get('models', [])]
-            return model in available_models
-        except Exception as e:
-            print(f"连接验证失败: {str(e)}")
-            return False
+        return OLLAMA_MODELS.validate(url, model, timeout, force=force)
 
     async def ollama_chat_async(
         self,
@@ -245,6 +311,9 @@ class OllamaGenerateRefactored:
         meta: dict[str, Any] | None = None,
         history: str | None = None,
         reset_session: bool = False,
+        max_history_turns: int = DEFAULT_HISTORY_TURNS,
+        max_history_chars: int = DEFAULT_HISTORY_CHARS,
+        use_cache: bool = True,
     ) -> tuple[str | None, str | None, dict[str, Any], str | None]:
         """
         异步Ollama聊天生成方法
@@ -262,6 +331,9 @@ class OllamaGenerateRefactored:
             meta: 元数据
             history: 历史记录ID
             reset_session: 是否重置会话
+            max_history_turns: 携带的最大历史轮数
+            max_history_chars: 携带的历史字符预算
+            use_cache: 固定种子时是否使用响应缓存
             
         Returns:
             tuple: (结果文本, 思考过程, 元数据, 历史记录ID)
@@ -298,11 +370,8 @@ class OllamaGenerateRefactored:
         elif format == "text":
             ollama_format = ""
 
-        # 处理keep_alive参数
-        keep_alive_value = meta["connectivity"].get("keep_alive", 5)
-        keep_alive_unit = meta["connectivity"].get("keep_alive_unit", "minutes")
-        keep_alive_unit_short = "m" if keep_alive_unit == "minutes" else "h"
-        request_keep_alive = str(keep_alive_value) + keep_alive_unit_short
+        # 处理keep_alive参数（秒）
+        request_keep_alive = keep_alive_seconds(meta["connectivity"])
 
         # 使用共享助手而不是self.get_request_options
         request_options = _filter_enabled_options(options)
@@ -311,12 +380,7 @@ class OllamaGenerateRefactored:
         if images is not None and torch is not None:
             images_b64 = []
             for batch_number, image in enumerate(images):
-                i = 255.0 * image.cpu().numpy()
-                img = Image.fromarray(np.clip(i, 0, 255).astype(np.uint8))
-                buffered = BytesIO()
-                img.save(buffered, format="PNG")
-                img_bytes = base64.b64encode(buffered.getvalue()).decode("utf-8")
-                images_b64.append(img_bytes)
+                images_b64.append(encode_image(image, image_format="JPEG"))
 
         if debug_print:
             print(
@@ -340,76 +404,70 @@ timeout: {timeout}
         # 确定使用哪个会话
         session_key = history if history is not None else unique_id
 
-        # 如果reset_session为True，重置会话
-        if reset_session:
-            CHAT_SESSIONS[session_key] = ChatSession()
-            if debug_print:
-                print(f"会话 {session_key} 已重置")
-
-        # 如果会话不存在，创建它
-        if session_key not in CHAT_SESSIONS:
-            CHAT_SESSIONS[session_key] = ChatSession()
-
-        session = CHAT_SESSIONS[session_key]
+        # 获取会话，reset_session为True时重置
+        session = CHAT_SESSIONS.get(session_key, reset=reset_session)
+        if reset_session and debug_print:
+            print(f"会话 {session_key} 已重置")
 
         # 更新返回的历史记录
         history = session_key
 
         # 如果有系统提示词，替换它或添加到开头
-        if system:
-            if session.messages and session.messages[0].get("role") == "system":
-                session.messages[0] = {"role": "system", "content": system}
-            else:
-                session.messages.insert(0, {"role": "system", "content": system})
+        session.set_system(system)
 
-        # 为历史记录构造用户消息
+        # 为历史记录构造用户消息（不带图像，请求成功后才写入会话）
         user_message_for_history: dict[str, Any] = {
             "role": "user",
             "content": prompt,
         }
 
-        # 将用户消息添加到历史记录（不带图像）
-        session.messages.append(user_message_for_history)
+        # 为API调用构造消息：只携带窗口内的最近历史，图像只附加在当前消息上
+        messages_for_api = session.build_request(
+            user_message_for_history, images_b64, max_history_turns, max_history_chars
+        )
 
         if debug_print:
             print("\n--- Ollama聊天会话:")
-            for message in session.messages:
+            for message in messages_for_api:
                 pprint(f"{message['role']}> {message['content'][:50]}...")
                 if "images" in message:
                     for image in message["images"]:
                         pprint(f"图像: {image[:50]}...")
             print("---------------------------------------------------------")
 
-        # 为API调用构造消息（带图像）
-        messages_for_api = copy.deepcopy(session.messages)
-
-        # 如果有图像，修改最后一条用户消息用于API调用
-        if images_b64 is not None:
-            messages_for_api[-1]["images"] = images_b64
+        # 固定种子时优先返回缓存的响应
+        cache_key = response_cache.key(
+            use_cache, bool(request_options) and "seed" in request_options, "ollama_chat",
+            url=url, model=model, messages=messages_for_api, options=request_options,
+            format=ollama_format, think=think,
+        )
+        cached = response_cache.get(cache_key)
 
         try:
-            response = await client.chat(
-                model=model,
-                messages=messages_for_api,
-                options=request_options,
-                keep_alive=request_keep_alive,
-                format=ollama_format,
-            )
+            if cached is not None:
+                ollama_response_text, ollama_response_thinking = cached
+            else:
+                response = await client.chat(
+                    model=model,
+                    messages=messages_for_api,
+                    options=request_options,
+                    keep_alive=request_keep_alive,
+                    format=ollama_format,
+                )
 
-            if debug_print:
-                print("\n--- Ollama聊天响应:")
-                pprint(response)
-                print("---------------------------------------------------------")
+                if debug_print:
+                    print("\n--- Ollama聊天响应:")
+                    pprint(response)
+                    print("---------------------------------------------------------")
 
-            ollama_response_text = response.message.content
-            ollama_response_thinking = response.message.thinking if think else None
+                ollama_response_text = response.message.content
+                ollama_response_thinking = response.message.thinking if think else None
+                response_cache.put(cache_key, [ollama_response_text, ollama_response_thinking])
+                OLLAMA_MODELS.touch(url, model, request_keep_alive)
 
-            # 将助手消息添加到历史记录
-            session.messages.append(
-                {
-                    "role": "assistant",
-                    "content": ollama_response_text,
-                }
+            # 将本轮问答添加到历史记录
+            CHAT_SESSIONS.append_exchange(
+                session_key, session, user_message_for_history, ollama_response_text, model
             )
 
             return (
@@ -423,6 +481,156 @@ timeout: {timeout}
             print(error_msg)
             raise Exception(error_msg)
 
+    async def ollama_batch_async(
+        self,
+        client: AsyncClient,
+        model: str,
+        jobs: list[tuple[str, list[str] | None]],
+        system: str,
+        think: bool,
+        ollama_format: Literal["", "json"] | None,
+        request_options: dict[str, Any] | None,
+        request_keep_alive: int,
+        concurrency: int,
+        reporter: _BatchStreamReporter,
+        url: str = "",
+        use_cache: bool = True,
+    ) -> tuple[list[str], list[str], list[str]]:
+        """
+        在同一个AsyncClient上以有限并发执行批量请求
+
+        Returns:
+            tuple: (按顺序排列的结果, 思考过程, 错误信息)
+        """
+        semaphore = asyncio.Semaphore(concurrency)
+        results = [""] * len(jobs)
+        thinkings = [""] * len(jobs)
+        errors: list[str] = []
+
+        async def run_one(index: int, prompt: str, images_b64: list[str] | None) -> None:
+            messages: list[dict[str, Any]] = []
+            if system:
+                messages.append({"role": "system", "content": system})
+            user_message: dict[str, Any] = {"role": "user", "content": prompt}
+            if images_b64:
+                user_message["images"] = images_b64
+            messages.append(user_message)
+
+            # 固定种子时优先返回缓存的响应
+            cache_key = response_cache.key(
+                use_cache, bool(request_options) and "seed" in request_options, "ollama_chat",
+                url=url, model=model, messages=messages, options=request_options,
+                format=ollama_format, think=think,
+            )
+            cached = response_cache.get(cache_key)
+            if cached is not None:
+                results[index], thinkings[index] = cached[0], cached[1] or ""
+                reporter.done()
+                return
+
+            async with semaphore:
+                content_parts: list[str] = []
+                thinking_parts: list[str] = []
+                try:
+                    stream = await client.chat(
+                        model=model,
+                        messages=messages,
+                        options=request_options,
+                        keep_alive=request_keep_alive,
+                        format=ollama_format,
+                        stream=True,
+                    )
+                    async for chunk in stream:
+                        if chunk.message.content:
+                            content_parts.append(chunk.message.content)
+                            reporter.stream(index, "".join(content_parts))
+                        if think and getattr(chunk.message, "thinking", None):
+                            thinking_parts.append(chunk.message.thinking)
+                    results[index] = "".join(content_parts)
+                    thinkings[index] = "".join(thinking_parts)
+                    response_cache.put(cache_key, [results[index], thinkings[index] if think else None])
+                    OLLAMA_MODELS.touch(url, model, request_keep_alive)
+                except Exception as e:
+                    error_msg = f"第 {index + 1} 个请求失败: {str(e)}"
+                    print(error_msg)
+                    errors.append(error_msg)
+                finally:
+                    reporter.done()
+
+        await asyncio.gather(*(run_one(i, p, imgs) for i, (p, imgs) in enumerate(jobs)))
+        return results, thinkings, errors
+
+    def ollama_batch(
+        self,
+        system: str,
+        prompt: str,
+        think: bool,
+        format: str,
+        timeout: int,
+        options: dict[str, Any] | None,
+        connectivity: dict[str, Any] | None,
+        images: Any,
+        meta: dict[str, Any] | None,
+        history: str | None,
+        batch_concurrency: int,
+        unique_id: str,
+        use_cache: bool = True,
+    ) -> tuple[str, str, dict[str, Any], str | None, list[str]]:
+        """
+        批量模式：把多行提示词和/或图像批次拆分为独立请求并发执行，按顺序返回结果
+        """
+        if meta is None:
+            if connectivity is None:
+                raise ValueError("必须提供'connectivity'或'meta'中的一个。")
+            meta = {}
+        if connectivity is not None:
+            meta["connectivity"] = connectivity
+        meta["options"] = options
+        if "connectivity" not in meta or meta["connectivity"] is None:
+            raise ValueError("meta中必须存在'connectivity'。")
+
+        url = meta["connectivity"]["url"]
+        model = meta["connectivity"]["model"]
+        ollama_format: Literal["", "json"] | None = "json" if format == "json" else ""
+
+        request_keep_alive = keep_alive_seconds(meta["connectivity"])
+        request_options = _filter_enabled_options(options)
+
+        # 拆分请求：每行提示词一个请求，图像批次中每张图像一个请求
+        prompts = [line.strip() for line in prompt.splitlines() if line.strip()] or [prompt]
+        image_list = list(images) if images is not None and torch is not None else []
+        if image_list:
+            if len(prompts) == 1:
+                prompts = prompts * len(image_list)
+            elif len(prompts) != len(image_list):
+                raise ValueError(f"批量模式下提示词行数（{len(prompts)}）必须为1或与图像数量（{len(image_list)}）一致")
+            jobs = [(p, [encode_image(img, image_format="JPEG")]) for p, img in zip(prompts, image_list)]
+        else:
+            jobs = [(p, None) for p in prompts]
+
+        print(f"Ollama批量模式: {len(jobs)} 个请求，并发数 {batch_concurrency}")
+        reporter = _BatchStreamReporter(unique_id, len(jobs))
+        client = AsyncClient(host=url, timeout=timeout)
+        results, thinkings, errors = asyncio.run(
+            self.ollama_batch_async(
+                client, model, jobs, system, think, ollama_format,
+                request_options, request_keep_alive, batch_concurrency, reporter,
+                url=url, use_cache=use_cache,
+            )
+        )
+        if errors and len(errors) == len(jobs):
+            raise Exception(f"Ollama批量请求全部失败: {errors[0]}")
+        if errors:
+            print(f"Ollama批量模式: {len(errors)} 个请求失败，对应结果为空字符串")
+
+        return (
+            "\n\n".join(results),
+            "\n\n".join(t for t in thinkings if t) if think else None,
+            meta,
+            history,
+            results,
+        )
+
     def ollama_generate_refactored(
         self,
         system: str,
@@ -438,8 +646,13 @@ timeout: {timeout}
         meta: dict[str, Any] | None = None,
         history: str | None = None,
         reset_session: bool = False,
+        max_history_turns: int = DEFAULT_HISTORY_TURNS,
+        max_history_chars: int = DEFAULT_HISTORY_CHARS,
+        use_cache: bool = True,
+        batch_mode: bool = False,
+        batch_concurrency: int = 4,
         unique_id: str = "",
-    ) -> tuple[str | None, str | None, dict[str, Any], str | None]:
+    ) -> tuple[str | None, str | None, dict[str, Any], str | None, list[str]]:
         """
         重构版的Ollama生成方法，支持连接验证、重连和异步处理
         
@@ -457,26 +670,48 @@ timeout: {timeout}
             meta: 元数据
             history: 历史记录ID
             reset_session: 是否重置会话
+            max_history_turns: 携带的最大历史轮数
+            max_history_chars: 携带的历史字符预算
+            use_cache: 固定种子时是否使用响应缓存
+            batch_mode: 是否启用批量模式
+            batch_concurrency: 批量模式的并发请求数
             unique_id: 节点唯一ID
             
         Returns:
-            tuple: (结果文本, 思考过程, 元数据, 历史记录ID)
+            tuple: (结果文本, 思考过程, 元数据, 历史记录ID, 结果列表)
         """
         # 如果需要验证连接或重新连接，则先验证连接
         if validate_connection or reconnect:
             if meta is not None and "connectivity" in meta and meta["connectivity"] is not None:
                 url = meta["connectivity"]["url"]
                 model = meta["connectivity"]["model"]
-                is_valid = self.validate_connection_sync(url, model, timeout)
+                is_valid = self.validate_connection_sync(url, model, timeout, force=reconnect)
                 if not is_valid:
                     raise Exception(f"无法连接到Ollama服务器 {url} 或模型 {model} 不可用")
             elif connectivity is not None:
                 url = connectivity["url"]
                 model = connectivity["model"]
-                is_valid = self.validate_connection_sync(url, model, timeout)
+                is_valid = self.validate_connection_sync(url, model, timeout, force=reconnect)
                 if not is_valid:
                     raise Exception(f"无法连接到Ollama服务器 {url} 或模型 {model} 不可用")
 
+        if batch_mode:
+            return self.ollama_batch(
+                system=system,
+                prompt=prompt,
+                think=think,
+                format=format,
+                timeout=timeout,
+                options=options,
+                connectivity=connectivity,
+                images=images,
+                meta=meta,
+                history=history,
+                batch_concurrency=batch_concurrency,
+                unique_id=unique_id,
+                use_cache=use_cache,
+            )
+
         # 如果启用了重新连接，使用异步方法处理
         if reconnect:
             try:
@@ -498,10 +733,13 @@ timeout: {timeout}
                         meta=meta,
                         history=history,
                         reset_session=reset_session,
+                        max_history_turns=max_history_turns,
+                        max_history_chars=max_history_chars,
+                        use_cache=use_cache,
                     )
                 )
                 loop.close()
-                return result
+                return (*result, [result[0]])
             except Exception as e:
                 raise Exception(f"重新连接模式下生成失败: {str(e)}")
         else:
@@ -538,11 +776,8 @@ timeout: {timeout}
             elif format == "text":
                 ollama_format = ""
 
-            # 处理keep_alive参数
-            keep_alive_value = meta["connectivity"].get("keep_alive", 5)
-            keep_alive_unit = meta["connectivity"].get("keep_alive_unit", "minutes")
-            keep_alive_unit_short = "m" if keep_alive_unit == "minutes" else "h"
-            request_keep_alive = str(keep_alive_value) + keep_alive_unit_short
+            # 处理keep_alive参数（秒）
+            request_keep_alive = keep_alive_seconds(meta["connectivity"])
 
             # 使用共享助手而不是self.get_request_options
             request_options = _filter_enabled_options(options)
@@ -551,12 +786,7 @@ timeout: {timeout}
             if images is not None and torch is not None:
                 images_b64 = []
                 for batch_number, image in enumerate(images):
-                    i = 255.0 * image.cpu().numpy()
-                    img = Image.fromarray(np.clip(i, 0, 255).astype(np.uint8))
-                    buffered = BytesIO()
-                    img.save(buffered, format="PNG")
-                    img_bytes = base64.b64encode(buffered.getvalue()).decode("utf-8")
-                    images_b64.append(img_bytes)
+                    images_b64.append(encode_image(image, image_format="JPEG"))
 
             if debug_print:
                 print(
@@ -580,76 +810,70 @@ timeout: {timeout}
             # 确定使用哪个会话
             session_key = history if history is not None else unique_id
 
-            # 如果reset_session为True，重置会话
-            if reset_session:
-                CHAT_SESSIONS[session_key] = ChatSession()
-                if debug_print:
-                    print(f"会话 {session_key} 已重置")
-
-            # 如果会话不存在，创建它
-            if session_key not in CHAT_SESSIONS:
-                CHAT_SESSIONS[session_key] = ChatSession()
-
-            session = CHAT_SESSIONS[session_key]
+            # 获取会话，reset_session为True时重置
+            session = CHAT_SESSIONS.get(session_key, reset=reset_session)
+            if reset_session and debug_print:
+                print(f"会话 {session_key} 已重置")
 
             # 更新返回的历史记录
             history = session_key
 
             # 如果有系统提示词，替换它或添加到开头
-            if system:
-                if session.messages and session.messages[0].get("role") == "system":
-                    session.messages[0] = {"role": "system", "content": system}
-                else:
-                    session.messages.insert(0, {"role": "system", "content": system})
+            session.set_system(system)
 
-            # 为历史记录构造用户消息
+            # 为历史记录构造用户消息（不带图像，请求成功后才写入会话）
             user_message_for_history: dict[str, Any] = {
                 "role": "user",
                 "content": prompt,
             }
 
-            # 将用户消息添加到历史记录（不带图像）
-            session.messages.append(user_message_for_history)
+            # 为API调用构造消息：只携带窗口内的最近历史，图像只附加在当前消息上
+            messages_for_api = session.build_request(
+                user_message_for_history, images_b64, max_history_turns, max_history_chars
+            )
 
             if debug_print:
                 print("\n--- Ollama聊天会话:")
-                for message in session.messages:
+                for message in messages_for_api:
                     pprint(f"{message['role']}> {message['content'][:50]}...")
                     if "images" in message:
                         for image in message["images"]:
                             pprint(f"图像: {image[:50]}...")
                 print("---------------------------------------------------------")
 
-            # 为API调用构造消息（带图像）
-            messages_for_api = copy.deepcopy(session.messages)
-
-            # 如果有图像，修改最后一条用户消息用于API调用
-            if images_b64 is not None:
-                messages_for_api[-1]["images"] = images_b64
+            # 固定种子时优先返回缓存的响应
+            cache_key = response_cache.key(
+                use_cache, bool(request_options) and "seed" in request_options, "ollama_chat",
+                url=url, model=model, messages=messages_for_api, options=request_options,
+                format=ollama_format, think=think,
+            )
+            cached = response_cache.get(cache_key)
 
             try:
-                response = client.chat(
-                    model=model,
-                    messages=messages_for_api,
-                    options=request_options,
-                    keep_alive=request_keep_alive,
-                    format=ollama_format,
-                )
+                if cached is not None:
+                    ollama_response_text, ollama_response_thinking = cached
+                else:
+                    response = client.chat(
+                        model=model,
+                        messages=messages_for_api,
+                        options=request_options,
+                        keep_alive=request_keep_alive,
+                        format=ollama_format,
+                    )
 
-                if debug_print:
-                    print("\n--- Ollama聊天响应:")
-                    pprint(response)
-                    print("---------------------------------------------------------")
+                    if debug_print:
+                        print("\n--- Ollama聊天响应:")
+                        pprint(response)
+                        print("---------------------------------------------------------")
 
-                ollama_response_text = response.message.content
-                ollama_response_thinking = response.message.thinking if think else None
+                    ollama_response_text = response.message.content
+                    ollama_response_thinking = response.message.thinking if think else None
+                    response_cache.put(cache_key, [ollama_response_text, ollama_response_thinking])
+                    OLLAMA_MODELS.touch(url, model, request_keep_alive)
 
-                # 将助手消息添加到历史记录
-                session.messages.append(
-                    {
-                        "role": "assistant",
-                        "content": ollama_response_text,
-                    }
+                # 将本轮问答添加到历史记录
+                CHAT_SESSIONS.append_exchange(
+                    session_key, session, user_message_for_history, ollama_response_text, model
                 )
 
                 return (
@@ -657,6 +881,7 @@ timeout: {timeout}
                     ollama_response_thinking,
                     meta,
                     history,
+                    [ollama_response_text],
                 )
             except Exception as e:
                 error_msg = f"Ollama请求失败: {str(e)}"
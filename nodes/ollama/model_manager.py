@@ -0,0 +1,248 @@
+"""
+Ollama 模型连接与预热管理
+连接验证结果按服务器缓存一段时间，生成节点不再每次执行都请求一次模型列表；
+连接节点可以用空请求预加载模型，并在后台按 keep_alive 到期前续期，批量任务中途不会遇到模型冷启动。
+所有节点共用同一个管理器，load-state 指标可通过 metrics() 查看
+"""
+
+import os
+import time
+import threading
+from dataclasses import dataclass, asdict
+from typing import Any
+
+from ollama import Client
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.environ.get(name, default))
+    except ValueError:
+        print(f"{name} 不是有效整数，使用默认值 {default}")
+        return default
+
+
+# 连接验证结果的有效期（秒）
+VALIDATION_TTL = _env_int("XNANTOOL_OLLAMA_VALIDATION_TTL", 300)
+# 后台保温：模型空闲超过该时间（秒）后暂停续期，交由服务器按 keep_alive 卸载；再次使用后恢复
+KEEP_WARM_IDLE = _env_int("XNANTOOL_OLLAMA_KEEP_WARM_IDLE", 1800)
+# 在 keep_alive 到期前多久续期（秒），不超过 keep_alive 的一半
+REFRESH_MARGIN = 30
+# 后台线程最长检查间隔（秒）
+MAX_REFRESH_WAIT = 60
+# 未设置 keep_alive 时使用 Ollama 的默认值（秒）
+DEFAULT_KEEP_ALIVE = 300
+
+
+def keep_alive_seconds(connectivity: dict[str, Any] | None) -> int:
+    """
+    从连接配置中取出 keep_alive（连接节点已换算为秒），负数统一为 -1（常驻内存）
+    """
+    value = DEFAULT_KEEP_ALIVE if not connectivity else connectivity.get("keep_alive", DEFAULT_KEEP_ALIVE)
+    value = int(value)
+    return -1 if value < 0 else value
+
+
+@dataclass
+class ModelState:
+    url: str
+    model: str
+    available: bool = False
+    validated_at: float = 0.0
+    loaded: bool = False
+    keep_alive: int = DEFAULT_KEEP_ALIVE
+    expires_at: float = 0.0
+    last_used: float = 0.0
+    keep_warm: bool = False
+    load_seconds: float = 0.0
+    preloads: int = 0
+    refreshes: int = 0
+    requests: int = 0
+    last_error: str = ""
+
+    def is_loaded(self, now: float) -> bool:
+        return self.loaded and (self.keep_alive < 0 or now < self.expires_at)
+
+    def mark_loaded(self, keep_alive: int, now: float) -> None:
+        self.keep_alive = keep_alive
+        self.loaded = keep_alive != 0
+        self.expires_at = now + keep_alive if keep_alive > 0 else 0.0
+
+    def next_refresh(self) -> float | None:
+        """返回下一次续期的时间点，不需要续期时返回None"""
+        if not (self.keep_warm and self.loaded and self.keep_alive > 0):
+            return None
+        return self.expires_at - min(REFRESH_MARGIN, self.keep_alive / 2)
+
+
+class OllamaModelManager:
+    """
+    按 (url, model) 记录验证结果和加载状态
+    同一服务器的所有模型共用一次模型列表请求；验证失败不缓存，下次执行会重新检查
+    """
+
+    def __init__(self, validation_ttl: int = VALIDATION_TTL, keep_warm_idle: int = KEEP_WARM_IDLE):
+        self.validation_ttl = validation_ttl
+        self.keep_warm_idle = keep_warm_idle
+        self._states: dict[tuple[str, str], ModelState] = {}
+        self._model_lists: dict[str, tuple[float, frozenset[str]]] = {}
+        self._lock = threading.RLock()
+        self._wakeup = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def _state(self, url: str, model: str) -> ModelState:
+        key = (url, model)
+        state = self._states.get(key)
+        if state is None:
+            state = self._states[key] = ModelState(url=url, model=model)
+        return state
+
+    def validate(self, url: str, model: str, timeout: int = 30, force: bool = False) -> bool:
+        """
+        验证服务器可连接且模型存在，结果在 validation_ttl 内复用
+
+        Args:
+            url: Ollama服务器URL
+            model: 模型名称
+            timeout: 超时时间（秒）
+            force: 忽略缓存重新请求模型列表
+
+        Returns:
+            bool: 连接是否有效
+        """
+        now = time.time()
+        with self._lock:
+            cached = self._model_lists.get(url)
+        if cached is None or force or now - cached[0] > self.validation_ttl:
+            try:
+                models = Client(host=url, timeout=timeout).list()
+                names = frozenset(m["model"] for m in models.get("models", []))
+            except Exception as e:
+                print(f"连接验证失败: {str(e)}")
+                with self._lock:
+                    self._model_lists.pop(url, None)
+                    state = self._state(url, model)
+                    state.available = False
+                    state.last_error = str(e)
+                return False
+            cached = (now, names)
+            with self._lock:
+                self._model_lists[url] = cached
+
+        available = model in cached[1]
+        with self._lock:
+            state = self._state(url, model)
+            state.available = available
+            state.validated_at = cached[0]
+            if not available:
+                state.last_error = "模型不存在"
+        return available
+
+    def preload(self, url: str, model: str, keep_alive: int, timeout: int = 300, keep_warm: bool = False) -> ModelState:
+        """
+        用空的生成请求把模型加载到服务器内存，模型已加载时只登记保温设置
+
+        Args:
+            keep_alive: 模型在内存中保留的秒数，-1表示常驻
+            keep_warm: 是否在后台于到期前续期
+        """
+        now = time.time()
+        with self._lock:
+            state = self._state(url, model)
+            state.keep_warm = keep_warm
+            state.last_used = now
+            already_loaded = state.is_loaded(now) and state.keep_alive == keep_alive
+        if not already_loaded and keep_alive != 0:
+            self._load(state, keep_alive, timeout, refresh=False)
+        if keep_warm:
+            self._ensure_thread()
+        return state
+
+    def touch(self, url: str, model: str, keep_alive: int) -> None:
+        """每次实际请求模型后调用：服务器已按 keep_alive 重新计时，同步本地状态"""
+        now = time.time()
+        with self._lock:
+            state = self._state(url, model)
+            state.requests += 1
+            state.last_used = now
+            state.mark_loaded(keep_alive, now)
+        self._wakeup.set()
+
+    def metrics(self, url: str | None = None, model: str | None = None) -> list[dict[str, Any]]:
+        """返回各模型的验证和加载状态"""
+        now = time.time()
+        with self._lock:
+            states = [
+                s for s in self._states.values()
+                if (url is None or s.url == url) and (model is None or s.model == model)
+            ]
+            result = []
+            for state in states:
+                item = asdict(state)
+                item["loaded"] = state.is_loaded(now)
+                item["expires_in"] = round(state.expires_at - now, 1) if state.keep_alive > 0 and item["loaded"] else None
+                result.append(item)
+            return result
+
+    def _load(self, state: ModelState, keep_alive: int, timeout: int, refresh: bool) -> bool:
+        started = time.time()
+        try:
+            response = Client(host=state.url, timeout=timeout).generate(
+                model=state.model, prompt="", keep_alive=keep_alive
+            )
+        except Exception as e:
+            print(f"Ollama模型 {state.model} {'续期' if refresh else '预加载'}失败: {str(e)}")
+            with self._lock:
+                state.loaded = False
+                state.last_error = str(e)
+            return False
+
+        now = time.time()
+        load_duration = getattr(response, "load_duration", None)
+        with self._lock:
+            state.mark_loaded(keep_alive, now)
+            state.available = True
+            state.last_error = ""
+            if refresh:
+                state.refreshes += 1
+            else:
+                state.preloads += 1
+                # 服务器返回纳秒；模型已在内存中时加载时间接近0
+                state.load_seconds = round(load_duration / 1e9 if load_duration else now - started, 3)
+                print(f"Ollama模型 {state.model} 已预加载，耗时 {state.load_seconds} 秒")
+        return True
+
+    def _ensure_thread(self) -> None:
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._refresh_loop, name="ollama-keep-warm", daemon=True)
+                self._thread.start()
+        self._wakeup.set()
+
+    def _refresh_loop(self) -> None:
+        while True:
+            self._wakeup.clear()
+            now = time.time()
+            due: list[ModelState] = []
+            wait = MAX_REFRESH_WAIT
+            with self._lock:
+                for state in self._states.values():
+                    refresh_at = state.next_refresh()
+                    if refresh_at is None:
+                        continue
+                    if now - state.last_used > self.keep_warm_idle:
+                        # 长时间未使用时暂停续期（保留保温设置），下次请求经 touch() 更新使用时间后自动恢复
+                        continue
+                    if refresh_at <= now:
+                        due.append(state)
+                    else:
+                        wait = min(wait, refresh_at - now)
+
+            for state in due:
+                self._load(state, state.keep_alive, MAX_REFRESH_WAIT, refresh=True)
+            if not due:
+                self._wakeup.wait(timeout=wait)
+
+
+# 所有Ollama节点共用的管理器
+OLLAMA_MODELS = OllamaModelManager()
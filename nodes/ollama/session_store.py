@@ -0,0 +1,217 @@
+"""
+Ollama 聊天会话存储
+生成和聊天节点共用同一个会话表：会话数量和空闲时间有上限，超出时按最久未使用淘汰；
+发送给服务器的历史按轮数和字符预算截取最近的对话，请求体和提示词评估时间不会随对话增长。
+设置 XNANTOOL_OLLAMA_SESSION_DB 后会话会持久化到 SQLite 文件，ComfyUI 重启后仍可继续对话
+"""
+
+import os
+import json
+import time
+import sqlite3
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.environ.get(name, default))
+    except ValueError:
+        print(f"{name} 不是有效整数，使用默认值 {default}")
+        return default
+
+
+# 内存中最多保留的会话数量
+MAX_SESSIONS = _env_int("XNANTOOL_OLLAMA_MAX_SESSIONS", 256)
+# 会话空闲多久后过期（秒），0表示永不过期
+SESSION_TTL = _env_int("XNANTOOL_OLLAMA_SESSION_TTL", 7 * 24 * 3600)
+# 每个会话最多保存的消息条数（不含系统提示词），超出的早期消息被丢弃
+MAX_STORED_MESSAGES = 200
+# 默认发送给服务器的历史轮数和字符预算，0表示不限制
+DEFAULT_HISTORY_TURNS = 20
+DEFAULT_HISTORY_CHARS = 0
+# 可选的持久化文件路径
+SESSION_DB_PATH = os.environ.get("XNANTOOL_OLLAMA_SESSION_DB", "")
+
+
+@dataclass
+class ChatSession:
+    messages: list[dict] = field(default_factory=list)
+    model: str = ""
+    updated_at: float = field(default_factory=time.time)
+
+    def set_system(self, system: str) -> None:
+        """替换或在开头插入系统提示词"""
+        if not system:
+            return
+        if self.messages and self.messages[0].get("role") == "system":
+            self.messages[0] = {"role": "system", "content": system}
+        else:
+            self.messages.insert(0, {"role": "system", "content": system})
+
+    def build_request(
+        self,
+        user_message: dict[str, Any],
+        images_b64: list[str] | None = None,
+        max_turns: int = DEFAULT_HISTORY_TURNS,
+        max_chars: int = DEFAULT_HISTORY_CHARS,
+    ) -> list[dict]:
+        """
+        构造发送给服务器的消息列表：系统提示词 + 窗口内的最近历史 + 当前用户消息
+
+        Args:
+            user_message: 当前用户消息（不带图像）
+            images_b64: 当前消息附带的图像
+            max_turns: 最多携带的历史轮数（一问一答为一轮），0表示不限制
+            max_chars: 历史消息内容的字符预算，0表示不限制
+
+        Returns:
+            list[dict]: 新的消息列表，历史消息对象与会话共享，不会被修改
+        """
+        head = self.messages[:1] if self.messages and self.messages[0].get("role") == "system" else []
+        history = self.messages[len(head):]
+
+        start = len(history)
+        turns = 0
+        chars = 0
+        while start > 0:
+            message = history[start - 1]
+            chars += len(message.get("content") or "")
+            if max_chars and chars > max_chars:
+                break
+            if message.get("role") == "user":
+                if max_turns and turns >= max_turns:
+                    break
+                turns += 1
+            start -= 1
+        # 窗口从用户消息开始，不以孤立的助手回复开头
+        while start < len(history) and history[start].get("role") != "user":
+            start += 1
+
+        current = dict(user_message, images=images_b64) if images_b64 is not None else user_message
+        return head + history[start:] + [current]
+
+
+class ChatSessionStore:
+    """
+    有界会话存储（LRU + TTL，可选SQLite持久化）
+    内存中淘汰的会话仍保留在持久化文件中，下次使用时重新加载；过期或重置的会话会同时从文件中删除
+    """
+
+    def __init__(
+        self,
+        max_sessions: int = MAX_SESSIONS,
+        ttl: int = SESSION_TTL,
+        db_path: str = SESSION_DB_PATH,
+    ):
+        self.max_sessions = max(1, max_sessions)
+        self.ttl = ttl
+        self._sessions: OrderedDict[str, ChatSession] = OrderedDict()
+        self._lock = threading.RLock()
+        self._db = self._open_db(db_path) if db_path else None
+
+    @staticmethod
+    def _open_db(path: str) -> sqlite3.Connection | None:
+        try:
+            directory = os.path.dirname(os.path.abspath(path))
+            os.makedirs(directory, exist_ok=True)
+            db = sqlite3.connect(path, check_same_thread=False, timeout=10)
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS sessions ("
+                "key TEXT PRIMARY KEY, model TEXT, updated_at REAL, messages TEXT)"
+            )
+            db.commit()
+            return db
+        except (OSError, sqlite3.Error) as e:
+            print(f"无法打开Ollama会话数据库 {path}，仅使用内存存储: {str(e)}")
+            return None
+
+    def _expired(self, session: ChatSession, now: float) -> bool:
+        return bool(self.ttl) and now - session.updated_at > self.ttl
+
+    def get(self, key: str, reset: bool = False) -> ChatSession:
+        """获取会话，不存在、已过期或要求重置时返回新的空会话"""
+        key = str(key)
+        now = time.time()
+        with self._lock:
+            self._purge_expired(now)
+            session = None if reset else self._sessions.get(key)
+            if session is None and not reset:
+                session = self._load(key, now)
+            if session is None:
+                session = ChatSession()
+                if reset:
+                    self._delete(key)
+            self._sessions[key] = session
+            self._sessions.move_to_end(key)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+            return session
+
+    def append_exchange(self, key: str, session: ChatSession, user_message: dict[str, Any], reply: str, model: str = "") -> None:
+        """对话成功后把一问一答写入会话（不保存图像），并裁剪过长的历史"""
+        with self._lock:
+            session.messages.append(user_message)
+            session.messages.append({"role": "assistant", "content": reply})
+            head = 1 if session.messages and session.messages[0].get("role") == "system" else 0
+            overflow = len(session.messages) - head - MAX_STORED_MESSAGES
+            if overflow > 0:
+                del session.messages[head:head + overflow]
+            session.model = model or session.model
+            session.updated_at = time.time()
+            self._save(str(key), session)
+
+    def clear(self) -> None:
+        """清空所有会话（包括持久化文件）"""
+        with self._lock:
+            self._sessions.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM sessions")
+                self._db.commit()
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def _purge_expired(self, now: float) -> None:
+        if not self.ttl:
+            return
+        for key in [k for k, s in self._sessions.items() if self._expired(s, now)]:
+            del self._sessions[key]
+        if self._db is not None:
+            self._db.execute("DELETE FROM sessions WHERE updated_at < ?", (now - self.ttl,))
+            self._db.commit()
+
+    def _load(self, key: str, now: float) -> ChatSession | None:
+        if self._db is None:
+            return None
+        row = self._db.execute(
+            "SELECT model, updated_at, messages FROM sessions WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        session = ChatSession(messages=json.loads(row[2]), model=row[0] or "", updated_at=row[1])
+        return None if self._expired(session, now) else session
+
+    def _save(self, key: str, session: ChatSession) -> None:
+        if self._db is None:
+            return
+        try:
+            self._db.execute(
+                "INSERT OR REPLACE INTO sessions (key, model, updated_at, messages) VALUES (?, ?, ?, ?)",
+                (key, session.model, session.updated_at, json.dumps(session.messages, ensure_ascii=False)),
+            )
+            self._db.commit()
+        except sqlite3.Error as e:
+            print(f"保存Ollama会话失败: {str(e)}")
+
+    def _delete(self, key: str) -> None:
+        if self._db is None:
+            return
+        self._db.execute("DELETE FROM sessions WHERE key = ?", (key,))
+        self._db.commit()
+
+
+# 生成和聊天节点共用的会话存储
+CHAT_SESSIONS = ChatSessionStore()
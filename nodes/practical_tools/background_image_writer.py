@@ -0,0 +1,124 @@
+"""
+后台图片写入器
+把PIL编码（PNG压缩、JPEG/WebP编码）和磁盘写入放到有界线程池中执行，
+节点在提交后即可返回；PIL编码器在压缩时会释放GIL，多个线程可以并行编码。
+文件先写入临时文件再原子替换，未完成的图片不会以正式文件名出现在目录中
+"""
+
+import os
+import atexit
+import threading
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image
+
+# 配置日志
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# 默认编码线程数上限
+DEFAULT_MAX_WORKERS = 4
+
+
+def write_image(array, path, save_format, save_kwargs, convert_rgb=False):
+    """
+    编码并写入一张图片（同步执行）
+
+    Args:
+        array: uint8 numpy数组 (H,W,C)
+        path: 目标文件路径
+        save_format: PIL格式名
+        save_kwargs: 传给 Image.save 的参数
+        convert_rgb: 是否先转换为RGB（JPEG不支持透明通道）
+    """
+    img = Image.fromarray(array)
+    if convert_rgb:
+        img = img.convert("RGB")
+    directory, filename = os.path.split(path)
+    tmp_path = os.path.join(directory, f".{filename}.partial")
+    try:
+        img.save(tmp_path, format=save_format, **save_kwargs)
+        os.replace(tmp_path, path)
+    except Exception:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+class BackgroundImageWriter:
+    """
+    有界后台写入队列
+    同时在途的图片数量受信号量限制，防止大批量保存时内存无限增长；
+    flush() 作为屏障等待所有已提交的写入完成
+    """
+
+    def __init__(self, max_workers=None, max_pending=None):
+        self.max_workers = max_workers or min(DEFAULT_MAX_WORKERS, os.cpu_count() or 1)
+        self.max_pending = max_pending or self.max_workers * 4
+        self._executor = None
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+        self._pending = {}
+        self._errors = []
+
+    def _get_executor(self):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="xnantool-image-writer")
+        return self._executor
+
+    def submit(self, array, path, save_format, save_kwargs, convert_rgb=False):
+        """提交一张图片，队列已满时阻塞直到有空位"""
+        self._slots.acquire()
+        with self._lock:
+            path = os.path.abspath(path)
+            self._pending[path] = self._pending.get(path, 0) + 1
+            executor = self._get_executor()
+        try:
+            return executor.submit(self._run, array, path, save_format, save_kwargs, convert_rgb)
+        except Exception:
+            self._done(path)
+            raise
+
+    def _run(self, array, path, save_format, save_kwargs, convert_rgb):
+        try:
+            write_image(array, path, save_format, save_kwargs, convert_rgb)
+        except Exception as e:
+            logger.error(f"后台保存图片失败 {path}: {str(e)}")
+            with self._lock:
+                self._errors.append(f"{os.path.basename(path)}: {str(e)}")
+        finally:
+            self._done(path)
+
+    def _done(self, path):
+        with self._lock:
+            count = self._pending.get(path, 0) - 1
+            if count > 0:
+                self._pending[path] = count
+            else:
+                self._pending.pop(path, None)
+            if not self._pending:
+                self._idle.notify_all()
+        self._slots.release()
+
+    def flush(self, timeout=None):
+        """
+        等待所有已提交的写入完成
+
+        Returns:
+            list[str]: 自上次flush以来的写入错误
+        """
+        with self._lock:
+            self._idle.wait_for(lambda: not self._pending, timeout=timeout)
+            errors, self._errors = self._errors, []
+        return errors
+
+
+# 全局共享实例
+background_image_writer = BackgroundImageWriter()
+
+# 进程退出前确保图片全部落盘
+atexit.register(background_image_writer.flush)
@@ -1,5 +1,7 @@
 import os
 
+from ..common.directory_index import directory_index
+
 class ListFilesNode:
     """
     列出文件节点 - 读取输入文件夹并输出该文件夹下的所有文件名称列表
@@ -38,6 +40,14 @@ class ListFilesNode:
     FUNCTION = "list_files"
     CATEGORY = "XnanTool/实用工具"
 
+    @classmethod
+    def IS_CHANGED(cls, input_directory, recursive, separator, file_extensions):
+        # 文件夹内容（文件名）变化时重新执行
+        try:
+            return directory_index.fingerprint(input_directory, recursive == "true", file_extensions)
+        except Exception:
+            return float("NaN")
+
     def list_files(self, input_directory, recursive, separator, file_extensions):
         """
         列出文件夹中的所有文件
@@ -64,37 +74,8 @@ class ListFilesNode:
                 error_msg = f"输入路径不是文件夹: {input_directory}"
                 return (error_msg, "0")
             
-            # 解析文件扩展名过滤器
-            extensions_filter = []
-            if file_extensions and file_extensions.strip():
-                extensions_filter = [ext.strip().lower() for ext in file_extensions.split(',')]
-            
-            # 获取文件列表
-            if recursive == "true":
-                # 递归搜索所有子文件夹
-                for root, dirs, files in os.walk(input_directory):
-                    for filename in files:
-                        # 检查扩展名过滤
-                        if extensions_filter:
-                            _, ext = os.path.splitext(filename.lower())
-                            if ext.lstrip('.') not in extensions_filter:
-                                continue
-                        
-                        # 计算相对路径
-                        relative_path = os.path.relpath(os.path.join(root, filename), input_directory)
-                        file_names.append(relative_path)
-            else:
-                # 只搜索当前目录
-                for item in os.listdir(input_directory):
-                    item_path = os.path.join(input_directory, item)
-                    if os.path.isfile(item_path):
-                        # 检查扩展名过滤
-                        if extensions_filter:
-                            _, ext = os.path.splitext(item.lower())
-                            if ext.lstrip('.') not in extensions_filter:
-                                continue
-                        
-                        file_names.append(item)
+            # 获取文件列表（递归时为相对路径；目录未变化时直接使用缓存的列表）
+            file_names = list(directory_index.list_files(input_directory, recursive == "true", file_extensions))
             
             # 构造文件列表字符串
             if file_names:
@@ -3,6 +3,14 @@ import folder_paths
 from PIL import Image
 import numpy as np
 import torch
+import logging
+
+from .background_image_writer import background_image_writer, write_image
+from ..common.output_naming import output_naming
+
+# 配置日志
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
 
 class SaveImageNode:
     """
@@ -24,6 +32,9 @@ class SaveImageNode:
                 "extension": (["png", "jpg", "jpeg", "gif", "webp", "bmp"],),
                 "quality": ("INT", {"default": 100, "min": 1, "max": 100, "step": 1}),
             },
+            "optional": {
+                "async_write": ("BOOLEAN", {"default": False, "label": "后台写入", "description": "在后台线程池中编码并写入图片，节点不等待磁盘写入完成"}),
+            },
             "hidden": {
                 "prompt": "PROMPT", 
                 "extra_pnginfo": "EXTRA_PNGINFO",
@@ -37,102 +48,109 @@ class SaveImageNode:
     FUNCTION = "save_images"
     CATEGORY = "XnanTool/实用工具"
 
-    def save_images(self, images, file_path, filename_prefix="ComfyUI", folder_separator="_", num_padding_digits=3, extension="png", quality=100, prompt=None, extra_pnginfo=None, save_workflow=False):
+    def save_images(self, images, file_path, filename_prefix="ComfyUI", folder_separator="_", num_padding_digits=3, extension="png", quality=100, prompt=None, extra_pnginfo=None, save_workflow=False, async_write=False):
         """
         保存图片到指定路径
+        
+        async_write为True时，编码和写盘在后台线程池中进行，节点提交后立即返回；
+        文件名在提交前由命名服务预留，不会与尚未写完的文件冲突
         """
         # 确保输出目录存在
         full_output_dir = os.path.join(self.output_dir, file_path)
         if not os.path.exists(full_output_dir):
             os.makedirs(full_output_dir, exist_ok=True)
         
+        # 生成文件名
+        if not (filename_prefix and filename_prefix.strip()):  # 如果文件名前缀为空或只包含空白字符，使用默认前缀
+            filename_prefix = "ComfyUI"
+        if len(images) > 1:
+            filenames = [f"{filename_prefix}{folder_separator}{idx:0{num_padding_digits}d}.{extension}" for idx in range(len(images))]
+        else:
+            filenames = [f"{filename_prefix}.{extension}"]
+        
+        # 处理文件存在的情况 - 默认追加数值（由命名服务预留整批文件名，不逐个探测磁盘）
+        filenames = [
+            os.path.basename(output_naming.reserve_path(full_output_dir, *os.path.splitext(filename), "_", num_padding_digits))
+            for filename in filenames
+        ]
+        
+        save_format, save_kwargs, convert_rgb = self._get_save_options(extension, quality, save_workflow, prompt, extra_pnginfo)
+        
         results = []
-        for idx, image in enumerate(images):
+        for image, filename in zip(images, filenames):
             # 转换图像格式
             i = 255. * image.cpu().numpy()
-            img = Image.fromarray(np.clip(i, 0, 255).astype(np.uint8))
-            
-            # 生成文件名
-            if filename_prefix and filename_prefix.strip():  # 检查文件名前缀是否为空或只包含空白字符
-                if len(images) > 1:
-                    filename = f"{filename_prefix}{folder_separator}{idx:0{num_padding_digits}d}.{extension}"
-                else:
-                    filename = f"{filename_prefix}.{extension}"
-            else:  # 如果文件名前缀为空或只包含空白字符，使用默认前缀
-                if len(images) > 1:
-                    filename = f"ComfyUI{folder_separator}{idx:0{num_padding_digits}d}.{extension}"
-                else:
-                    filename = f"ComfyUI.{extension}"
-            
-            # 处理文件存在的情况 - 默认追加数值
+            array = np.clip(i, 0, 255).astype(np.uint8)
             file_path_full = os.path.join(full_output_dir, filename)
-            original_file_path_full = file_path_full
-            counter = 1
-            name, ext = os.path.splitext(filename)
-            while os.path.exists(file_path_full):
-                new_filename = f"{name}_{counter:0{num_padding_digits}d}{ext}"
-                file_path_full = os.path.join(full_output_dir, new_filename)
-                counter += 1
             
             # 保存图片
             try:
-                if extension.lower() in ["jpg", "jpeg"]:
-                    img = img.convert("RGB")  # JPEG不支持透明通道
-                    if save_workflow:
-                        # 保留工作流信息
-                        exif_data = self._get_workflow_exif_data(prompt, extra_pnginfo)
-                        if exif_data:
-                            img.save(file_path_full, format=extension.upper(), quality=quality, exif=exif_data)
-                        else:
-                            img.save(file_path_full, format=extension.upper(), quality=quality)
-                    else:
-                        # 不保留工作流信息
-                        img.save(file_path_full, format=extension.upper(), quality=quality)
-                elif extension.lower() == "webp":
-                    if save_workflow:
-                        # 保留工作流信息
-                        exif_data = self._get_workflow_exif_data(prompt, extra_pnginfo)
-                        if exif_data:
-                            img.save(file_path_full, format=extension.upper(), quality=quality, exif=exif_data)
-                        else:
-                            img.save(file_path_full, format=extension.upper(), quality=quality)
-                    else:
-                        # 不保留工作流信息
-                        img.save(file_path_full, format=extension.upper(), quality=quality)
-                elif extension.lower() == "png":
-                    if save_workflow:
-                        # 保留工作流信息
-                        pnginfo_data = self._get_workflow_exif_data(prompt, extra_pnginfo)
-                        if pnginfo_data:
-                            img.save(file_path_full, format=extension.upper(), pnginfo=pnginfo_data)
-                        else:
-                            img.save(file_path_full, format=extension.upper())
-                    else:
-                        # 不保留工作流信息
-                        img.save(file_path_full, format=extension.upper())
+                if async_write:
+                    background_image_writer.submit(array, file_path_full, save_format, save_kwargs, convert_rgb)
                 else:
-                    if save_workflow:
-                        # 保留工作流信息
-                        pnginfo_data = self._get_workflow_exif_data(prompt, extra_pnginfo)
-                        if pnginfo_data:
-                            img.save(file_path_full, format=extension.upper(), pnginfo=pnginfo_data)
-                        else:
-                            img.save(file_path_full, format=extension.upper())
-                    else:
-                        # 不保留工作流信息
-                        img.save(file_path_full, format=extension.upper())
+                    write_image(array, file_path_full, save_format, save_kwargs, convert_rgb)
                 
                 results.append({
-                    "filename": os.path.basename(file_path_full),
+                    "filename": filename,
                     "subfolder": file_path,
                     "type": self.type
                 })
                     
             except Exception as e:
                 return {"ui": {"status": f"保存失败: {str(e)}"}, "result": (f"保存失败: {str(e)}",)}
-
+        
+        if async_write:
+            return {"ui": {"status": f"已提交 {len(images)} 张图片到后台保存"}, "result": (images, f"已提交 {len(images)} 张图片到后台保存: {full_output_dir}")}
+        
+        # 同步模式下同时等待之前提交的后台写入完成
+        errors = background_image_writer.flush()
+        if errors:
+            logger.warning(f"之前的后台保存有 {len(errors)} 张图片失败:\n" + "\n".join(errors))
+        
         return {"ui": {"status": f"成功保存 {len(images)} 张图片"}, "result": (images, f"成功保存 {len(images)} 张图片到 {full_output_dir}")}
 
+    @classmethod
+    def _get_save_options(cls, extension, quality, save_workflow, prompt, extra_pnginfo):
+        """
+        根据扩展名生成 (PIL格式名, 保存参数, 是否转换为RGB)
+        """
+        extension = extension.lower()
+        if extension in ["jpg", "jpeg"]:
+            save_format, save_kwargs, convert_rgb = "JPEG", {"quality": quality}, True  # JPEG不支持透明通道
+        elif extension == "webp":
+            save_format, save_kwargs, convert_rgb = "WEBP", {"quality": quality}, False
+        else:
+            save_format, save_kwargs, convert_rgb = extension.upper(), {}, False
+        
+        if save_workflow:
+            # 保留工作流信息
+            if extension in ["jpg", "jpeg", "webp"]:
+                exif_data = cls._get_workflow_exif_bytes(prompt, extra_pnginfo)
+                if exif_data:
+                    save_kwargs["exif"] = exif_data
+            elif extension == "png":
+                save_kwargs["pnginfo"] = cls._get_workflow_exif_data(prompt, extra_pnginfo)
+        return save_format, save_kwargs, convert_rgb
+
+    @staticmethod
+    def _get_workflow_exif_bytes(prompt, extra_pnginfo):
+        """
+        生成JPEG/WebP可用的EXIF工作流数据（写入Make/Model标签，与ComfyUI保存WebP的方式一致）
+        """
+        import json
+        
+        if not prompt and not extra_pnginfo:
+            return None
+        exif = Image.Exif()
+        if prompt:
+            exif[0x0110] = "prompt:{}".format(json.dumps(prompt))
+        if extra_pnginfo:
+            tag = 0x010F
+            for x in extra_pnginfo:
+                exif[tag] = "{}:{}".format(x, json.dumps(extra_pnginfo[x]))
+                tag -= 1
+        return exif.tobytes()
+
     @staticmethod
     def _get_workflow_exif_data(prompt, extra_pnginfo):
         """
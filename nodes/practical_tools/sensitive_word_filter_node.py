@@ -2,6 +2,8 @@ import os
 import re
 import json
 
+from .sensitive_word_matcher import NUMERIC_GROUP_REF, get_word_matcher, get_regex_matcher
+
 
 class SensitiveWordFilterNode:
     """
@@ -93,75 +95,44 @@ class SensitiveWordFilterNode:
         if regex_patterns and regex_patterns.strip():
             custom_regex = [line.strip() for line in regex_patterns.strip().split('\n') if line.strip()]
         
-        # 初始化统计
-        found_words = []
-        filtered_text = input_text
-        count = 0
-        
-        # 根据匹配模式处理
-        if match_mode == "精确匹配":
-            for word in sensitive_words:
-                if not case_sensitive:
-                    pattern = re.compile(re.escape(word), re.IGNORECASE)
-                else:
-                    pattern = re.compile(re.escape(word))
-                
-                matches = pattern.findall(filtered_text)
-                if matches:
-                    count += len(matches)
-                    found_words.extend(matches)
-                    
-                    if filter_mode == "替换为星号":
-                        replacement = '*' * len(word)
-                        filtered_text = pattern.sub(replacement, filtered_text)
-                    elif filter_mode == "替换为指定文本":
-                        filtered_text = pattern.sub(replacement_text, filtered_text)
-                    elif filter_mode == "删除违禁词":
-                        filtered_text = pattern.sub('', filtered_text)
-        
-        elif match_mode == "模糊匹配":
-            for word in sensitive_words:
-                if not case_sensitive:
-                    pattern = re.compile(re.escape(word), re.IGNORECASE)
-                else:
-                    pattern = re.compile(re.escape(word))
-                
-                matches = pattern.findall(filtered_text)
-                if matches:
-                    count += len(matches)
-                    found_words.extend(matches)
-                    
-                    if filter_mode == "替换为星号":
-                        replacement = '*' * len(word)
-                        filtered_text = pattern.sub(replacement, filtered_text)
-                    elif filter_mode == "替换为指定文本":
-                        filtered_text = pattern.sub(replacement_text, filtered_text)
-                    elif filter_mode == "删除违禁词":
-                        filtered_text = pattern.sub('', filtered_text)
-        
+        case_sensitive = case_sensitive == "是"
+
+        # 替换函数：仅标记时为None；正则匹配时参数为匹配对象，其余为匹配到的原文
+        if filter_mode == "替换为星号":
+            # 正则匹配的长度不固定，统一替换为三个星号
+            replace = (lambda matched: '***') if match_mode == "正则匹配" else (lambda matched: '*' * len(matched))
+        elif filter_mode == "替换为指定文本":
+            if match_mode == "正则匹配":
+                # 与 re.sub 一致，替换文本中的 \1、\g<name> 等分组引用会被展开
+                replace = lambda match: match.expand(replacement_text)
+            else:
+                replace = lambda matched: replacement_text
+        elif filter_mode == "删除违禁词":
+            replace = lambda matched: ''
+        else:
+            replace = None
+
+        # 根据匹配模式处理：词表编译为自动机（精确匹配要求英文单词边界），一次扫描完成查找和替换
+        if match_mode in ("精确匹配", "模糊匹配"):
+            matcher = get_word_matcher(sensitive_words, case_sensitive, whole_word=match_mode == "精确匹配")
         elif match_mode == "正则匹配":
-            all_patterns = custom_regex
-            if not all_patterns:
+            if not custom_regex:
                 return (input_text, "未提供正则表达式", 0)
-            
-            for pattern_str in all_patterns:
-                try:
-                    flags = 0 if case_sensitive else re.IGNORECASE
-                    pattern = re.compile(pattern_str, flags)
-                    
-                    matches = pattern.findall(filtered_text)
-                    if matches:
-                        count += len(matches)
-                        found_words.extend(matches)
-                        
-                        if filter_mode == "替换为星号":
-                            filtered_text = pattern.sub('***', filtered_text)
-                        elif filter_mode == "替换为指定文本":
-                            filtered_text = pattern.sub(replacement_text, filtered_text)
-                        elif filter_mode == "删除违禁词":
-                            filtered_text = pattern.sub('', filtered_text)
-                except re.error as e:
-                    return (input_text, f"正则表达式错误: {str(e)}", 0)
+            # 替换文本引用数字分组时逐条匹配，组号与各自的正则一致
+            separate = filter_mode == "替换为指定文本" and bool(NUMERIC_GROUP_REF.search(replacement_text))
+            try:
+                matcher = get_regex_matcher(custom_regex, case_sensitive, separate)
+            except re.error as e:
+                return (input_text, f"正则表达式错误: {str(e)}", 0)
+        else:
+            return (input_text, "未发现违禁内容", 0)
+
+        try:
+            filtered_text, found_words = matcher.replace(input_text, replace)
+        except re.error as e:
+            # 替换文本引用了不存在的分组
+            return (input_text, f"正则表达式错误: {str(e)}", 0)
+        count = len(found_words)
         
         # 生成过滤报告
         if count > 0:
@@ -0,0 +1,241 @@
+"""
+违禁词匹配引擎
+词表编译为 Aho–Corasick 自动机，一次线性扫描即可找出所有违禁词并完成替换，耗时与词表大小无关；
+自定义正则合并为一个分支表达式，同样只扫描一次文本（替换内容引用了数字分组时逐条匹配）。
+编译结果按词表内容哈希缓存，词表不变时重复执行无需重新构建
+"""
+
+import re
+import hashlib
+import threading
+from collections import OrderedDict, deque
+
+# 最多缓存的自动机/正则数量
+MAX_CACHED_MATCHERS = 8
+
+# 含数字反向引用的正则（或替换内容）在合并后组号会变化，需单独匹配
+NUMERIC_GROUP_REF = re.compile(r"\\(?:[1-9]|g<\d+>)")
+
+
+def _is_ascii_word_char(ch):
+    return ch.isascii() and (ch.isalnum() or ch == "_")
+
+
+def _fold_text(text):
+    """逐字符转小写，保证折叠后的文本与原文长度一致、位置一一对应"""
+    lowered = text.lower()
+    if len(lowered) == len(text):
+        return lowered
+    # 个别字符（如 'İ'）小写后变为多个字符，这些字符保持原样
+    return "".join(c if len(c.lower()) != 1 else c.lower() for c in text)
+
+
+class WordMatcher:
+    """
+    Aho–Corasick 自动机
+    匹配规则为"最左最长、互不重叠"，与逐词替换不同，已替换的内容不会被其他违禁词再次匹配
+    """
+
+    def __init__(self, words, case_sensitive=True, whole_word=False):
+        self.case_sensitive = case_sensitive
+        self.whole_word = whole_word
+        # goto[node]: 字符 -> 子节点；fail[node]: 失败指针
+        # length[node]: 在此结束的违禁词长度（0表示不是词尾）；output[node]: 失败链上最近的词尾节点
+        self._goto = [{}]
+        self._fail = [0]
+        self._length = [0]
+        self._output = [0]
+        self.word_count = 0
+
+        for word in words:
+            if not word:
+                continue
+            if not case_sensitive:
+                word = _fold_text(word)
+            node = 0
+            for ch in word:
+                child = self._goto[node].get(ch)
+                if child is None:
+                    child = len(self._goto)
+                    self._goto[node][ch] = child
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._length.append(0)
+                    self._output.append(0)
+                node = child
+            if not self._length[node]:
+                self.word_count += 1
+            self._length[node] = len(word)
+
+        self._build_links()
+
+    def _build_links(self):
+        goto, fail, length, output = self._goto, self._fail, self._length, self._output
+        queue = deque(goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, child in goto[node].items():
+                state = fail[node]
+                while state and ch not in goto[state]:
+                    state = fail[state]
+                target = goto[state].get(ch, 0)
+                fail[child] = target if target != child else 0
+                output[child] = fail[child] if length[fail[child]] else output[fail[child]]
+                queue.append(child)
+
+    def _longest_from(self, text):
+        """扫描一次文本，返回每个起始位置上最长匹配的结束位置"""
+        goto, fail, length, output = self._goto, self._fail, self._length, self._output
+        scan = text if self.case_sensitive else _fold_text(text)
+        text_len = len(text)
+        best_end = {}
+        state = 0
+        for i, ch in enumerate(scan):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+
+            node = state if length[state] else output[state]
+            end = i + 1
+            while node:
+                start = end - length[node]
+                if not self.whole_word or self._at_boundary(text, start, end, text_len):
+                    if best_end.get(start, 0) < end:
+                        best_end[start] = end
+                node = output[node]
+        return best_end
+
+    @staticmethod
+    def _at_boundary(text, start, end, text_len):
+        # 只对英文单词判断边界，中文等没有词间分隔的文字按子串匹配
+        if start > 0 and _is_ascii_word_char(text[start]) and _is_ascii_word_char(text[start - 1]):
+            return False
+        if end < text_len and _is_ascii_word_char(text[end - 1]) and _is_ascii_word_char(text[end]):
+            return False
+        return True
+
+    def replace(self, text, repl=None):
+        """
+        查找并替换违禁词
+
+        Args:
+            text: 输入文本
+            repl: 替换函数，参数为匹配到的原文，返回替换内容；为None时只查找不修改
+
+        Returns:
+            tuple: (处理后的文本, 匹配到的原文列表)
+        """
+        if not self.word_count or not text:
+            return text, []
+
+        best_end = self._longest_from(text)
+        found = []
+        parts = []
+        last = 0
+        for start in sorted(best_end):
+            if start < last:
+                continue
+            end = best_end[start]
+            matched = text[start:end]
+            found.append(matched)
+            if repl is not None:
+                parts.append(text[last:start])
+                parts.append(repl(matched))
+            last = end
+
+        if repl is None:
+            return text, found
+        parts.append(text[last:])
+        return "".join(parts), found
+
+
+class RegexMatcher:
+    """把多条正则合并为一个分支表达式，一次扫描完成匹配和替换"""
+
+    def __init__(self, patterns, case_sensitive=True, separate=False):
+        flags = 0 if case_sensitive else re.IGNORECASE
+        # 逐条编译以便给出出错的表达式
+        for pattern in patterns:
+            try:
+                re.compile(pattern, flags)
+            except re.error as e:
+                raise re.error(f"{pattern}: {e.msg}") from e
+
+        if separate:
+            combinable, separate = [], patterns
+        else:
+            combinable = [p for p in patterns if not NUMERIC_GROUP_REF.search(p)]
+            separate = [p for p in patterns if NUMERIC_GROUP_REF.search(p)]
+        self._compiled = []
+        if combinable:
+            try:
+                self._compiled.append(re.compile("|".join(f"(?:{p})" for p in combinable), flags))
+            except re.error:
+                # 含行内全局标志等无法合并的写法时退回逐条匹配
+                separate = patterns
+                self._compiled = []
+        self._compiled.extend(re.compile(p, flags) for p in separate)
+
+    def replace(self, text, repl=None):
+        """
+        查找并替换匹配内容，返回值同 WordMatcher.replace
+
+        Args:
+            text: 输入文本
+            repl: 替换函数，参数为匹配对象（可用 match.expand 展开分组引用），返回替换内容；为None时只查找不修改
+        """
+        found = []
+
+        def _sub(match):
+            found.append(match.group(0))
+            return repl(match)
+
+        for compiled in self._compiled:
+            if repl is None:
+                found.extend(m.group(0) for m in compiled.finditer(text))
+            else:
+                text = compiled.sub(_sub, text)
+        return text, found
+
+
+_cache = OrderedDict()
+_lock = threading.Lock()
+
+
+def _get_cached(kind, items, case_sensitive, whole_word, factory):
+    hasher = hashlib.blake2b(digest_size=16)
+    hasher.update(f"{kind}:{case_sensitive}:{whole_word}".encode("ascii"))
+    for item in items:
+        hasher.update(item.encode("utf-8", "surrogatepass"))
+        hasher.update(b"\0")
+    key = hasher.digest()
+
+    with _lock:
+        matcher = _cache.get(key)
+        if matcher is not None:
+            _cache.move_to_end(key)
+            return matcher
+
+    matcher = factory()
+    with _lock:
+        _cache[key] = matcher
+        while len(_cache) > MAX_CACHED_MATCHERS:
+            _cache.popitem(last=False)
+    return matcher
+
+
+def get_word_matcher(words, case_sensitive=True, whole_word=False):
+    """获取词表对应的自动机（按词表内容缓存）"""
+    words = list(words)
+    return _get_cached("words", words, case_sensitive, whole_word,
+                       lambda: WordMatcher(words, case_sensitive, whole_word))
+
+
+def get_regex_matcher(patterns, case_sensitive=True, separate=False):
+    """
+    获取正则列表对应的合并表达式（按内容缓存），表达式无效时抛出 re.error
+    separate为True时不合并，每条正则保持自己的分组编号
+    """
+    patterns = list(patterns)
+    return _get_cached("regex-separate" if separate else "regex", patterns, case_sensitive, False,
+                       lambda: RegexMatcher(patterns, case_sensitive, separate))
@@ -0,0 +1,89 @@
+"""
+设备检测工具
+CUDA可用性探测在每个进程内只执行一次并缓存结果，
+模型已在目标设备上时跳过 .to() 调用
+"""
+
+import threading
+import logging
+
+import torch
+
+# 配置日志
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+_probe_lock = threading.Lock()
+_probed_device = None
+
+
+def _probe_device():
+    """执行一次真实的CUDA可用性测试（矩阵乘法和NMS）"""
+    try:
+        # 首先检查CUDA是否可用且能正常工作
+        if torch.cuda.is_available():
+            # 测试CUDA是否能正常工作
+            try:
+                test_tensor = torch.randn(10, 10).cuda()
+                torch.mm(test_tensor, test_tensor)
+                # 测试NMS操作
+                from torchvision.ops import nms
+                boxes = torch.tensor([[0, 0, 10, 10], [5, 5, 15, 15]], dtype=torch.float).cuda()
+                scores = torch.tensor([0.9, 0.8], dtype=torch.float).cuda()
+                nms(boxes, scores, 0.5)
+                return torch.device('cuda')
+            except Exception as cuda_test_error:
+                logger.warning(f"CUDA测试失败，回退到CPU: {str(cuda_test_error)}")
+                return torch.device('cpu')
+        return torch.device('cpu')
+    except Exception as e:
+        logger.warning(f"设备检测出错，使用CPU: {str(e)}")
+        return torch.device('cpu')
+
+
+def get_optimal_device():
+    """获取最优设备，进程内只探测一次"""
+    global _probed_device
+    if _probed_device is None:
+        with _probe_lock:
+            if _probed_device is None:
+                _probed_device = _probe_device()
+                logger.info(f"设备探测完成: {_probed_device}")
+    return _probed_device
+
+
+def reset_device_probe():
+    """清除缓存的探测结果，下次调用时重新探测（例如驱动或显卡状态变化后）"""
+    global _probed_device
+    with _probe_lock:
+        _probed_device = None
+
+
+def get_model_device(model):
+    """获取模型当前所在设备，无法确定时返回None"""
+    try:
+        device = getattr(model, "device", None)
+        if isinstance(device, torch.device):
+            return device
+        return next(model.parameters()).device
+    except Exception:
+        return None
+
+
+def _same_device(a, b):
+    a, b = torch.device(a), torch.device(b)
+    if a.type != b.type:
+        return False
+    # cuda 与 cuda:0 视为同一设备
+    if a.type == 'cuda':
+        return (a.index or 0) == (b.index or 0)
+    return True
+
+
+def move_model_to_device(model, device):
+    """仅当模型不在目标设备上时才移动模型"""
+    current = get_model_device(model)
+    if current is not None and _same_device(current, device):
+        return model
+    model.to(device)
+    return model
@@ -0,0 +1,194 @@
+import os
+import threading
+import weakref
+import logging
+from collections import OrderedDict
+
+import torch
+
+# 配置日志
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# 默认内存预算（MB），可通过环境变量 XNANTOOL_MODEL_CACHE_MB 覆盖
+DEFAULT_MODEL_CACHE_BUDGET_MB = 8192
+
+
+def _default_budget_bytes():
+    """读取模型缓存内存预算"""
+    try:
+        budget_mb = float(os.environ.get("XNANTOOL_MODEL_CACHE_MB", DEFAULT_MODEL_CACHE_BUDGET_MB))
+    except ValueError:
+        logger.warning("XNANTOOL_MODEL_CACHE_MB 不是有效数字，使用默认预算")
+        budget_mb = DEFAULT_MODEL_CACHE_BUDGET_MB
+    return int(budget_mb * 1024 * 1024)
+
+
+def estimate_model_bytes(model, weights_path=None):
+    """估算模型占用的内存：优先统计参数和缓冲区，失败时退回权重文件大小"""
+    try:
+        module = model if isinstance(model, torch.nn.Module) else getattr(model, "model", None)
+        if isinstance(module, torch.nn.Module):
+            total = sum(p.numel() * p.element_size() for p in module.parameters())
+            total += sum(b.numel() * b.element_size() for b in module.buffers())
+            if total > 0:
+                return total
+    except Exception:
+        pass
+    if weights_path and os.path.exists(weights_path):
+        return os.path.getsize(weights_path)
+    return 0
+
+
+class _RegistryEntry:
+    """注册表中的单个模型条目"""
+    __slots__ = ("model", "size_bytes", "ref_count")
+
+    def __init__(self, model, size_bytes):
+        self.model = model
+        self.size_bytes = size_bytes
+        self.ref_count = 0
+
+
+class SharedModelRegistry:
+    """
+    进程级共享模型注册表
+    按 (模型类别, 权重绝对路径, 设备) 缓存模型，所有加载器节点共用同一份权重；
+    通过引用计数标记正在使用的模型，超出内存预算时按LRU顺序淘汰未被引用的模型
+    """
+
+    def __init__(self, budget_bytes=None):
+        self._entries = OrderedDict()
+        self._owners = {}
+        self._lock = threading.RLock()
+        self.budget_bytes = budget_bytes if budget_bytes is not None else _default_budget_bytes()
+
+    @staticmethod
+    def make_key(kind, weights_path, device):
+        """生成缓存键"""
+        return (kind, os.path.abspath(weights_path), str(device))
+
+    def acquire(self, key, load_fn, owner=None, force_reload=False):
+        """
+        获取模型，不存在时调用load_fn加载
+
+        Args:
+            key: make_key生成的缓存键
+            load_fn: 无参加载函数，返回模型对象
+            owner: 持有该模型的对象（通常是加载器节点实例），
+                   同一owner再次获取其他模型时会自动释放之前持有的模型
+            force_reload: 是否丢弃已缓存的模型重新加载
+
+        Returns:
+            (model, from_cache)
+        """
+        with self._lock:
+            if force_reload:
+                self.invalidate(key)
+
+            entry = self._entries.get(key)
+            from_cache = entry is not None
+            if entry is None:
+                model = load_fn()
+                entry = _RegistryEntry(model, estimate_model_bytes(model, key[1]))
+                self._entries[key] = entry
+                logger.info(f"模型已加入共享注册表: {key[1]} ({key[2]})，约 {entry.size_bytes / 1024 / 1024:.1f} MB")
+
+            self._entries.move_to_end(key)
+            if owner is not None:
+                self._bind_owner(owner, key)
+            self._evict_if_needed(protect=key)
+            return entry.model, from_cache
+
+    def release(self, key):
+        """释放一次对模型的引用"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.ref_count > 0:
+                entry.ref_count -= 1
+            self._evict_if_needed()
+
+    def invalidate(self, key):
+        """从注册表中移除模型（无论是否仍被引用）"""
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                for owner_id, (owned_key, _) in list(self._owners.items()):
+                    if owned_key == key:
+                        self._owners.pop(owner_id)[1].detach()
+                self._free(key, entry)
+
+    def set_budget(self, budget_bytes):
+        """调整内存预算并立即执行淘汰"""
+        with self._lock:
+            self.budget_bytes = int(budget_bytes)
+            self._evict_if_needed()
+
+    def stats(self):
+        """返回注册表当前状态"""
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "total_bytes": self._total_bytes(),
+                "budget_bytes": self.budget_bytes,
+                "models": [
+                    {"kind": k[0], "path": k[1], "device": k[2],
+                     "size_bytes": e.size_bytes, "ref_count": e.ref_count}
+                    for k, e in self._entries.items()
+                ],
+            }
+
+    def _bind_owner(self, owner, key):
+        owner_id = id(owner)
+        previous = self._owners.get(owner_id)
+        if previous is not None and previous[0] == key:
+            return
+        # 先增加新模型的引用，再释放旧模型，避免新模型在释放过程中被淘汰
+        self._entries[key].ref_count += 1
+        if previous is not None:
+            previous[1].detach()
+            self.release(previous[0])
+        # owner被回收时自动释放引用
+        finalizer = weakref.finalize(owner, self._release_owner, owner_id, key)
+        self._owners[owner_id] = (key, finalizer)
+
+    def _release_owner(self, owner_id, key):
+        with self._lock:
+            current = self._owners.get(owner_id)
+            if current is not None and current[0] == key:
+                del self._owners[owner_id]
+                self.release(key)
+
+    def _total_bytes(self):
+        return sum(e.size_bytes for e in self._entries.values())
+
+    def _evict_if_needed(self, protect=None):
+        total = self._total_bytes()
+        if total <= self.budget_bytes:
+            return
+        # OrderedDict头部为最久未使用的条目
+        for key in list(self._entries.keys()):
+            if total <= self.budget_bytes:
+                break
+            entry = self._entries[key]
+            if key == protect or entry.ref_count > 0:
+                continue
+            del self._entries[key]
+            total -= entry.size_bytes
+            logger.info(f"超出模型缓存预算，淘汰模型: {key[1]} ({key[2]})")
+            self._free(key, entry)
+        if total > self.budget_bytes:
+            logger.warning(
+                f"模型缓存占用 {total / 1024 / 1024:.1f} MB 超出预算 "
+                f"{self.budget_bytes / 1024 / 1024:.1f} MB，剩余模型均在使用中"
+            )
+
+    @staticmethod
+    def _free(key, entry):
+        entry.model = None
+        if "cuda" in key[2] and torch.cuda.is_available():
+            torch.cuda.empty_cache()
+
+
+# 全局共享实例
+model_registry = SharedModelRegistry()
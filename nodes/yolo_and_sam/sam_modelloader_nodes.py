@@ -8,6 +8,8 @@ import requests
 from io import BytesIO
 import tempfile
 
+from .model_registry import model_registry
+
 # 尝试导入SAM，如果不存在则提供安装提示
 try:
     from segment_anything import SamPredictor, SamAutomaticMaskGenerator, sam_model_registry
@@ -112,10 +114,33 @@ def download_sam_model(model_name, save_dir):
             os.remove(save_path)
         raise Exception(f"下载SAM模型失败: {str(e)}")
 
+# 当前环境下SAM模型应放置的设备
+def _sam_target_device():
+    return "cuda" if torch.cuda.is_available() else "cpu"
+
+# 从权重文件构建SAM模型并移动到目标设备
+def _build_sam(model_type, model_path, device):
+    print(f"🚀 加载SAM模型: {model_type} ({model_path})")
+    sam = sam_model_registry[model_type](checkpoint=model_path)
+    if device == "cuda":
+        sam.to(device='cuda')
+    return sam
+
+# 通过共享注册表获取SAM模型，返回 (模型, 运行设备描述, 是否来自缓存)
+def _acquire_sam(owner, model_type, model_path, use_cache):
+    device = _sam_target_device()
+    device_info = "GPU" if device == "cuda" else "CPU"
+    if not use_cache:
+        return _build_sam(model_type, model_path, device), device_info, False
+    cache_key = model_registry.make_key(f"sam_{model_type}", model_path, device)
+    sam, from_cache = model_registry.acquire(
+        cache_key, lambda: _build_sam(model_type, model_path, device), owner=owner
+    )
+    return sam, device_info, from_cache
+
 class SamModelLoader:
     """SAM模型加载器节点 - 加载和配置SAM模型"""
     def __init__(self):
-        self.models_cache = {}        
         self.config = load_sam_config()
         # 确保模型目录存在
         os.makedirs(self.config["model_dir"], exist_ok=True)
@@ -172,13 +197,6 @@ class SamModelLoader:
         if not model_file:
             raise ValueError(f"未知的SAM模型类型: {model_type}")
         
-        # 检查缓存
-        cache_key = model_type
-        if use_cache and cache_key in self.models_cache:
-            model = self.models_cache[cache_key]
-            model_info = f"已从缓存加载: {model_type}"
-            return (model, model_info)
-        
         try:
             # 模型路径
             model_path = os.path.join(self.config["model_dir"], model_file)
@@ -189,20 +207,11 @@ class SamModelLoader:
             elif not os.path.exists(model_path):
                 raise FileNotFoundError(f"SAM模型文件不存在: {model_path}\n请启用自动下载或手动下载模型")
             
-            # 加载模型
-            print(f"🚀 加载SAM模型: {model_type} ({model_file})")
-            sam = sam_model_registry[model_type](checkpoint=model_path)
-            
-            # 如果有GPU，移至GPU
-            if torch.cuda.is_available():
-                sam.to(device='cuda')
-                device_info = "GPU"
-            else:
-                device_info = "CPU"
-            
-            # 添加到缓存
-            if use_cache:
-                self.models_cache[cache_key] = sam
+            # 加载模型（共享注册表中已有同一权重时直接复用）
+            sam, device_info, from_cache = _acquire_sam(self, model_type, model_path, use_cache)
+            if from_cache:
+                model_info = f"已从缓存加载: {model_type}\n运行设备: {device_info}\n模型路径: {model_path}"
+                return (sam, model_info)
             
             model_info = f"成功加载SAM模型: {model_type}\n运行设备: {device_info}\n模型路径: {model_path}"
             return (sam, model_info)
@@ -212,7 +221,6 @@ class SamModelLoader:
 class SamModelLoaderV2:
     """SAM模型加载器V2 - 读取本地models/sam目录中的所有模型文件"""
     def __init__(self):
-        self.models_cache = {}
         self.config = load_sam_config()
         # 确保模型目录存在
         os.makedirs(self.config["model_dir"], exist_ok=True)
@@ -269,13 +277,6 @@ class SamModelLoaderV2:
         if model_file == "无可用模型":
             raise FileNotFoundError(f"models/sam目录中没有找到.pth模型文件，请先下载或放入模型文件")
         
-        # 检查缓存
-        cache_key = model_file
-        if use_cache and cache_key in self.models_cache:
-            model = self.models_cache[cache_key]
-            model_info = f"已从缓存加载: {model_file}"
-            return (model, model_info)
-        
         try:
             # 模型路径
             model_path = os.path.join(self.config["model_dir"], model_file)
@@ -287,20 +288,11 @@ class SamModelLoaderV2:
             # 尝试确定模型类型
             model_type = self._infer_model_type(model_file)
             
-            # 加载模型
-            print(f"🚀 加载本地SAM模型: {model_file}")
-            sam = sam_model_registry[model_type](checkpoint=model_path)
-            
-            # 如果有GPU，移至GPU
-            if torch.cuda.is_available():
-                sam.to(device='cuda')
-                device_info = "GPU"
-            else:
-                device_info = "CPU"
-            
-            # 添加到缓存
-            if use_cache:
-                self.models_cache[cache_key] = sam
+            # 加载模型（共享注册表中已有同一权重时直接复用）
+            sam, device_info, from_cache = _acquire_sam(self, model_type, model_path, use_cache)
+            if from_cache:
+                model_info = f"已从缓存加载: {model_file}\n运行设备: {device_info}\n模型路径: {model_path}\n模型类型: {model_type}"
+                return (sam, model_info)
             
             model_info = f"成功加载本地SAM模型: {model_file}\n运行设备: {device_info}\n模型路径: {model_path}\n模型类型: {model_type}"
             return (sam, model_info)
@@ -325,7 +317,6 @@ class SamModelLoaderV2:
 class SamModelLoaderCustomPath:
     """SAM模型加载器(自定义路径) - 支持直接指定本地模型文件的完整路径"""
     def __init__(self):
-        self.models_cache = {}
         self.config = load_sam_config()
     
     @classmethod
@@ -360,15 +351,6 @@ class SamModelLoaderCustomPath:
         if not custom_model_path:
             raise Exception("请输入有效的模型文件路径")
         
-        # 生成缓存键
-        cache_key = f"custom_path_{os.path.basename(custom_model_path)}"
-        
-        # 检查缓存
-        if use_cache and cache_key in self.models_cache:
-            model = self.models_cache[cache_key]
-            model_info = f"已从缓存加载自定义路径模型: {custom_model_path}"
-            return (model, model_info)
-        
         try:
             # 检查模型文件是否存在
             if not os.path.exists(custom_model_path):
@@ -381,20 +363,11 @@ class SamModelLoaderCustomPath:
             # 尝试确定模型类型
             model_type = self._infer_model_type(os.path.basename(custom_model_path))
             
-            # 加载模型
-            print(f"🚀 加载自定义路径SAM模型: {custom_model_path}")
-            sam = sam_model_registry[model_type](checkpoint=custom_model_path)
-            
-            # 如果有GPU，移至GPU
-            if torch.cuda.is_available():
-                sam.to(device='cuda')
-                device_info = "GPU"
-            else:
-                device_info = "CPU"
-            
-            # 添加到缓存
-            if use_cache:
-                self.models_cache[cache_key] = sam
+            # 加载模型（共享注册表中已有同一权重时直接复用）
+            sam, device_info, from_cache = _acquire_sam(self, model_type, custom_model_path, use_cache)
+            if from_cache:
+                model_info = f"已从缓存加载自定义路径模型: {custom_model_path}\n运行设备: {device_info}\n模型类型: {model_type}"
+                return (sam, model_info)
             
             model_info = f"成功加载自定义路径SAM模型: {custom_model_path}\n运行设备: {device_info}\n模型类型: {model_type}"
             return (sam, model_info)
@@ -0,0 +1,144 @@
+"""
+SAM预测器与图像嵌入缓存
+按图像内容哈希和SAM模型缓存ViT编码器输出的图像嵌入，
+同一张图像换用不同的框/索引/遮罩参数重新分割时只需运行轻量的遮罩解码器
+"""
+
+import os
+import hashlib
+import threading
+import weakref
+import logging
+from collections import OrderedDict
+
+import numpy as np
+
+# 尝试导入SAM
+try:
+    from segment_anything import SamPredictor
+    sam_available = True
+except ImportError:
+    sam_available = False
+
+# 配置日志
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# 默认最多缓存的图像嵌入数量，可通过环境变量 XNANTOOL_SAM_EMBEDDING_CACHE 覆盖
+DEFAULT_EMBEDDING_CACHE_SIZE = 16
+
+
+def _default_cache_size():
+    try:
+        return max(0, int(os.environ.get("XNANTOOL_SAM_EMBEDDING_CACHE", DEFAULT_EMBEDDING_CACHE_SIZE)))
+    except ValueError:
+        logger.warning("XNANTOOL_SAM_EMBEDDING_CACHE 不是有效整数，使用默认值")
+        return DEFAULT_EMBEDDING_CACHE_SIZE
+
+
+def image_digest(image: np.ndarray) -> str:
+    """计算图像内容哈希（包含尺寸和数据类型，避免不同形状的相同字节冲突）"""
+    image = np.ascontiguousarray(image)
+    hasher = hashlib.blake2b(digest_size=16)
+    hasher.update(f"{image.shape}|{image.dtype}".encode("utf-8"))
+    hasher.update(memoryview(image).cast("B"))
+    return hasher.hexdigest()
+
+
+class SamPredictorCache:
+    """
+    SAM预测器缓存
+    按 (模型标识, 图像哈希) 以LRU方式缓存set_image计算出的图像嵌入。
+    SamPredictor本身构建开销很小但会强引用模型，因此不长期持有，
+    命中时把缓存的嵌入恢复到新建的预测器上即可跳过图像编码器
+    """
+
+    def __init__(self, max_entries=None):
+        self.max_entries = max_entries if max_entries is not None else _default_cache_size()
+        self._tracked_models = set()
+        self._embeddings = OrderedDict()
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_predictor(self, sam_model, rgb_image: np.ndarray):
+        """
+        获取已设置好图像的SamPredictor
+
+        Args:
+            sam_model: SAM模型对象
+            rgb_image: RGB格式的uint8图像 (H,W,C)
+
+        Returns:
+            (predictor, cache_hit)
+        """
+        if not sam_available:
+            raise ImportError("SAM库未安装，请先安装: pip install git+https://github.com/facebookresearch/segment-anything.git")
+
+        with self._lock:
+            predictor = self._create_predictor(sam_model)
+            key = (id(sam_model), image_digest(rgb_image))
+
+            cached = self._embeddings.get(key)
+            if cached is not None:
+                self._embeddings.move_to_end(key)
+                self._restore(predictor, cached)
+                self.hits += 1
+                return predictor, True
+
+            # 未命中：运行图像编码器
+            predictor.set_image(rgb_image)
+            self.misses += 1
+            if self.max_entries > 0:
+                self._embeddings[key] = self._snapshot(predictor)
+                while len(self._embeddings) > self.max_entries:
+                    self._embeddings.popitem(last=False)
+            return predictor, False
+
+    def clear(self):
+        """清空所有缓存的嵌入"""
+        with self._lock:
+            self._embeddings.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._embeddings),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+    def _create_predictor(self, sam_model):
+        model_id = id(sam_model)
+        if model_id not in self._tracked_models:
+            self._tracked_models.add(model_id)
+            # 模型被回收时清理对应的嵌入，防止id复用导致误命中
+            weakref.finalize(sam_model, self._purge_model, model_id)
+        return SamPredictor(sam_model)
+
+    def _purge_model(self, model_id):
+        with self._lock:
+            self._tracked_models.discard(model_id)
+            for key in [k for k in self._embeddings if k[0] == model_id]:
+                del self._embeddings[key]
+
+    @staticmethod
+    def _snapshot(predictor):
+        return {
+            "features": predictor.features,
+            "original_size": predictor.original_size,
+            "input_size": predictor.input_size,
+        }
+
+    @staticmethod
+    def _restore(predictor, cached):
+        predictor.reset_image()
+        predictor.features = cached["features"]
+        predictor.original_size = cached["original_size"]
+        predictor.input_size = cached["input_size"]
+        predictor.is_image_set = True
+
+
+# 全局共享实例
+sam_predictor_cache = SamPredictorCache()
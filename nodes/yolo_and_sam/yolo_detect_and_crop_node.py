@@ -6,6 +6,8 @@ from ultralytics import YOLO
 import json
 import logging
 
+from .device_utils import get_optimal_device, move_model_to_device
+
 # 配置日志
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -80,11 +82,11 @@ class YoloDetectAndCropNode:
             image_np = self.tensor_to_numpy(image)
             
             # 确定最佳设备运行模型
-            device = self._get_optimal_device(yolo_model)
+            device = get_optimal_device()
             logger.info(f"使用设备: {device}")
             
-            # 将模型移动到最佳设备
-            yolo_model.to(device)
+            # 将模型移动到最佳设备（已在该设备上时跳过）
+            move_model_to_device(yolo_model, device)
             
             # 将图像也移动到相同设备（如果需要）
             if device.type == 'cuda':
@@ -149,7 +151,7 @@ class YoloDetectAndCropNode:
             try:
                 logger.info("尝试使用CPU作为后备方案...")
                 yolo_model.conf = original_conf
-                yolo_model.to('cpu')
+                move_model_to_device(yolo_model, 'cpu')
                 
                 # 转换图像格式
                 image_np = self.tensor_to_numpy(image)
@@ -205,32 +207,6 @@ class YoloDetectAndCropNode:
                 logger.error(f"后备方案也失败了: {str(fallback_error)}")
                 raise Exception(f"检测和裁剪失败: {str(e)}")
     
-    def _get_optimal_device(self, yolo_model):
-        """
-        获取最优设备用于运行模型
-        """
-        try:
-            # 首先检查CUDA是否可用且能正常工作
-            if torch.cuda.is_available():
-                # 测试CUDA是否能正常工作
-                try:
-                    test_tensor = torch.randn(10, 10).cuda()
-                    test_result = torch.mm(test_tensor, test_tensor)
-                    # 测试NMS操作
-                    from torchvision.ops import nms
-                    boxes = torch.tensor([[0, 0, 10, 10], [5, 5, 15, 15]], dtype=torch.float).cuda()
-                    scores = torch.tensor([0.9, 0.8], dtype=torch.float).cuda()
-                    keep = nms(boxes, scores, 0.5)
-                    return torch.device('cuda')
-                except Exception as cuda_test_error:
-                    logger.warning(f"CUDA测试失败，回退到CPU: {str(cuda_test_error)}")
-                    return torch.device('cpu')
-            else:
-                return torch.device('cpu')
-        except Exception as e:
-            logger.warning(f"设备检测出错，使用CPU: {str(e)}")
-            return torch.device('cpu')
-    
     def tensor_to_numpy(self, tensor):
         """将tensor格式转换为numpy数组 (B,H,W,C) -> (H,W,C) -> (H,W,C) RGB"""
         # 确保tensor在CPU上并转换为numpy
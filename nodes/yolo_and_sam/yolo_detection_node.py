@@ -6,6 +6,8 @@ from ultralytics import YOLO
 import json
 import logging
 
+from .device_utils import get_optimal_device, move_model_to_device
+
 # 配置日志
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -43,6 +45,21 @@ class YoloDetectionNode:
                     "label": "显示标注",
                     "description": "是否在输出图像上显示检测框和标签"
                 }),
+            },
+            "optional": {
+                "batch_mode": ("BOOLEAN", {
+                    "default": False,
+                    "label": "批量检测",
+                    "description": "启用后对输入批次中的所有帧执行检测（按微批次送入模型），detection_results输出逐帧结果列表；关闭时仅检测第一帧"
+                }),
+                "micro_batch_size": ("INT", {
+                    "default": 16,
+                    "min": 1,
+                    "max": 256,
+                    "step": 1,
+                    "label": "微批次大小",
+                    "description": "批量检测时每次送入模型的帧数，显存/内存不足时可调小"
+                }),
             }
         }
     
@@ -51,7 +68,8 @@ class YoloDetectionNode:
     FUNCTION = "detect"
     CATEGORY = "XnanTool/yolo和sam/yolo"
     
-    def detect(self, yolo_model, image, classes, confidence_threshold, show_annotations):
+    def detect(self, yolo_model, image, classes, confidence_threshold, show_annotations,
+               batch_mode=False, micro_batch_size=16):
         """
         执行YOLO检测
         
@@ -61,6 +79,8 @@ class YoloDetectionNode:
             classes: 要检测的类别列表
             confidence_threshold: 置信度阈值
             show_annotations: 是否显示标注
+            batch_mode: 是否对整个批次执行检测
+            micro_batch_size: 批量检测时每次送入模型的帧数
             
         Returns:
             annotated_image: 带标注的图像
@@ -68,11 +88,22 @@ class YoloDetectionNode:
             detected_objects_count: 检测到的对象数量
             info: 处理信息
         """
+        # 保存原始置信度阈值
+        original_conf = yolo_model.conf
         try:
-            # 保存原始置信度阈值
-            original_conf = yolo_model.conf
             yolo_model.conf = confidence_threshold
             
+            # 批量检测模式：整个批次按微批次送入模型
+            if batch_mode:
+                device = get_optimal_device()
+                logger.info(f"使用设备: {device}")
+                move_model_to_device(yolo_model, device)
+                try:
+                    return self.detect_batch(yolo_model, image, classes, confidence_threshold,
+                                             show_annotations, micro_batch_size, str(device))
+                finally:
+                    yolo_model.conf = original_conf
+            
             # 转换图像格式
             image_np = self.tensor_to_numpy(image)
             
@@ -81,11 +112,11 @@ class YoloDetectionNode:
                 annotated_image_np = image_np.copy()
             
             # 确定最佳设备运行模型
-            device = self._get_optimal_device(yolo_model)
+            device = get_optimal_device()
             logger.info(f"使用设备: {device}")
             
-            # 将模型移动到最佳设备
-            yolo_model.to(device)
+            # 将模型移动到最佳设备（已在该设备上时跳过）
+            move_model_to_device(yolo_model, device)
             
             # 执行YOLO检测
             results = yolo_model(image_np, verbose=False)
@@ -126,7 +157,15 @@ class YoloDetectionNode:
             try:
                 logger.info("尝试使用CPU作为后备方案...")
                 yolo_model.conf = original_conf
-                yolo_model.to('cpu')
+                move_model_to_device(yolo_model, 'cpu')
+                
+                if batch_mode:
+                    yolo_model.conf = confidence_threshold
+                    try:
+                        return self.detect_batch(yolo_model, image, classes, confidence_threshold,
+                                                 show_annotations, micro_batch_size, "CPU(后备)")
+                    finally:
+                        yolo_model.conf = original_conf
                 
                 # 转换图像格式
                 image_np = self.tensor_to_numpy(image)
@@ -168,31 +207,56 @@ class YoloDetectionNode:
                 logger.error(f"后备方案也失败了: {str(fallback_error)}")
                 raise Exception(f"检测失败: {str(e)}")
     
-    def _get_optimal_device(self, yolo_model):
+    def detect_batch(self, yolo_model, image, classes, confidence_threshold, show_annotations,
+                     micro_batch_size, device_label):
         """
-        获取最优设备用于运行模型
+        对整个图像批次执行YOLO检测，每次将micro_batch_size帧作为一个列表送入模型
+        
+        Returns:
+            与detect相同的四元组，detection_results为逐帧结果列表:
+            [{"frame_index": 0, "detections": [...]}, ...]
         """
-        try:
-            # 首先检查CUDA是否可用且能正常工作
-            if torch.cuda.is_available():
-                # 测试CUDA是否能正常工作
-                try:
-                    test_tensor = torch.randn(10, 10).cuda()
-                    test_result = torch.mm(test_tensor, test_tensor)
-                    # 测试NMS操作
-                    from torchvision.ops import nms
-                    boxes = torch.tensor([[0, 0, 10, 10], [5, 5, 15, 15]], dtype=torch.float).cuda()
-                    scores = torch.tensor([0.9, 0.8], dtype=torch.float).cuda()
-                    keep = nms(boxes, scores, 0.5)
-                    return torch.device('cuda')
-                except Exception as cuda_test_error:
-                    logger.warning(f"CUDA测试失败，回退到CPU: {str(cuda_test_error)}")
-                    return torch.device('cpu')
-            else:
-                return torch.device('cpu')
-        except Exception as e:
-            logger.warning(f"设备检测出错，使用CPU: {str(e)}")
-            return torch.device('cpu')
+        frames = self.tensor_to_numpy_batch(image)
+        micro_batch_size = max(1, int(micro_batch_size))
+        
+        frame_results = []
+        annotated_frames = []
+        for start in range(0, len(frames), micro_batch_size):
+            chunk = frames[start:start + micro_batch_size]
+            # 一次调用处理整个微批次，ultralytics按列表顺序返回结果
+            results = yolo_model(chunk, verbose=False)
+            for offset, (frame_np, result) in enumerate(zip(chunk, results)):
+                detections = self.parse_detections([result], classes)
+                frame_results.append({
+                    "frame_index": start + offset,
+                    "detections": detections
+                })
+                if show_annotations:
+                    if len(detections) > 0:
+                        frame_np = self.draw_annotations(frame_np.copy(), detections)
+                    annotated_frames.append(self.numpy_to_tensor(frame_np))
+        
+        if show_annotations and annotated_frames:
+            annotated_tensor = torch.cat(annotated_frames, dim=0)
+        else:
+            annotated_tensor = image  # 如果不显示标注，返回原始图像
+        
+        total_count = sum(len(frame["detections"]) for frame in frame_results)
+        if total_count == 0:
+            info = f"批量检测完成，共{len(frames)}帧，未发现任何对象。置信度阈值: {confidence_threshold}，设备: {device_label}"
+        else:
+            detected_classes = sorted(set(
+                det["class_name"] for frame in frame_results for det in frame["detections"]
+            ))
+            info = (f"批量检测完成，共{len(frames)}帧，发现{total_count}个对象: {', '.join(detected_classes)}。"
+                    f"置信度阈值: {confidence_threshold}，微批次: {micro_batch_size}，设备: {device_label}")
+        
+        return (
+            annotated_tensor,
+            json.dumps(frame_results),
+            total_count,
+            info
+        )
     
     def tensor_to_numpy(self, tensor):
         """将tensor格式转换为numpy数组 (B,H,W,C) -> (H,W,C) -> (H,W,C) RGB"""
@@ -209,6 +273,15 @@ class YoloDetectionNode:
         numpy_image = cv2.cvtColor(numpy_image, cv2.COLOR_RGB2BGR)
         return numpy_image
     
+    def tensor_to_numpy_batch(self, tensor):
+        """将tensor批次转换为numpy数组列表 (B,H,W,C) -> [(H,W,C) BGR, ...]"""
+        tensor = tensor.cpu()
+        if tensor.dim() == 3:
+            tensor = tensor.unsqueeze(0)
+        # 一次性完成整个批次的范围转换，再逐帧转换颜色空间
+        batch_np = (tensor.numpy() * 255).astype(np.uint8)
+        return [cv2.cvtColor(frame, cv2.COLOR_RGB2BGR) for frame in batch_np]
+    
     def numpy_to_tensor(self, numpy_image):
         """将numpy数组转换为tensor格式 (H,W,C) -> (1,H,W,C)"""
         # 转换颜色空间从BGR到RGB
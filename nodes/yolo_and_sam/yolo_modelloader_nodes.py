@@ -10,6 +10,8 @@ import shutil
 import logging
 import glob
 
+from .model_registry import model_registry
+
 # 配置日志
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -72,10 +74,47 @@ def save_yolo_config(config: dict) -> bool:
         print(f"保存YOLO配置失败: {e}")
         return False
 
+# 从本地文件加载YOLO模型
+def _load_yolo_file(model_path):
+    # 检查模型文件是否存在
+    if not os.path.exists(model_path):
+        raise FileNotFoundError(f"模型文件不存在: {model_path}")
+    # 检查文件大小，太小可能是损坏的
+    if os.path.getsize(model_path) < 1024 * 1024:  # 小于1MB
+        raise ValueError(f"模型文件可能损坏，大小过小: {model_path}")
+    return YOLO(model_path)
+
+class YoloModelHandle:
+    """
+    共享YOLO模型的加载器句柄
+    注册表中的模型被所有加载器共用，置信度/IOU阈值保存在各自的句柄上，
+    不会互相覆盖，也不会修改ComfyUI已缓存的其他输出；其余属性和调用直接转发给共享模型
+    """
+    _LOCAL_ATTRS = ("model_ref", "conf", "iou")
+
+    def __init__(self, model, conf, iou):
+        object.__setattr__(self, "model_ref", model)
+        object.__setattr__(self, "conf", conf)
+        object.__setattr__(self, "iou", iou)
+
+    def __call__(self, *args, **kwargs):
+        return self.model_ref(*args, **kwargs)
+
+    def __getattr__(self, name):
+        if name == "model_ref":
+            # 复制/反序列化时实例尚未初始化
+            raise AttributeError(name)
+        return getattr(self.model_ref, name)
+
+    def __setattr__(self, name, value):
+        if name in self._LOCAL_ATTRS:
+            object.__setattr__(self, name, value)
+        else:
+            setattr(self.model_ref, name, value)
+
 class YoloModelLoader:
     """YOLO模型加载器节点 - 加载和配置YOLO模型"""
     def __init__(self):
-        self.models_cache = {}
         self.config = load_yolo_config()
         # 确保模型下载目录存在
         os.makedirs(self.config["download_dir"], exist_ok=True)
@@ -138,59 +177,33 @@ class YoloModelLoader:
     
     def load_model(self, model_name, confidence_threshold, iou_threshold, use_cache=True, force_reload=False):
         """加载YOLO模型"""
-        cache_key = f"{model_name}_{confidence_threshold}_{iou_threshold}"
-        
-        # 检查缓存
-        if use_cache and not force_reload and cache_key in self.models_cache:
-            model = self.models_cache[cache_key]
-            model_info = f"已从缓存加载: {model_name}"
-            return (model, model_info)
+        # 检查是否为内置模型
+        is_builtin_model = any(model[0] == model_name for model in supported_yolo_models)
+        if is_builtin_model:
+            model_path = os.path.join(self.config["download_dir"], model_name)
+        else:
+            model_path = model_name
         
         try:
-            # 检查是否为内置模型
-            is_builtin_model = any(model[0] == model_name for model in supported_yolo_models)
-            
-            if is_builtin_model:
-                # 内置模型的处理逻辑
-                model_path = os.path.join(self.config["download_dir"], model_name)
-                
-                # 如果强制重新加载或模型文件不存在，则下载
-                if force_reload or not os.path.exists(model_path):
-                    logger.info(f"正在下载YOLO模型: {model_name} 到 {self.config['download_dir']}")
-                    
-                    # 创建临时目录来下载模型
-                    with tempfile.TemporaryDirectory() as temp_dir:
-                        try:
-                            # 先在临时目录下载
-                            temp_model = YOLO(model_name)
-                            # 保存到指定目录
-                            shutil.copy2(temp_model.ckpt_path, model_path)
-                            logger.info(f"模型下载成功: {model_path}")
-                        except Exception as download_error:
-                            logger.error(f"模型下载失败: {str(download_error)}")
-                            # 尝试直接加载，让YOLO自己处理下载
-                            model = YOLO(model_name)
-                else:
-                    # 使用已下载的模型文件
-                    model = YOLO(model_path)
+            # 共享注册表按权重路径缓存，阈值只是模型属性，不再为每组阈值重复加载
+            if use_cache:
+                cache_key = model_registry.make_key("yolo", model_path, "auto")
+                model, from_cache = model_registry.acquire(
+                    cache_key,
+                    lambda: self._load_yolo(model_name, model_path, is_builtin_model, force_reload),
+                    owner=self,
+                    force_reload=force_reload,
+                )
             else:
-                # 自定义模型需要提供完整路径
-                if not os.path.exists(model_name):
-                    raise FileNotFoundError(f"模型文件不存在: {model_name}")
-                # 检查文件大小，太小可能是损坏的
-                if os.path.getsize(model_name) < 1024 * 1024:  # 小于1MB
-                    raise ValueError(f"模型文件可能损坏，大小过小: {model_name}")
-                model = YOLO(model_name)
+                model, from_cache = self._load_yolo(model_name, model_path, is_builtin_model, force_reload), False
             
-            # 设置参数
-            model.conf = confidence_threshold
-            model.iou = iou_threshold
-            
-            # 添加到缓存
-            if use_cache:
-                self.models_cache[cache_key] = model
+            # 阈值保存在本加载器的句柄上，不修改共享模型
+            model = YoloModelHandle(model, confidence_threshold, iou_threshold)
             
-            model_info = f"成功加载模型: {model_name}\n置信度阈值: {confidence_threshold}\nIOU阈值: {iou_threshold}"
+            if from_cache:
+                model_info = f"已从缓存加载: {model_name}\n置信度阈值: {confidence_threshold}\nIOU阈值: {iou_threshold}"
+            else:
+                model_info = f"成功加载模型: {model_name}\n置信度阈值: {confidence_threshold}\nIOU阈值: {iou_threshold}"
             return (model, model_info)
         except Exception as e:
             # 提供更详细的错误信息
@@ -198,11 +211,36 @@ class YoloModelLoader:
             if "PytorchStreamReader" in str(e):
                 error_msg += "\n\n可能的解决方案:\n1. 检查模型文件是否完整，可能需要重新下载\n2. 对于内置模型，尝试启用'强制重新加载'选项\n3. 确认磁盘空间充足\n4. 确认文件权限正确"
             raise Exception(error_msg)
+    
+    def _load_yolo(self, model_name, model_path, is_builtin_model, force_reload):
+        """从磁盘加载（必要时下载）YOLO模型"""
+        if is_builtin_model:
+            # 如果强制重新加载或模型文件不存在，则下载
+            if force_reload or not os.path.exists(model_path):
+                logger.info(f"正在下载YOLO模型: {model_name} 到 {self.config['download_dir']}")
+                
+                # 创建临时目录来下载模型
+                with tempfile.TemporaryDirectory() as temp_dir:
+                    try:
+                        # 先在临时目录下载
+                        temp_model = YOLO(model_name)
+                        # 保存到指定目录
+                        shutil.copy2(temp_model.ckpt_path, model_path)
+                        logger.info(f"模型下载成功: {model_path}")
+                        return temp_model
+                    except Exception as download_error:
+                        logger.error(f"模型下载失败: {str(download_error)}")
+                        # 尝试直接加载，让YOLO自己处理下载
+                        return YOLO(model_name)
+            # 使用已下载的模型文件
+            return YOLO(model_path)
+        
+        # 自定义模型需要提供完整路径
+        return _load_yolo_file(model_path)
 
 class YoloModelLoaderV2:
     """YOLO模型加载器V2节点 - 自动扫描并加载本地models/yolo目录中的模型"""
     def __init__(self):
-        self.models_cache = {}
         self.config = load_yolo_config()
         # 确保模型下载目录存在
         os.makedirs(self.config["download_dir"], exist_ok=True)
@@ -283,38 +321,25 @@ class YoloModelLoaderV2:
         if model_name == "no_models_found":
             raise Exception("未找到本地模型，请将YOLO模型文件(.pt或.onnx)放入models/yolo目录后重新加载")
         
-        cache_key = f"local_{model_name}_{confidence_threshold}_{iou_threshold}"
-        
-        # 检查缓存
-        if use_cache and cache_key in self.models_cache:
-            model = self.models_cache[cache_key]
-            model_info = f"已从缓存加载本地模型: {model_name}"
-            return (model, model_info)
+        # 构建完整的模型路径
+        model_path = os.path.join(self.config["download_dir"], model_name)
         
         try:
-            # 构建完整的模型路径
-            model_path = os.path.join(self.config["download_dir"], model_name)
-            
-            # 检查模型文件是否存在
-            if not os.path.exists(model_path):
-                raise FileNotFoundError(f"模型文件不存在: {model_path}")
-            
-            # 检查文件大小，太小可能是损坏的
-            if os.path.getsize(model_path) < 1024 * 1024:  # 小于1MB
-                raise ValueError(f"模型文件可能损坏，大小过小: {model_path}")
-            
-            # 加载模型
-            model = YOLO(model_path)
-            
-            # 设置参数
-            model.conf = confidence_threshold
-            model.iou = iou_threshold
-            
-            # 添加到缓存
             if use_cache:
-                self.models_cache[cache_key] = model
+                cache_key = model_registry.make_key("yolo", model_path, "auto")
+                model, from_cache = model_registry.acquire(
+                    cache_key, lambda: _load_yolo_file(model_path), owner=self
+                )
+            else:
+                model, from_cache = _load_yolo_file(model_path), False
             
-            model_info = f"成功加载本地模型: {model_name}\n置信度阈值: {confidence_threshold}\nIOU阈值: {iou_threshold}"
+            # 阈值保存在本加载器的句柄上，不修改共享模型
+            model = YoloModelHandle(model, confidence_threshold, iou_threshold)
+            
+            if from_cache:
+                model_info = f"已从缓存加载本地模型: {model_name}\n置信度阈值: {confidence_threshold}\nIOU阈值: {iou_threshold}"
+            else:
+                model_info = f"成功加载本地模型: {model_name}\n置信度阈值: {confidence_threshold}\nIOU阈值: {iou_threshold}"
             return (model, model_info)
         except Exception as e:
             # 提供更详细的错误信息
@@ -326,7 +351,6 @@ class YoloModelLoaderV2:
 class YoloModelLoaderCustomPath:
     """YOLO模型加载器(自定义路径) - 支持直接指定本地模型文件的完整路径"""
     def __init__(self):
-        self.models_cache = {}
         self.config = load_yolo_config()
     
     @classmethod
@@ -377,36 +401,22 @@ class YoloModelLoaderCustomPath:
         if not custom_model_path:
             raise Exception("请输入有效的模型文件路径")
         
-        # 生成缓存键
-        cache_key = f"custom_path_{os.path.basename(custom_model_path)}_{confidence_threshold}_{iou_threshold}"
-        
-        # 检查缓存
-        if use_cache and cache_key in self.models_cache:
-            model = self.models_cache[cache_key]
-            model_info = f"已从缓存加载自定义路径模型: {custom_model_path}"
-            return (model, model_info)
-        
         try:
-            # 检查模型文件是否存在
-            if not os.path.exists(custom_model_path):
-                raise FileNotFoundError(f"模型文件不存在: {custom_model_path}")
-            
-            # 检查文件大小，太小可能是损坏的
-            if os.path.getsize(custom_model_path) < 1024 * 1024:  # 小于1MB
-                raise ValueError(f"模型文件可能损坏，大小过小: {custom_model_path}")
-            
-            # 加载模型
-            model = YOLO(custom_model_path)
-            
-            # 设置参数
-            model.conf = confidence_threshold
-            model.iou = iou_threshold
-            
-            # 添加到缓存
             if use_cache:
-                self.models_cache[cache_key] = model
+                cache_key = model_registry.make_key("yolo", custom_model_path, "auto")
+                model, from_cache = model_registry.acquire(
+                    cache_key, lambda: _load_yolo_file(custom_model_path), owner=self
+                )
+            else:
+                model, from_cache = _load_yolo_file(custom_model_path), False
             
-            model_info = f"成功加载自定义路径模型: {custom_model_path}\n置信度阈值: {confidence_threshold}\nIOU阈值: {iou_threshold}"
+            # 阈值保存在本加载器的句柄上，不修改共享模型
+            model = YoloModelHandle(model, confidence_threshold, iou_threshold)
+            
+            if from_cache:
+                model_info = f"已从缓存加载自定义路径模型: {custom_model_path}\n置信度阈值: {confidence_threshold}\nIOU阈值: {iou_threshold}"
+            else:
+                model_info = f"成功加载自定义路径模型: {custom_model_path}\n置信度阈值: {confidence_threshold}\nIOU阈值: {iou_threshold}"
             return (model, model_info)
         except Exception as e:
             # 提供更详细的错误信息
@@ -11,6 +11,9 @@ import logging
 from typing import Tuple, Dict, Any, List
 import json
 
+from .device_utils import get_optimal_device, move_model_to_device
+from .sam_predictor_cache import sam_predictor_cache
+
 # 尝试导入SAM
 try:
     from segment_anything import SamPredictor
@@ -44,9 +47,10 @@ class YoloSamBackgroundRemovalNode:
                     "multiline": False,
                     "placeholder": "可选，指定要检测的类别，如 'person,dog,cat'，留空则检测所有类别"
                 }),
-                "selection_mode": (["最高置信度", "手动索引"], {
+                "selection_mode": (["最高置信度", "手动索引", "全部对象"], {
                     "default": "最高置信度",
-                    "label": "选择模式"
+                    "label": "选择模式",
+                    "description": "全部对象：所有检测框作为一批提示一次送入SAM，输出逐对象遮罩和合并遮罩"
                 }),
                 "object_index": ("INT", {
                     "default": 0,
@@ -89,8 +93,8 @@ class YoloSamBackgroundRemovalNode:
             }
         }
     
-    RETURN_TYPES = ("IMAGE", "MASK", "STRING")
-    RETURN_NAMES = ("cropped_image", "foreground_mask", "info")
+    RETURN_TYPES = ("IMAGE", "MASK", "STRING", "MASK")
+    RETURN_NAMES = ("cropped_image", "foreground_mask", "info", "object_masks")
     FUNCTION = "remove_background_with_yolo_sam"
     CATEGORY = "XnanTool/yolo和sam/yolo+sam"
     
@@ -103,7 +107,7 @@ class YoloSamBackgroundRemovalNode:
             sam_model: SAM模型对象
             image: 输入图像 (tensor格式)
             classes: 要检测的类别列表
-            selection_mode: 选择模式（"最高置信度" 或 "手动索引"）
+            selection_mode: 选择模式（"最高置信度"、"手动索引" 或 "全部对象"）
             object_index: 物体索引（手动模式下使用）
             confidence_threshold: YOLO置信度阈值
             padding: 裁剪边界填充像素数
@@ -112,8 +116,9 @@ class YoloSamBackgroundRemovalNode:
             
         Returns:
             cropped_image: 裁剪后的图像
-            foreground_mask: 前景遮罩
+            foreground_mask: 前景遮罩（全部对象模式下为所有对象的合并遮罩）
             info: 处理信息
+            object_masks: 逐对象遮罩批次 (N,H,W)，单对象模式下N为1
         """
         try:
             # 设置YOLO模型参数
@@ -124,11 +129,11 @@ class YoloSamBackgroundRemovalNode:
             image_np = self.tensor_to_numpy(image)
             
             # 确定最佳设备运行YOLO模型
-            device = self._get_optimal_device(yolo_model)
+            device = get_optimal_device()
             logger.info(f"使用设备: {device}")
             
-            # 将YOLO模型移动到最佳设备
-            yolo_model.to(device)
+            # 将YOLO模型移动到最佳设备（已在该设备上时跳过）
+            move_model_to_device(yolo_model, device)
             
             # 执行YOLO检测
             results = yolo_model(image_np, verbose=False)
@@ -143,7 +148,12 @@ class YoloSamBackgroundRemovalNode:
             if len(detections) == 0:
                 logger.warning("未检测到任何对象，返回原始图像")
                 info = "未检测到任何对象，返回原始图像"
-                return (image, self.create_empty_mask(image), info)
+                empty_mask = self.create_empty_mask(image)
+                return (image, empty_mask, info, empty_mask[:, 0])
+            
+            # 全部对象模式：一次编码、一次批量解码
+            if selection_mode == "全部对象":
+                return self.segment_all_objects(sam_model, image_np, detections, padding, mask_dilation, mask_blur)
             
             # 根据选择模式选择检测结果
             if selection_mode == "手动索引":
@@ -189,37 +199,39 @@ class YoloSamBackgroundRemovalNode:
             if mask_blur > 0:
                 info += f"，遮罩模糊: {mask_blur}px"
             
-            return (cropped_tensor, mask_tensor, info)
+            return (cropped_tensor, mask_tensor, info, mask_tensor[:, 0])
             
         except Exception as e:
             logger.error(f"背景去除和裁剪过程中出错: {str(e)}")
             raise Exception(f"背景去除和裁剪失败: {str(e)}")
     
-    def _get_optimal_device(self, yolo_model):
-        """
-        获取最优设备用于运行模型
-        """
-        try:
-            # 首先检查CUDA是否可用且能正常工作
-            if torch.cuda.is_available():
-                # 测试CUDA是否能正常工作
-                try:
-                    test_tensor = torch.randn(10, 10).cuda()
-                    test_result = torch.mm(test_tensor, test_tensor)
-                    # 测试NMS操作
-                    from torchvision.ops import nms
-                    boxes = torch.tensor([[0, 0, 10, 10], [5, 5, 15, 15]], dtype=torch.float).cuda()
-                    scores = torch.tensor([0.9, 0.8], dtype=torch.float).cuda()
-                    keep = nms(boxes, scores, 0.5)
-                    return torch.device('cuda')
-                except Exception as cuda_test_error:
-                    logger.warning(f"CUDA测试失败，回退到CPU: {str(cuda_test_error)}")
-                    return torch.device('cpu')
-            else:
-                return torch.device('cpu')
-        except Exception as e:
-            logger.warning(f"设备检测出错，使用CPU: {str(e)}")
-            return torch.device('cpu')
+    def segment_all_objects(self, sam_model, image_np, detections, padding, mask_dilation, mask_blur):
+        """将所有检测框作为一批提示送入SAM，输出合并后的裁剪结果和逐对象遮罩"""
+        masks = self.generate_masks_with_sam_batch(sam_model, image_np, detections)
+        masks = [self.post_process_mask(mask, mask_dilation, mask_blur) for mask in masks]
+        
+        # 合并遮罩
+        union_mask = np.maximum.reduce(masks)
+        
+        # 去除背景并按合并遮罩裁剪
+        foreground_image = self.remove_background(image_np, union_mask)
+        cropped_image, crop_info = self.crop_image_by_mask(foreground_image, union_mask, padding)
+        
+        cropped_tensor = self.numpy_to_tensor(cropped_image)
+        union_tensor = self.mask_to_tensor(union_mask)
+        object_masks = torch.from_numpy(np.stack(masks).astype(np.float32) / 255.0)
+        
+        detection_info_str = ", ".join(
+            f"{i}: {detection['class_name']}(置信度:{detection['confidence']:.2f})"
+            for i, detection in enumerate(detections)
+        )
+        info = f"背景去除和裁剪完成。检测到{len(detections)}个对象: {detection_info_str}。全部对象批量分割。裁剪区域: {crop_info['width']}x{crop_info['height']}px，填充: {padding}px"
+        if mask_dilation > 0:
+            info += f"，遮罩扩张: {mask_dilation}px"
+        if mask_blur > 0:
+            info += f"，遮罩模糊: {mask_blur}px"
+        
+        return (cropped_tensor, union_tensor, info, object_masks)
     
     def tensor_to_numpy(self, tensor):
         """将tensor格式转换为numpy数组 (B,H,W,C) -> (H,W,C) RGB"""
@@ -329,11 +341,10 @@ class YoloSamBackgroundRemovalNode:
             else:
                 rgb_image = image
             
-            # 创建SAM预测器
-            predictor = SamPredictor(sam_model)
-            
-            # 设置图像
-            predictor.set_image(rgb_image)
+            # 获取SAM预测器（同一图像和模型的图像嵌入直接复用缓存）
+            predictor, embedding_cached = sam_predictor_cache.get_predictor(sam_model, rgb_image)
+            if embedding_cached:
+                logger.info("SAM图像嵌入命中缓存，跳过图像编码器")
             
             # 计算边界框中心点作为提示点
             bbox = detection["bbox"]
@@ -368,6 +379,53 @@ class YoloSamBackgroundRemovalNode:
             mask[bbox["y1"]:bbox["y2"], bbox["x1"]:bbox["x2"]] = 255
             return mask
     
+    def generate_masks_with_sam_batch(self, sam_model, image: np.ndarray, detections: List[Dict]) -> List[np.ndarray]:
+        """使用SAM一次性为所有检测框生成遮罩（单次predict_torch调用）"""
+        try:
+            # 确保图像是RGB格式
+            if len(image.shape) == 3 and image.shape[2] == 3:
+                rgb_image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+            else:
+                rgb_image = image
+            
+            predictor, embedding_cached = sam_predictor_cache.get_predictor(sam_model, rgb_image)
+            if embedding_cached:
+                logger.info("SAM图像嵌入命中缓存，跳过图像编码器")
+            
+            # 与单对象模式一致：每个对象使用检测框+框中心前景点作为提示
+            boxes = torch.tensor(
+                [[d["bbox"]["x1"], d["bbox"]["y1"], d["bbox"]["x2"], d["bbox"]["y2"]] for d in detections],
+                dtype=torch.float, device=predictor.device
+            )
+            points = torch.tensor(
+                [[[(d["bbox"]["x1"] + d["bbox"]["x2"]) // 2, (d["bbox"]["y1"] + d["bbox"]["y2"]) // 2]] for d in detections],
+                dtype=torch.float, device=predictor.device
+            )
+            labels = torch.ones((len(detections), 1), dtype=torch.int, device=predictor.device)
+            
+            transformed_boxes = predictor.transform.apply_boxes_torch(boxes, predictor.original_size)
+            transformed_points = predictor.transform.apply_coords_torch(points, predictor.original_size)
+            
+            # masks: (N,1,H,W) 布尔张量
+            masks, scores, logits = predictor.predict_torch(
+                point_coords=transformed_points,
+                point_labels=labels,
+                boxes=transformed_boxes,
+                multimask_output=False,
+            )
+            masks_np = masks[:, 0].cpu().numpy()
+            return [(mask * 255).astype(np.uint8) for mask in masks_np]
+        except Exception as e:
+            logger.error(f"SAM批量遮罩生成失败: {str(e)}")
+            # 如果SAM失败，为每个对象创建基于边界框的简单遮罩
+            fallback_masks = []
+            for detection in detections:
+                bbox = detection["bbox"]
+                mask = np.zeros((image.shape[0], image.shape[1]), dtype=np.uint8)
+                mask[bbox["y1"]:bbox["y2"], bbox["x1"]:bbox["x2"]] = 255
+                fallback_masks.append(mask)
+            return fallback_masks
+    
     def post_process_mask(self, mask: np.ndarray, dilation: int, blur: int) -> np.ndarray:
         """后处理遮罩"""
         try: